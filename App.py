@@ -1,21 +1,33 @@
 # -*- coding: utf-8 -*-
 # Written by Rune Johannesen, (c)2021-2023
+from time import perf_counter
+STARTED: float = perf_counter() # Start of the startup time breakdown (python App.py --startup-times)
 import ttkbootstrap as ttk
 from Main import Main
 from datetime import datetime
+from multiprocessing import freeze_support
 
 class App(ttk.Window):
 	def __init__(self, title):
+		self.startup_times: dict = {"imports": perf_counter()-STARTED}
 		super().__init__(themename='darkly')
 		self.title(title)
 		w, h = self.winfo_screenwidth()-10, self.winfo_screenheight()-75
 		self.geometry(f"{w}x{h}+0+0")
 		self.minsize(w,h)
+		self.startup_times["window"] = perf_counter()-STARTED-sum(self.startup_times.values())
 		self.main = Main(self)
+		self.startup_times.update(self.main.startup_times)
+		self.after_idle(self.started) # Runs once the window has been drawn
 		self.mainloop()
 
+	def started(self) -> None:
+		self.startup_times["first window"] = perf_counter()-STARTED
+		self.main.report_startup(self.startup_times)
+
 def main() -> None:
 	App(f'Configurator by Rune Johannesen © {datetime.now().year}') #
 
 if __name__ == "__main__":
+	freeze_support() # Worker processes of the sharded execution in the frozen executable
 	main()
\ No newline at end of file
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# Written by Rune Johannesen, (c)2021-2023
+from argparse import ArgumentParser, Namespace
+from asyncio import run, sleep
+from random import uniform
+from time import perf_counter
+from re import Pattern
+from os import urandom, remove
+from tempfile import mkstemp
+from Configurator_Object import Configurator, DeviceResult, CommandResult
+from MockIOSServer import MockIOSServer
+"""
+-----------
+How to use:
+-----------
+    Benchmarks for Configurator_Object, run without any real devices.
+    python Benchmark.py scheduler [--devices 100 1000 5000] [--latency 0.05] [--connections 6] [--spawn-rate 20]
+        Runs InitiateExecution against a local mock, where every device login/command takes --latency seconds.
+        Reports devices/s and compares the total time with the stagger of the old Queue scheduler (0.25-0.30 s sleep per device).
+    python Benchmark.py buffer [--sizes 1 4 16] [--chunk 4096]
+        Feeds a multi-MB command output in --chunk sized reads through both readers of ExecuteSingleCommand ("prompt" and "legacy"),
+        and through the old string concatenation reader that rescans the whole buffer after every chunk.
+    python Benchmark.py execution [--devices 10 100 1000 5000] [--connections 32] [--command-delay 0.01] [--login-delay 0.02] [--run-lines 200]
+        Runs InitiateExecution ("terminal length 0", "show run") against MockIOSServer, every device has its own 127.1.x.x address.
+        Reports devices/s and the p50/p99 time per device (login + commands), and the number of failed devices.
+    python Benchmark.py transfer [--devices 10 100 1000 5000] [--size 64] [--verify]
+        Runs InitiateScpTransfer of a --size KB file to flash: of every device against MockIOSServer, --verify uses VERIFY_TRANSFERS.
+        p50/p99 are estimated from the "transfer" histogram of Metrics.
+    Both start the mock in the same process by default, so the client and the mock share one CPU. Start "python MockIOSServer.py --port 8022"
+    in another terminal and use --external to only measure the client. --fail-auth and --drop inject failures (see MockIOSServer.py).
+    The mock answers on 0.0.0.0:--port while the benchmark runs. Raise the open file limit (ulimit -n) for --connections above a few hundred.
+"""
+
+class MockConfigurator(Configurator):
+    """Configurator where every device is reachable and every device takes LATENCY seconds to execute its commands"""
+    def __init__(self, LATENCY: float, **kwargs) -> None:
+        super().__init__("benchmark", "benchmark", **kwargs)
+        self.LATENCY: float = LATENCY
+
+    async def CheckDeviceConnectivity(self, deviceList: list) -> list:
+        return([[device[0], 22] + device[1:] for device in deviceList])
+
+    async def ExecuteCommands(self, device_ip: str, port: int, commandlist: list, controlchar: list, commandtimeout: int, attempt: int = 1, spool_dir: str = "", today: str = "") -> DeviceResult:
+        await sleep(self.LATENCY*uniform(0.8, 1.2))
+        return(DeviceResult(device_ip, "MOCK#", [CommandResult(command, command+"\nMOCK#") for command in commandlist]))
+
+async def benchmark_scheduler(args: Namespace) -> None:
+    print(f"{'Devices':>8} {'Connections':>12} {'Spawn rate':>11} {'Time (s)':>9} {'Devices/s':>10} {'Old stagger (s)':>16}")
+    for devices in args.devices:
+        devicelist: list = [[f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"] for i in range(devices)]
+        Config = MockConfigurator(args.latency, MAX_DEVICE_CONNECTIONS=args.connections, SPAWN_RATE=args.spawn_rate)
+        start: float = perf_counter()
+        results: list = await Config.InitiateExecution(devicelist, ["show version"])
+        elapsed: float = perf_counter()-start
+        if len(results) != devices: print(f"Expected {devices} results, got {len(results)}")
+        print(f"{devices:>8} {args.connections:>12} {args.spawn_rate:>11} {elapsed:>9.2f} {devices/elapsed:>10.1f} {devices*0.275:>16.1f}")
+
+class MockChannel():
+    """Stands in for the _stdin/_stdout of a shell, read() returns the next chunk of the output"""
+    def __init__(self, chunks: list) -> None:
+        self.chunks: list = chunks
+        self.index: int = 0
+
+    def write(self, data: str) -> None:
+        pass
+
+    async def read(self, size: int) -> str:
+        self.index += 1
+        return(self.chunks[self.index-1] if self.index <= len(self.chunks) else "")
+
+def make_output(command: str, megabytes: int, chunk: int) -> list:
+    line: str = " switchport trunk allowed vlan 10,20,30,40,50,60,70,80,90,100,110,120,130,140,150,160,170,180,190,200\r\n"
+    body: str = line*(megabytes*1024*1024//len(line))
+    return([command+"\r\n"]+[body[i:i+chunk] for i in range(0, len(body), chunk)]+["\r\nMOCK#"])
+
+async def concat_reader(chunks: list, prompt: Pattern, controlchar: list) -> str:
+    """The reader before OutputBuffer: buffer += chunk and a scan of the whole buffer after every chunk"""
+    _stdout: MockChannel = MockChannel(chunks)
+    buffer: str = ""
+    while not any(buffer.endswith(i) for i in controlchar) or not prompt.search(buffer, 0):
+        buffer += await _stdout.read(65535)
+        if "Invalid input detected" in buffer or "Unknown command or computer name" in buffer: break
+    return(buffer.strip())
+
+async def benchmark_buffer(args: Namespace) -> None:
+    Config = Configurator("benchmark", "benchmark", COMMANDSLEEP=0.001)
+    prompt: Pattern = Config.CompilePrompt("MOCK#")
+    command: str = "show tech-support"
+    print(f"{'Size (MB)':>9} {'Chunks':>7} {'Concat (s)':>11} {'Prompt (s)':>11} {'Legacy (s)':>11} {'Speedup':>8}")
+    for megabytes in args.sizes:
+        chunks: list = make_output(command, megabytes, args.chunk)
+        start: float = perf_counter()
+        old: str = await concat_reader(chunks, prompt, ["#"])
+        concat: float = perf_counter()-start
+        start: float = perf_counter()
+        new: str = await Config.ExecuteSingleCommand(command, MockChannel([]), MockChannel(chunks), ["#"], 15, prompt)
+        prompt_time: float = perf_counter()-start
+        Config.READ_PROFILE = "legacy"
+        start: float = perf_counter()
+        legacy: str = await Config.ExecuteSingleCommand(command, MockChannel([]), MockChannel(chunks), ["#"], 15)
+        legacy_time: float = perf_counter()-start-Config.COMMANDSLEEP
+        Config.READ_PROFILE = "prompt"
+        if not old == new == legacy: print("Outputs differ")
+        print(f"{megabytes:>9} {len(chunks):>7} {concat:>11.3f} {prompt_time:>11.3f} {legacy_time:>11.3f} {concat/max(prompt_time, legacy_time):>7.1f}x")
+
+def percentile(values: list, q: float) -> float:
+    if not values: return(0.0)
+    values: list = sorted(values)
+    return(values[min(len(values)-1, int(q*len(values)))])
+
+def device_addresses(devices: int) -> list:
+    return([f"127.1.{(i+1) >> 8}.{(i+1) & 255}" for i in range(devices)])
+
+async def benchmark_mock(args: Namespace, transfer: bool) -> None:
+    Mock = MockIOSServer(PORT=args.port, LOGIN_DELAY=args.login_delay, COMMAND_DELAY=args.command_delay, RUN_LINES=args.run_lines, FAIL_AUTH=args.fail_auth, DROP=args.drop)
+    if not args.external: await Mock.Start()
+    source: str = ""
+    if transfer:
+        handle, source = mkstemp(suffix=".cfg")
+        with open(handle, "wb") as file:
+            file.write(urandom(args.size*1024))
+    print(f"{'Devices':>8} {'Connections':>12} {'Time (s)':>9} {'Devices/s':>10} {'p50 (s)':>8} {'p99 (s)':>8} {'Failed':>7}")
+    try:
+        for devices in args.devices:
+            Config = Configurator("benchmark", "cisco", MAX_DEVICE_CONNECTIONS=args.connections, SPAWN_RATE=0, MAX_SOCKET_CONNECTIONS=args.connections,
+                                  SSH_PORT=args.port, VERIFY_TRANSFERS=args.verify if transfer else False)
+            addresses: list = device_addresses(devices)
+            start: float = perf_counter()
+            if transfer:
+                results: list = await Config.InitiateScpTransfer([[address, source, "flash:benchmark.cfg"] for address in addresses])
+                failed: int = devices-len([result for result in results if result[1] is True]) # Unreachable devices have no result
+                p50: float = Config.METRICS.Quantile("transfer", 0.5) # TransferFile only records its duration in the histogram
+                p99: float = Config.METRICS.Quantile("transfer", 0.99)
+            else:
+                results: list = await Config.InitiateExecution([[address] for address in addresses], ["terminal length 0", "show run"])
+                failed: int = len([result for result in results if result.failed])
+                latencies: list = [result.seconds for result in results if result.seconds]
+                p50: float = percentile(latencies, 0.5)
+                p99: float = percentile(latencies, 0.99)
+            elapsed: float = perf_counter()-start
+            print(f"{devices:>8} {args.connections:>12} {elapsed:>9.2f} {devices/elapsed:>10.1f} {p50:>8.3f} {p99:>8.3f} {failed:>7}")
+    finally:
+        Mock.Close()
+        if source: remove(source)
+
+def main() -> None:
+    parser = ArgumentParser(description="Configurator_Object benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    scheduler = subparsers.add_parser("scheduler", help="Throughput of the device scheduler against a local mock")
+    scheduler.add_argument("--devices", type=int, nargs="+", default=[100, 1000, 5000])
+    scheduler.add_argument("--latency", type=float, default=0.05, help="Seconds per device")
+    scheduler.add_argument("--connections", type=int, default=6)
+    scheduler.add_argument("--spawn-rate", type=float, default=0, help="New connections per second, 0 = no limit")
+    buffer = subparsers.add_parser("buffer", help="Reading multi-MB command output")
+    buffer.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 16], help="Output sizes in MB")
+    buffer.add_argument("--chunk", type=int, default=4096, help="Characters per read")
+    for name, description in (("execution", "InitiateExecution against MockIOSServer"), ("transfer", "InitiateScpTransfer against MockIOSServer")):
+        mock = subparsers.add_parser(name, help=description)
+        mock.add_argument("--devices", type=int, nargs="+", default=[10, 100, 1000, 5000])
+        mock.add_argument("--connections", type=int, default=32)
+        mock.add_argument("--port", type=int, default=8022)
+        mock.add_argument("--external", action="store_true", help="Use a MockIOSServer.py that is already running on --port")
+        mock.add_argument("--login-delay", type=float, default=0.02, help="Seconds the mock takes to check the password")
+        mock.add_argument("--command-delay", type=float, default=0.01, help="Seconds the mock takes to answer a command")
+        mock.add_argument("--run-lines", type=int, default=200, help="Lines of show run")
+        mock.add_argument("--fail-auth", type=float, default=0.0, help="Share of logins the mock rejects (0-1)")
+        mock.add_argument("--drop", type=float, default=0.0, help="Chance the mock drops the connection after a command (0-1)")
+        mock.add_argument("--size", type=int, default=64, help="KB per transferred file")
+        mock.add_argument("--verify", action="store_true", help="VERIFY_TRANSFERS=True")
+    args: Namespace = parser.parse_args()
+    if args.benchmark == "scheduler": run(benchmark_scheduler(args))
+    elif args.benchmark == "buffer": run(benchmark_buffer(args))
+    elif args.benchmark in ("execution", "transfer"): run(benchmark_mock(args, args.benchmark == "transfer"))
+
+if __name__ == "__main__":
+    main()
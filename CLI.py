@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# Written by Rune Johannesen, (c)2021-2023
+from os import getcwd, environ
+from os.path import join, dirname, realpath, exists
+from argparse import ArgumentParser, Namespace
+from getpass import getpass
+from asyncio import run, set_event_loop_policy
+from multiprocessing import freeze_support
+from sys import version_info, platform, stderr, exit
+from Configurator_Object import DeviceResult
+from Tasks import Tasks, read_devices, read_show_check, read_global, read_port
+"""
+-----------
+How to use:
+-----------
+    Runs the tasks of the GUI without a display (cron, CI runners), neither tkinter, ttkbootstrap nor PIL are imported.
+    Takes the same template files as the GUI (see Configuration Templates) and writes the same SHOW_CONFIGURATIONS,
+    CHECK_CONFIGURATIONS, DEVICE_CONFIGURATIONS and METRICS files.
+    python CLI.py --devices 1_device_list.txt [--show-check 2_show_check.txt] [--global 3_global.txt] [--port 4_port.txt] [--save | --no-save]
+        --username: Default is the CONFIGURATOR_USERNAME environment variable
+        The password is read from the CONFIGURATOR_PASSWORD environment variable, or asked for when it is not set
+        --save: Write memory on all devices, this is done by default when --global or --port is used (like the GUI), unless --no-save
+        --output: Directory of the result folders, default is the directory of the program (same as the GUI)
+        --pipeline: Move every device through the configuration phases on its own, instead of running every phase on all devices
+                    before the next phase starts
+        --quiet: Only print the results, not the progress
+        --delta: Only push the global and port configuration lines that are missing from the running-config, devices where nothing
+                 is missing are not reloaded or transferred to, and are printed as "Up to date"
+        --adaptive: Raise the number of devices worked on at the same time above 6 (up to 64) while the logins stay fast
+        --verify: Verify the SCP transfers with "verify /md5" on the device, files that are already on the device are not uploaded again
+        --resume: Skip the devices and phases completed by the last run of the same files, when that run did not finish (see RunJournal.py)
+    The results are printed one device per line, exit status: 0 = all devices OK, 1 = one or more devices failed, 2 = invalid arguments
+"""
+
+class CLI(Tasks):
+	def __init__(self, current_dir: str, save: bool, quiet: bool) -> None:
+		super().__init__(current_dir)
+		self.save: bool = save
+		self.quiet: bool = quiet
+		self.failed: int = 0
+
+	def save_task(self) -> bool:
+		return(self.save)
+
+	def status(self, text: str) -> None:
+		if not self.quiet: print(text, file=stderr, flush=True)
+
+	def error(self, text: str) -> None:
+		self.failed += 1
+		print(text, file=stderr, flush=True)
+
+	def result(self, task: str, ip: str, hostname: str, text: str, failed: bool) -> None:
+		if failed: self.failed += 1
+		print(f"{task:<7} {ip:<16} {hostname.rstrip('#'):<30} {'FAILED' if failed else 'OK':<7} {text}", flush=True)
+
+	def show_done(self, results: list) -> None:
+		for device in results:
+			device: DeviceResult
+			self.result("SHOW", device.ip, device.hostname, device.reason if device.failed else device.path, device.failed)
+
+	def check_done(self, results: list) -> None:
+		for device in results: # [ipaddress, hostname, [check results], csv file]
+			failed: bool = not device[2] or not device[2][0].startswith(("OK", "NOT FOUND"))
+			if failed: self.result("CHECK", device[0], device[1], device[2][0] if device[2] else "", True)
+			else: self.result("CHECK", device[0], device[1], f"{len([x for x in device[2] if x.startswith('OK')])} of {len(device[2])} found ({device[3]})", False)
+
+	def device_done(self, index: int, precheck: DeviceResult) -> None:
+		self.device_result(precheck, self.device_sub_results)
+
+	def config_done(self, reload_start: list, scp_ena: list, scp_transfer: list, copy: list, scp_dis: list, reload_cancel: list, results: list) -> None:
+		sub_results: list = [None, None, reload_start, scp_ena, scp_transfer, copy, scp_dis, reload_cancel]
+		for precheck in results:
+			self.device_result(precheck, sub_results)
+
+	def device_result(self, precheck: DeviceResult, sub_results: list) -> None:
+		if precheck.failed:
+			self.result("CONFIG", precheck.ip, precheck.hostname, precheck.reason, True)
+			return
+		if precheck.ip in self.up_to_date:
+			self.result("CONFIG", precheck.ip, precheck.hostname, "Up to date, nothing pushed", False)
+			return
+		phases: list = []
+		failed: bool = False
+		for i in range(2, len(self.device_subjects)):
+			for data in sub_results[i]:
+				if precheck.ip == data[0]:
+					if i == 4: ok: bool = data[1] is True # SCP transfer result: [ipaddress, True/False, destination or error description]
+					else: ok: bool = not data.failed
+					failed: bool = failed or not ok
+					phases.append(f"{self.device_subjects[i]}: {'OK' if ok else 'FAILED'}")
+					break
+		self.result("CONFIG", precheck.ip, precheck.hostname, ", ".join(phases), failed)
+
+	def save_done(self, results: list) -> None:
+		for device in results:
+			device: DeviceResult
+			self.result("SAVE", device.ip, device.hostname, device.reason if device.failed else "write memory", device.failed)
+
+	def run_done(self, summary: str) -> None:
+		print(summary, file=stderr, flush=True)
+
+def argument_path(path: str) -> str:
+	"""The first Configurator changes to the directory of Configurator_Object, so the paths are made absolute before the run"""
+	return(realpath(join(getcwd(), path)))
+
+def main() -> None:
+	parser = ArgumentParser(description="Configurator without the GUI")
+	parser.add_argument("--devices", required=True, help="Device list, one IP address per line")
+	parser.add_argument("--show-check", help="Show/Check commands (;; SHOW ;; and ;; CHECK ;; sections)")
+	parser.add_argument("--global", dest="global_file", help="Global configuration")
+	parser.add_argument("--port", help="Port configuration (;; INCLUDE ;;, ;; EXCLUDE ;; and ;; CONFIG ;; sections)")
+	save = parser.add_mutually_exclusive_group()
+	save.add_argument("--save", action="store_true", help="Write memory on all devices")
+	save.add_argument("--no-save", action="store_true", help="No write memory after --global or --port")
+	parser.add_argument("--username", default=environ.get("CONFIGURATOR_USERNAME", ""))
+	parser.add_argument("--output", default=dirname(realpath(__file__)), help="Directory of the result folders")
+	parser.add_argument("--pipeline", action="store_true", help="Every device moves through the configuration phases on its own")
+	parser.add_argument("--quiet", action="store_true")
+	parser.add_argument("--delta", action="store_true", help="Only push the configuration lines missing from the running-config")
+	parser.add_argument("--adaptive", action="store_true", help="Adapt the number of concurrent devices (6 up to 64) to the login times")
+	parser.add_argument("--verify", action="store_true", help="Verify the SCP transfers with verify /md5 on the device")
+	parser.add_argument("--resume", action="store_true", help="Skip the devices and phases completed by the last unfinished run")
+	args: Namespace = parser.parse_args()
+	files: list = [argument_path(x) for x in (args.devices, args.show_check, args.global_file, args.port) if x]
+	missing: list = [x for x in files if not exists(x)]
+	if missing: parser.error(f"File not found: {', '.join(missing)}")
+	if not (args.show_check or args.global_file or args.port or args.save):
+		parser.error("At least one task is needed: --show-check, --global, --port or --save")
+	if not args.username: parser.error("--username or CONFIGURATOR_USERNAME is needed")
+	tasks: CLI = CLI(argument_path(args.output), args.save or (bool(args.global_file or args.port) and not args.no_save), args.quiet)
+	tasks.pipelined_config = args.pipeline
+	tasks.devices = read_devices(argument_path(args.devices))
+	if not tasks.devices: parser.error(f"No devices found in file: {args.devices}")
+	if args.show_check:
+		tasks.show_cmd, tasks.check_cmd = read_show_check(argument_path(args.show_check))
+		if not (tasks.show_cmd or tasks.check_cmd): parser.error(f"No Show/Check commands (;; SHOW ;; or ;; CHECK ;;) found in file: {args.show_check}")
+	if args.global_file:
+		tasks.global_config = read_global(argument_path(args.global_file))
+		if not tasks.global_config: parser.error(f"No Global Configurations found in file: {args.global_file}")
+	if args.port:
+		port: tuple = read_port(argument_path(args.port))
+		if not port or not port[2]: parser.error(f"No Port Configuration commands (;; CONFIG ;;) found in file: {args.port}")
+		tasks.port_include, tasks.port_exclude, tasks.port_config = port
+	tasks.resume = args.resume
+	tasks.delta_config = args.delta
+	tasks.adaptive_connections = args.adaptive
+	tasks.verify_transfers = args.verify
+	if not args.resume and tasks.pending_run(): print("The last run of these files did not finish, use --resume to skip the completed devices", file=stderr, flush=True)
+	password: str = environ.get("CONFIGURATOR_PASSWORD", "") or getpass(f"Password for {args.username}: ")
+	if version_info[0] == 3 and version_info[1] >= 8 and platform.startswith('win'):
+		from asyncio import WindowsSelectorEventLoopPolicy
+		set_event_loop_policy(WindowsSelectorEventLoopPolicy())
+	run(tasks.run_tasks(args.username, password))
+	exit(1 if tasks.failed else 0)
+
+if __name__ == "__main__":
+	freeze_support() # Worker processes of the sharded execution in the frozen executable
+	main()
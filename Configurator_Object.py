@@ -1,17 +1,29 @@
 # -*- coding: utf-8 -*-
 # Written by Rune Johannesen, (c)2021-2023
-from concurrent.futures import ThreadPoolExecutor
-from asyncio import set_event_loop, set_event_loop_policy, wait_for, create_task, sleep, get_event_loop, as_completed, Queue, TimeoutError
+from asyncio import set_event_loop, set_event_loop_policy, wait_for, create_task, sleep, get_event_loop, gather, as_completed, run, Queue, Lock, Condition, Task, TimeoutError
 from asyncio.events import AbstractEventLoop
-from asyncio.futures import Future
-from random import uniform
 from operator import attrgetter
-from socket import socket, gethostbyname_ex, AF_INET, SOCK_STREAM
-from asyncssh import connect, scp, SSHClientConnectionOptions
+import re
+from socket import socket, gaierror, AF_INET, SOCK_STREAM
+from ipaddress import ip_address
+from time import monotonic
+from functools import partial
+from contextlib import contextmanager
+from enum import Enum
+from datetime import datetime
+from hashlib import md5
+from json import load, dump, dumps
+from random import uniform
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from os import cpu_count
+from asyncssh import connect, scp, SSHClient, SSHClientConnection, SSHClientConnectionOptions
 from asyncssh.misc import PermissionDenied
-from logging import Logger, handlers, Formatter, getLogger, INFO
-from os import mkdir, getcwd, chdir
-from os.path import splitext, basename, dirname, join, exists, realpath
+from logging import Logger, LogRecord, handlers, Formatter, getLogger, INFO
+from queue import SimpleQueue
+from atexit import register
+from os import mkdir, getcwd, chdir, replace
+from os.path import splitext, basename, dirname, join, exists, realpath, getsize
 from sys import exit, executable, version_info, platform
 import sys
 """
@@ -32,11 +44,80 @@ How to use:
                                         If the CONTROLCHAR is not found within the COMMANDTIMEOUT, the script will raise a timeout exception.
                                         Default: 15 seconds
             COMMANDSLEEP:               Time to wait after writing a command and pressing enter. Default: 0.300 seconds (300 ms).
+                                        Only used by the "legacy" READ_PROFILE.
             MAX_DEVICE_CONNECTIONS:     Maximum parallel connections allowed in the queue. Be carefull what you change here.
+                                        With ADAPTIVE_CONNECTIONS this is the starting limit.
                                         Default: 6 connections
+            ADAPTIVE_CONNECTIONS:       Grow and shrink the number of parallel connections while running (OPTIONAL)
+                                        The limit grows by one connection for every "limit" fast logins, and is halved when a login is slow
+                                        (more than 3x the fastest login and more than 1 second), fails with PermissionDenied or a timeout,
+                                        or when a connection is reset. The current limit is available as Config.CONNECTION_LIMIT.
+                                        Default: False
+            CONNECTION_CEILING:         Hard upper limit for ADAPTIVE_CONNECTIONS. Default: 64 connections
+            SPAWN_RATE:                 Maximum number of new device connections started per second, spreads the logins out instead of
+                                        sleeping before every device. 0 = no limit.
+                                        Default: 20 connections per second
             LOGIN_TIMEOUT:              Maximum time to wait for the device to respond to the script trying to login. If the device does not respond within the
                                         time set, the script will raise a timeout exception.
                                         Default: 30 seconds
+            MAX_SOCKET_CONNECTIONS:     Number of port 22 reachability probes to run at the same time. The probes are non-blocking asyncio connects,
+                                        so this can be raised to thousands (mind the open file limit of the operating system).
+                                        Default: 500 probes
+            REACHABILITY_TTL:           Seconds a device stays known as reachable after a successful probe or SSH login. Devices known as reachable
+                                        are not probed again by the next InitiateExecution/InitiateScpTransfer call. 0 = always probe.
+                                        Default: 300 seconds
+            SKIP_PROBE:                 Do not probe port 22 at all, the SSH connect itself acts as the probe (OPTIONAL)
+                                        Default: False
+            READ_PROFILE:               How command output is read from the device (OPTIONAL)
+                                        "prompt": The hostname prompt learned while clearing the buffer is compiled into a regex, and the reader
+                                                  returns as soon as the prompt appears. No fixed sleep is done after writing a command.
+                                        "legacy": Sleep COMMANDSLEEP after every write and poll until the buffer ends with a CONTROLCHAR.
+                                        After login "prompt" runs a state machine (banner, Username:, > exec, Password:, privileged prompt,
+                                        access denied) that answers every prompt as soon as it arrives, with a deadline per state in
+                                        Config.LOGIN_DEADLINES, instead of waiting up to 10 seconds for the device to go quiet. The learned
+                                        prompt of every device is kept in Config.PROMPTS ({ipaddress: "SW01#"}). After a "hostname" line any
+                                        prompt ends that line, the new prompt is learned from it and used for the next commands and logins.
+                                        Default: "prompt"
+            BATCH_SIZE:                 Number of configuration mode lines written to the device at once (OPTIONAL, "prompt" READ_PROFILE only)
+                                        The lines between "conf t" and "end" are sent in windows of BATCH_SIZE lines, instead of waiting for the prompt
+                                        after every line. The echo and prompt of every line are matched back to the line, so errors like
+                                        "Invalid input detected" are still reported for the exact line. Lines with embedded answers (containing "\n")
+                                        are always sent one at a time. Do not batch commands that ask a question (e.g. crypto key generate).
+                                        Default: 0 (one line at a time)
+            VERIFY_TRANSFERS:           Verify SCP transfers with "verify /md5" on the device, and skip the upload when the file is already there (OPTIONAL)
+                                        Default: False
+            RETRY_POLICY:               RetryPolicy(ATTEMPTS, BACKOFF, MAX_BACKOFF, JITTER, RETRY_ON) used by InitiateExecution & InitiateScpTransfer (OPTIONAL)
+                                        ATTEMPTS includes the first try, the wait before the next attempt is BACKOFF*2^(attempt-1) seconds
+                                        (at most MAX_BACKOFF) plus a random JITTER fraction of it. Only the exception classes in RETRY_ON are retried.
+                                        from Configurator_Object import Configurator, RetryPolicy
+                                        Config = Configurator("username", "password", RETRY_POLICY=RetryPolicy(ATTEMPTS=4, BACKOFF=2))
+                                        Default: RetryPolicy(ATTEMPTS=2, BACKOFF=1.0, MAX_BACKOFF=30.0, JITTER=0.5, RETRY_ON=(ConnectionResetError, TimeoutError))
+            CIRCUIT_BREAKER:            A device that could not be connected to (after the retries) is skipped instantly by every later call on the
+                                        same Configurator object, e.g. the later phases of the same run. Config.FAILED holds {ipaddress: error},
+                                        Config.FAILED.clear() gives all devices a new chance (OPTIONAL)
+                                        Cleanup commands that must reach the device anyway (e.g. "reload cancel") are sent with BYPASS_BREAKER=True:
+                                        Config.InitiateExecution(DEVICELIST, COMMANDLIST, BYPASS_BREAKER=True) or Config.ExecuteOnDevice(ip, port, commands, True)
+                                        Default: True
+            ALGORITHM_CACHE:            Full path of a JSON file, that remembers the key exchange and cipher each device negotiated (OPTIONAL)
+                                        The next login to the device offers the remembered algorithms first, so the device does not end up on an expensive
+                                        key exchange (e.g. diffie-hellman-group-exchange) that is further down its own list. Without a remembered entry,
+                                        the fast algorithms (curve25519, ecdh, aes-gcm) are offered first. The handshake time of every login is kept in
+                                        Config.HANDSHAKES ({ipaddress: [seconds, True if the remembered algorithms were used]}) and the averages are logged.
+                                        asyncssh has no public API for the negotiated key exchange, it is read from the private _choose_alg of the connection
+                                        (tested with asyncssh 2.13.1, see requirements.txt). When a version of asyncssh does not have it, only the cipher is remembered.
+                                        Default: "" (no cache)
+            JSON_LOG:                   Write the log file as JSON lines instead of text, one object per record with "time", "level" and "message",
+                                        plus "device", "phase", "command", "duration" and "outcome" for the per device records (OPTIONAL)
+                                        Logging is done through a queue, the file is written by a background thread. Default: False
+                                        The log directory is created (and the working directory changed to the directory of Configurator_Object)
+                                        when the first Configurator is created, importing the module has no side effects.
+            SSH_PORT:                   TCP port of SSH on the devices, used by the reachability probe and the logins (OPTIONAL)
+                                        Default: 22 (MockIOSServer.py listens on 8022 by default)
+            REUSE_SESSIONS:             Keep the authenticated SSH connection and shell channel of each device open between calls (OPTIONAL)
+                                        Every InitiateExecution/InitiateScpTransfer call on the same Configurator object reuses the session of the
+                                        device instead of logging in again. SCP transfers open a new channel on the same connection.
+                                        Call "await Config.CloseSessions()" when the run is done.
+                                        Default: False
         << InitiateExecution >>
             Two valid formats:
             1. Same command(s) for all device(s).
@@ -55,6 +136,40 @@ How to use:
                         [['192.168.1.1', "SDN-LAB-TEST-SW01", ['Device: 192.168.1.1 Error: Invalid input detected: sh hello-test [ SKIPPED ]']]]
                         hostname might return "Not Available" if an error occurs before a connection is made.
                 [] (empty list) is returned when connectivity fails for all device(s).
+                Every entry is a DeviceResult, that can still be used like the lists above (result[0], len(result), ip, hostname, responses = result).
+                Use the attributes instead of looking for "Error" in the responses:
+                    result.ip, result.hostname, result.failed, result.kind (ErrorKind of the first error, ErrorKind.NONE if all went well),
+                    result.reason (short error description, e.g. "Invalid input detected: sh hello-test"), result.seconds,
+                    result.Output("show run") (response of a command), result.outputs (the responses & errors as listed above)
+                    result.commands: [CommandResult(command, output, kind, reason, seconds, offset, length)] for every command sent
+                from Configurator_Object import Configurator, ErrorKind
+                failed = [result.ip for result in results if result.kind is ErrorKind.PERMISSION_DENIED]
+            3. Spool mode, for very large outputs (e.g. show tech-support on many devices).
+                results = await Config.InitiateExecution([["192.168.209.6"], ["Next IP address"]], ["terminal length 0", "show tech-support"], SPOOL_DIR="C:\\Python\\Configurator\\SHOW_CONFIGURATIONS")
+                Every response is written to SPOOL_DIR/ipaddress_hostname_dd-mm-YYYY_HH-MM.txt while it is received, instead of being kept in memory.
+                Returns:
+                    [[ipaddress, hostname, [listoferrors], fullpathoffile, bytes written]]
+                    [['192.168.209.6', 'SDN-LAB-TEST-SW01#', [], 'C:\\Python\\Configurator\\SHOW_CONFIGURATIONS\\192.168.209.6_SDN-LAB-TEST-SW01_01-01-2023_12-00.txt', 2834617]]
+                    An empty list of errors means all commands succeeded, errors are also written to the file.
+                    The offset & length of every CommandResult point to the response of the command in the file.
+                    Devices that failed before a file could be created are returned in the normal [ipaddress, hostname, [listoferrors]] format.
+        << StreamExecution >>
+            Same arguments as InitiateExecution, but every device result is yielded as soon as the device is done, instead of returning
+            the complete list when the slowest device is done. Use it to save files or evaluate output while other devices are still running.
+                async for result in Config.StreamExecution([["192.168.209.6"], ["Next IP address"]], ["terminal length 0", "show run"]):
+                    print(result)
+                    Yields:
+                        [ipaddress, hostname, [if applicable: list of all responses from each command]] (same format as InitiateExecution)
+        << InitiateShardedExecution >>
+            Same arguments and results as InitiateExecution, for very large device lists (10.000+ devices). The device list is split into SHARDS
+            parts, and every part runs in its own worker process with its own Configurator and event loop, so the key exchanges, encryption and
+            parsing of all sessions are spread over all CPU cores. MAX_DEVICE_CONNECTIONS, SPAWN_RATE, MAX_SOCKET_CONNECTIONS and CONNECTION_CEILING
+            are divided between the shards, so the total load on the network and TACACS stays the same.
+                results = await Config.InitiateShardedExecution([["192.168.209.6"], ["Next IP address"]], ["terminal length 0", "show run"], SHARDS=4)
+                SHARDS: Number of worker processes. Default: 0 (one per CPU core)
+            StreamShardedExecution takes the same arguments and yields the results of every shard as soon as the shard is done.
+            NOTE:   Sessions, the reachability cache and the circuit breaker of a worker only live as long as the call.
+                    Frozen executables must call multiprocessing.freeze_support() at startup (App.py does).
         << InitiateScpTransfer >>
             Use this to transfer large configurations directly to the local storage on a device.
             Afterwards, you can use the above function to copy the configuration file to the running config of the device.
@@ -71,18 +186,57 @@ How to use:
                         Example:
                             [[False, '192.168.1.1', 'SCP transfer failed. Device: 192.168.1.1 Error: Administratively disabled. Please enable SCP on your device.']]
                     None is returned when connectivity fails for all device(s).
-        NOTE:   Both InitiateExecution & InitiateScpTransfer will test connectivity on port 22 before connecting to any device(s).
+            NOTE:   With VERIFY_TRANSFERS=True the MD5 of the local file is compared with "verify /md5 Fulldestinationpath" on the device.
+                    The upload is skipped when the file is already on the device, and retried once when the MD5 does not match after the upload.
+                    True is only returned when the MD5 on the device matches, so it is safe to copy the file to the running config afterwards.
+                    Devices without "verify /md5" (Invalid input / Unknown command) can not be verified, the upload is trusted as with VERIFY_TRANSFERS=False.
+        << InitiatePipeline >>
+            Runs a whole workflow per device instead of one phase at a time for all devices. Each device moves through the workflow on its own,
+            while at most MAX_DEVICE_CONNECTIONS devices are worked on at the same time.
+            1. Function takes: [[ipaddr], [Next IP address]] and an async function, that is called with the connectivity result of each device:
+                [ipaddress, 22] or a failed DeviceResult ([ipaddress, "Not Available", [listoferrors]]) if the device could not be reached.
+                The workflow can use ExecuteOnDevice & TransferOnDevice to run commands and SCP transfers on the device.
+                async def workflow(device):
+                    if len(device) > 2: return(device)
+                    return(await Config.ExecuteOnDevice(device[0], device[1], ["terminal length 0", "show run"]))
+                results = await Config.InitiatePipeline([["192.168.209.6"], ["Next IP address"]], workflow)
+            print(results)
+                Returns:
+                    A list with the return value of the workflow for each device.
+            ExecuteOnDevice returns the same DeviceResult entry as InitiateExecution.
+            TransferOnDevice returns the same [ipaddress, True/False, destination or error description] entry as InitiateScpTransfer.
+        << Metrics >>
+            Config.METRICS keeps latency histograms per phase (dns, probe, connect, handshake, clear_buffer, command, device, upload, transfer)
+            and counters (devices_ok, devices_failed, errors_<kind>, upload_bytes, transfers_<outcome>, ...) for the lifetime of the object.
+            devices, devices_ok & devices_failed count every device once, however many calls it was part of. A device is failed when any call failed.
+                print(Config.METRICS.Summary())
+                print(Config.METRICS.Quantile("connect", 0.99))
+                Config.METRICS.Export("C:\\Python\\Configurator\\metrics.json", "C:\\node_exporter\\textfile\\configurator.prom")
+            The metrics of the shards of InitiateShardedExecution are merged into Config.METRICS.
+        NOTE:   InitiateExecution, InitiateScpTransfer & InitiatePipeline will test connectivity on port 22 (SSH_PORT) before connecting to any device(s).
+                The connect time of each device is kept in Config.DEVICE_RTT ({ipaddress: seconds}), the slowest devices are started first.
     asyncio.run(main())
 """
 SCRIPT_NAME: str = splitext(basename(executable))[0]+"_Object"
 if "python" in SCRIPT_NAME.lower(): SCRIPT_NAME: str = splitext(basename(__file__))[0]
 SCRIPT_DIR: str = dirname(realpath(__file__))
-CURRENT_DIR: str = getcwd()
-if getattr(sys, 'frozen', False):
-    CURRENT_DIR: str = dirname(realpath(executable))
-if SCRIPT_DIR != CURRENT_DIR:
-    chdir(SCRIPT_DIR)
-    CURRENT_DIR: str = SCRIPT_DIR
+
+class QueueLogHandler(handlers.QueueHandler):
+    """Puts the record on the queue as it is. The message, the structured fields and tracebacks are formatted
+    by the QueueListener thread, so PLOG.info on the event loop does no formatting and no file I/O."""
+    def prepare(self, record: LogRecord) -> LogRecord:
+        return(record)
+
+class JsonFormatter(Formatter):
+    """One JSON object per line, with the structured fields of log_event when the record has them"""
+    FIELDS: tuple = ("device", "phase", "command", "duration", "outcome")
+    def format(self, record: LogRecord) -> str:
+        entry: dict = {"time": self.formatTime(record, self.datefmt), "level": record.levelname, "message": record.getMessage().strip()}
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None and value != "": entry[field] = round(value, 4) if isinstance(value, float) else value
+        if record.exc_info: entry["traceback"] = self.formatException(record.exc_info)
+        return(dumps(entry))
 
 def setup_logger(name: str, log_file: str, log_dir: str, current_dir: str, level=INFO) -> Logger:
     LoggingDir: str = join(current_dir, log_dir)
@@ -91,12 +245,509 @@ def setup_logger(name: str, log_file: str, log_dir: str, current_dir: str, level
     LogFormat: Formatter = Formatter('%(asctime)s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
     LogHandler: handlers.TimedRotatingFileHandler = handlers.TimedRotatingFileHandler(LoggingFullPath, 'midnight', 1, backupCount=90)
     LogHandler.setFormatter(LogFormat)
+    logQueue: SimpleQueue = SimpleQueue()
+    listener: handlers.QueueListener = handlers.QueueListener(logQueue, LogHandler)
+    listener.start()
+    register(listener.stop) # Writes the records that are still queued when the program exits
+    queueHandler: QueueLogHandler = QueueLogHandler(logQueue)
+    queueHandler.listener = listener
     logger: getLogger = getLogger(name)
     logger.setLevel(level)
-    logger.addHandler(LogHandler)
+    logger.addHandler(queueHandler)
     return(logger)
 
-PLOG: setup_logger = setup_logger(SCRIPT_NAME, SCRIPT_NAME+".log", SCRIPT_NAME.upper()+"_LOG", CURRENT_DIR)
+def set_log_format(logger: Logger, json: bool) -> None:
+    """Switches the log file between the text format and JSON lines"""
+    formatter: Formatter = JsonFormatter(datefmt='%Y-%m-%d %H:%M:%S') if json else Formatter('%(asctime)s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    for handler in logger.handlers:
+        for target in getattr(getattr(handler, "listener", None), "handlers", ()):
+            target.setFormatter(formatter)
+
+def flush_logger(logger: Logger) -> None:
+    """Waits until the queued records are written, worker processes exit without running atexit"""
+    for handler in logger.handlers:
+        listener: handlers.QueueListener = getattr(handler, "listener", None)
+        if listener is not None and listener._thread is not None:
+            listener.stop()
+            listener.start()
+
+def log_event(message: str, device: str = "", phase: str = "", command: str = "", duration: float = None, outcome: str = "") -> None:
+    """PLOG.info with structured fields, written as separate keys in the JSON log"""
+    PLOG.info(message, extra={"device": device, "phase": phase, "command": command, "duration": duration, "outcome": outcome})
+
+def start_logging() -> Logger:
+    """Changes to the directory of the program and attaches the log file to PLOG. Done by the first Configurator instead of on import,
+    so importing Configurator_Object (e.g. while the GUI starts) creates no directories and does not change the working directory."""
+    if any(isinstance(handler, handlers.QueueHandler) for handler in PLOG.handlers): return(PLOG) # Also a shard, see start_shard_logging
+    CURRENT_DIR: str = dirname(realpath(executable)) if getattr(sys, 'frozen', False) else getcwd()
+    if SCRIPT_DIR != CURRENT_DIR:
+        chdir(SCRIPT_DIR)
+        CURRENT_DIR: str = SCRIPT_DIR
+    return(setup_logger(SCRIPT_NAME, SCRIPT_NAME+".log", SCRIPT_NAME.upper()+"_LOG", CURRENT_DIR))
+
+PLOG: Logger = getLogger(SCRIPT_NAME) # Without a handler until start_logging
+
+def start_shard_logging(logQueue) -> None:
+    """Initializer of the shard processes. Their records are sent to the log file of the parent (shard_log_listener) instead of
+    every shard rotating the same file. The standard QueueHandler formats the message and traceback, so the record can be pickled."""
+    PLOG.setLevel(INFO)
+    PLOG.addHandler(handlers.QueueHandler(logQueue))
+
+def shard_log_listener(logQueue) -> handlers.QueueListener:
+    """Writes the records of the shards with the file handler of PLOG"""
+    targets: list = [target for handler in PLOG.handlers for target in getattr(getattr(handler, "listener", None), "handlers", ())]
+    listener: handlers.QueueListener = handlers.QueueListener(logQueue, *targets)
+    listener.start()
+    return(listener)
+
+class SessionClient(SSHClient):
+    """Removes the device from the session pool when the connection is closed or lost.
+    Also records the negotiated key exchange and the handshake time (TCP connected to authenticated) of the connection."""
+    def __init__(self, sessions: dict, device_ip: str) -> None:
+        self.sessions: dict = sessions
+        self.device_ip: str = device_ip
+        self.connection: SSHClientConnection = None
+        self.kex: str = ""
+        self.connected: float = 0.0
+        self.handshake: float = 0.0
+
+    def connection_made(self, connection: SSHClientConnection) -> None:
+        self.connection: SSHClientConnection = connection
+        self.connected: float = monotonic()
+        choose_alg = getattr(connection, "_choose_alg", None) # Private (asyncssh 2.13.1), there is no get_extra_info for the key exchange
+        if not callable(choose_alg): return # The key exchange is not recorded, see ALGORITHM_CACHE
+        def record_alg(*args, **kwargs) -> bytes:
+            alg: bytes = choose_alg(*args, **kwargs)
+            if args and args[0] == "key exchange" and isinstance(alg, bytes): self.kex: str = alg.decode("ascii", "replace")
+            return(alg)
+        try:
+            connection._choose_alg = record_alg
+        except AttributeError: pass
+
+    def auth_completed(self) -> None:
+        self.handshake: float = monotonic()-self.connected
+
+    def connection_lost(self, exc: Exception) -> None:
+        session: list = self.sessions.get(self.device_ip)
+        if session and session[0] is self.connection:
+            del self.sessions[self.device_ip]
+
+class ErrorKind(Enum):
+    """Why a command or device failed, NONE when it succeeded"""
+    NONE = 0
+    UNREACHABLE = 1         # Port 22 probe failed, connection refused or no route
+    TIMEOUT = 2             # SSH connect timed out
+    CONNECTION_RESET = 3
+    PERMISSION_DENIED = 4   # Wrong username/password
+    ENABLE_DENIED = 5       # Could not enter enable mode
+    AUTHORIZATION = 6       # % Authorization Failed
+    DISCONNECTED = 7        # Terminal was disconnected while clearing the buffer
+    CLEAR_BUFFER = 8        # No prompt after login
+    COMMAND_TIMEOUT = 9
+    PAGING = 10             # --More-- seen, terminal length 0 is missing
+    INVALID_INPUT = 11
+    UNKNOWN_COMMAND = 12
+    SKIPPED = 13            # Circuit breaker, or skipped because an earlier step failed
+    EXCEPTION = 14
+
+class LoginState(Enum):
+    """Where ClearBuffer is while it takes a new shell to the privileged prompt"""
+    BANNER = "banner"           # Banner/MOTD, no prompt seen yet
+    USERNAME = "username"       # Username: asked in the shell, CLI_USER sent
+    EXEC = "exec"               # User exec prompt (>), enable sent
+    PASSWORD = "password"       # Password: asked for the login or for enable
+    PRIVILEGED = "privileged"   # Prompt ending with a CONTROLCHAR, ready for commands
+    DENIED = "denied"           # Wrong password/enable secret, or back at > after enable
+
+class CommandResult():
+    """Result of one command. output is the response (or the error message), in spool mode the response is referenced by
+    offset/length in the spool file of the device instead, and output is "" unless the command failed."""
+    __slots__ = ("command", "output", "kind", "reason", "seconds", "offset", "length")
+    def __init__(self, command: str, output: str = "", kind: ErrorKind = ErrorKind.NONE, seconds: float = 0.0, offset: int = -1, length: int = 0) -> None:
+        self.command: str = command
+        self.output: str = output
+        self.kind: ErrorKind = kind
+        self.reason: str = self.Reason(output) if kind is not ErrorKind.NONE else "" # Parsed once here, instead of by every consumer
+        self.seconds: float = seconds
+        self.offset: int = offset
+        self.length: int = length
+
+    @staticmethod
+    def Reason(message: str) -> str:
+        """The short error description: "Device: 10.0.0.1 Error: Reached timeout ... [ SKIPPED ]" -> "Reached timeout ..." """
+        reason: str = message.split("Error:", 1)[-1].lstrip()
+        return(reason.split("\n", 1)[0].split(" [ SKIPPED ]", 1)[0])
+
+    @property
+    def failed(self) -> bool:
+        return(self.kind is not ErrorKind.NONE)
+
+class DeviceResult():
+    """Result of a device. Also behaves like the [ipaddress, hostname, [responses]] list (+ [path, size] in spool mode)
+    that was returned before, so result[0], len(result) and ipaddress, hostname, responses = result keep working."""
+    __slots__ = ("ip", "hostname", "commands", "path", "size", "seconds")
+    def __init__(self, ip: str, hostname: str = "Not Available", commands: list = None, path: str = "", size: int = 0, seconds: float = 0.0) -> None:
+        self.ip: str = ip
+        self.hostname: str = hostname
+        self.commands: list = commands if commands is not None else [] # [CommandResult], device errors are a CommandResult with command ""
+        self.path: str = path # Spool file, or the file the outputs were saved to
+        self.size: int = size
+        self.seconds: float = seconds
+
+    @classmethod
+    def Failed(cls, ip: str, kind: ErrorKind, message: str, hostname: str = "Not Available") -> "DeviceResult":
+        return(cls(ip, hostname, [CommandResult("", message, kind)]))
+
+    @property
+    def errors(self) -> list:
+        return([command for command in self.commands if command.kind is not ErrorKind.NONE])
+
+    @property
+    def failed(self) -> bool:
+        return(any(command.kind is not ErrorKind.NONE for command in self.commands))
+
+    @property
+    def kind(self) -> ErrorKind:
+        """Kind of the first error, ErrorKind.NONE if every command succeeded"""
+        return(next((command.kind for command in self.commands if command.kind is not ErrorKind.NONE), ErrorKind.NONE))
+
+    @property
+    def reason(self) -> str:
+        return(next((command.reason for command in self.commands if command.kind is not ErrorKind.NONE), ""))
+
+    @property
+    def outputs(self) -> list:
+        """The responses and error messages in command order, commands without a response are left out"""
+        return([command.output for command in self.commands if command.output])
+
+    def Output(self, command: str) -> str:
+        """Response of the command, "" if it had none or failed"""
+        return(next((result.output for result in self.commands if result.command == command and result.kind is ErrorKind.NONE), ""))
+
+    def Release(self) -> None:
+        """Drops the responses once they are saved, the errors, timings and spool references are kept"""
+        for command in self.commands:
+            if command.kind is ErrorKind.NONE: command.output = ""
+
+    def AsList(self) -> list:
+        return([self.ip, self.hostname, self.outputs]+([self.path, self.size] if self.path else []))
+
+    def __getitem__(self, index):
+        return(self.AsList()[index])
+
+    def __len__(self) -> int:
+        return(len(self.AsList()))
+
+    def __iter__(self):
+        return(iter(self.AsList()))
+
+    def __repr__(self) -> str:
+        return("DeviceResult("+repr(self.AsList())+")")
+
+class OutputBuffer():
+    """Command output as a list of chunks, joined once when it is needed. Prompt and error detection only looks at the newly received chunk
+    and a bounded tail of the output before it, so reading a large show tech-support is linear instead of quadratic.
+    With a SPOOL, everything before the tail is written to the spool file instead of being kept, Value() then only returns the tail."""
+    __slots__ = ("chunks", "size", "tail", "TAIL", "SPOOL")
+    def __init__(self, text: str = "", TAIL: int = 1024, SPOOL: "SpoolFile" = None) -> None:
+        self.TAIL: int = TAIL
+        self.SPOOL: SpoolFile = SPOOL
+        self.chunks: list = []
+        self.size: int = 0
+        self.tail: str = ""
+        if text: self.Append(text)
+
+    def __len__(self) -> int:
+        return(self.size)
+
+    def Append(self, chunk: str) -> str:
+        """Adds the chunk, returns the chunk with the tail before it, for searching text that was split between two chunks"""
+        window: str = self.tail+chunk
+        self.size += len(chunk)
+        self.tail: str = window[-self.TAIL:]
+        if self.SPOOL is None: self.chunks.append(chunk)
+        elif len(window) > self.TAIL: self.SPOOL.Write(window[:-self.TAIL])
+        return(window)
+
+    def EndsWith(self, suffixes: list) -> bool:
+        return(self.tail.endswith(tuple(suffixes)))
+
+    def Search(self, pattern: re.Pattern, start: int = 0):
+        """Searches the tail for a pattern anchored at the end of the output (e.g. the prompt), start is a position in the whole output"""
+        offset: int = self.size-len(self.tail)
+        return(pattern.search(self.tail, max(start-offset, 1 if offset else 0))) # "^" may only match at the real start of the output
+
+    def Value(self) -> str:
+        if self.SPOOL is not None: return(self.tail)
+        if len(self.chunks) > 1: self.chunks: list = ["".join(self.chunks)]
+        return(self.chunks[0] if self.chunks else "")
+
+    def Strip(self) -> str:
+        """Value() without surrounding whitespace, when the start of the output is already spooled only the end is stripped"""
+        if self.SPOOL is not None and self.size > len(self.tail): return(self.tail.rstrip())
+        return(self.Value().strip())
+
+class SpoolFile():
+    """Output file of one device in spool mode"""
+    __slots__ = ("path", "file")
+    def __init__(self, spool_dir: str, device_ip: str, hostname: str, today: str) -> None:
+        name: str = "".join(c for c in hostname if c.isalpha() or c.isdigit() or c in "-_.() ") # Same file names as the show files of the GUI
+        self.path: str = join(spool_dir, device_ip+"_"+name+"_"+today+".txt")
+        self.file = open(self.path, "w")
+
+    def Write(self, text: str) -> None:
+        self.file.write(text.replace("\r", ""))
+
+    def Tell(self) -> int:
+        return(self.file.tell())
+
+    def Close(self) -> int:
+        """Closes the file, returns the number of bytes written"""
+        size: int = self.file.tell()
+        self.file.close()
+        return(size)
+
+class AdaptiveLimiter():
+    """AIMD limit on the number of devices worked on at the same time, between FLOOR and CEILING.
+    Additive increase: +1/limit for every fast login. Multiplicative decrease: the limit is halved on congestion, at most once per COOLDOWN seconds,
+    so a burst of failures from the same overloaded TACACS server only counts once."""
+    def __init__(self, START: int, CEILING: int, FLOOR: int = 1, LATENCY_FACTOR: float = 3.0, SLOW_LOGIN: float = 1.0, COOLDOWN: float = 2.0) -> None:
+        self.CEILING: int = CEILING if CEILING and CEILING > 0 else 1
+        self.FLOOR: int = min(max(FLOOR, 1), self.CEILING)
+        self.LATENCY_FACTOR: float = LATENCY_FACTOR
+        self.SLOW_LOGIN: float = SLOW_LOGIN
+        self.COOLDOWN: float = COOLDOWN
+        self.limit: float = min(max(START, self.FLOOR), self.CEILING)
+        self.active: int = 0
+        self.baseline: float = 0.0 # Fastest login seen
+        self.last_decrease: float = 0.0
+        self.condition: Condition = Condition()
+
+    @property
+    def Limit(self) -> int:
+        return(int(self.limit))
+
+    async def Acquire(self) -> None:
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+
+    async def Release(self) -> None:
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def Login(self, latency: float) -> None:
+        """Feed the time a successful login took"""
+        if not self.baseline or latency < self.baseline: self.baseline: float = latency
+        if latency > max(self.baseline*self.LATENCY_FACTOR, self.SLOW_LOGIN):
+            self.Congestion("slow login: "+str(round(latency, 2))+" seconds")
+            return
+        before: int = self.Limit
+        self.limit: float = min(self.limit+1/self.limit, self.CEILING)
+        if self.Limit != before: PLOG.info("[ AdaptiveLimiter ] Limit: "+str(before)+" -> "+str(self.Limit))
+
+    def Congestion(self, reason: str) -> None:
+        """Feed a slow login, PermissionDenied, timeout or connection reset"""
+        now: float = monotonic()
+        if now-self.last_decrease < self.COOLDOWN: return
+        self.last_decrease: float = now
+        before: int = self.Limit
+        self.limit: float = max(self.limit/2, self.FLOOR)
+        PLOG.info("[ AdaptiveLimiter ] Limit: "+str(before)+" -> "+str(self.Limit)+" ("+reason+")")
+
+class RetryPolicy():
+    """Number of attempts, exponential backoff with jitter, and the exception classes that are worth another attempt"""
+    def __init__(self, ATTEMPTS: int = 2, BACKOFF: float = 1.0, MAX_BACKOFF: float = 30.0, JITTER: float = 0.5, RETRY_ON: tuple = (ConnectionResetError, TimeoutError)) -> None:
+        self.ATTEMPTS: int = ATTEMPTS if ATTEMPTS and ATTEMPTS > 0 else 1
+        self.BACKOFF: float = BACKOFF if BACKOFF and BACKOFF > 0 else 0
+        self.MAX_BACKOFF: float = MAX_BACKOFF
+        self.JITTER: float = JITTER if JITTER and JITTER > 0 else 0
+        self.RETRY_ON: tuple = tuple(RETRY_ON)
+
+    def Delay(self, attempt: int) -> float:
+        delay: float = min(self.BACKOFF*2**(attempt-1), self.MAX_BACKOFF)
+        return(delay+uniform(0, delay*self.JITTER))
+
+    async def Wait(self, e: BaseException, attempt: int, device_ip: str) -> bool:
+        """Sleeps before the next attempt, returns False when the exception is not retryable or all attempts are used"""
+        if attempt >= self.ATTEMPTS or not isinstance(e, self.RETRY_ON): return(False)
+        delay: float = self.Delay(attempt)
+        PLOG.info("[ RetryPolicy ] Device: "+device_ip+" "+type(e).__name__+" ("+str(e)+"), attempt "+str(attempt+1)+" of "+str(self.ATTEMPTS)+" in "+str(round(delay, 2))+" seconds")
+        await sleep(delay)
+        return(True)
+
+class Metrics():
+    """Latency histograms per phase (dns, probe, connect, handshake, clear_buffer, command, device, transfer, ...) and event counters.
+    The histograms use fixed buckets, so the metrics of shards can be merged and exported as Prometheus histograms."""
+    BUCKETS: tuple = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+    def __init__(self) -> None:
+        self.histograms: dict = {} # {phase: {"count": n, "sum": seconds, "min": seconds, "max": seconds, "buckets": [n per bucket, +Inf last]}}
+        self.counters: dict = {} # {event: n}
+        self.gauges: dict = {} # {name: value}
+        self.devices: dict = {} # {ipaddress: True if any call on the device failed}, so every device is counted once
+
+    def Observe(self, phase: str, seconds: float) -> None:
+        histogram: dict = self.histograms.get(phase)
+        if histogram is None:
+            histogram: dict = {"count": 0, "sum": 0.0, "min": seconds, "max": seconds, "buckets": [0]*(len(self.BUCKETS)+1)}
+            self.histograms[phase] = histogram
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+        if seconds < histogram["min"]: histogram["min"] = seconds
+        if seconds > histogram["max"]: histogram["max"] = seconds
+        histogram["buckets"][next((i for i, bound in enumerate(self.BUCKETS) if seconds <= bound), len(self.BUCKETS))] += 1
+
+    @contextmanager
+    def Measure(self, phase: str):
+        start: float = monotonic()
+        try:
+            yield
+        finally:
+            self.Observe(phase, monotonic()-start)
+
+    def Count(self, event: str, value: float = 1) -> None:
+        self.counters[event] = self.counters.get(event, 0)+value
+
+    def Gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def Device(self, result: "DeviceResult") -> None:
+        """Records the outcome of a device, called once per device and call (show, check, precheck, config, ...)"""
+        self.devices[result.ip] = self.devices.get(result.ip, False) or result.failed
+        if result.failed: self.Count("errors_"+result.kind.name.lower())
+        if result.seconds: self.Observe("device", result.seconds)
+        self.CountDevices()
+
+    def CountDevices(self) -> None:
+        failed: int = sum(self.devices.values())
+        self.counters["devices"] = len(self.devices)
+        self.counters["devices_ok"] = len(self.devices)-failed
+        self.counters["devices_failed"] = failed
+
+    def Merge(self, other: "Metrics") -> None:
+        """Adds the metrics of another Configurator, e.g. a shard"""
+        for phase, histogram in other.histograms.items():
+            mine: dict = self.histograms.get(phase)
+            if mine is None:
+                self.histograms[phase] = {"count": histogram["count"], "sum": histogram["sum"], "min": histogram["min"], "max": histogram["max"], "buckets": list(histogram["buckets"])}
+                continue
+            mine["count"] += histogram["count"]
+            mine["sum"] += histogram["sum"]
+            mine["min"] = min(mine["min"], histogram["min"])
+            mine["max"] = max(mine["max"], histogram["max"])
+            mine["buckets"] = [a+b for a, b in zip(mine["buckets"], histogram["buckets"])]
+        for event, value in other.counters.items():
+            if event not in ("devices", "devices_ok", "devices_failed"): self.Count(event, value)
+        for ip, failed in other.devices.items():
+            self.devices[ip] = self.devices.get(ip, False) or failed
+        self.CountDevices()
+
+    def Quantile(self, phase: str, q: float) -> float:
+        """Estimated from the buckets, like histogram_quantile() of Prometheus"""
+        histogram: dict = self.histograms.get(phase)
+        if not histogram: return(0.0)
+        rank: float = q*histogram["count"]
+        cumulative: int = 0
+        for i, count in enumerate(histogram["buckets"]):
+            if count and cumulative+count >= rank:
+                lower: float = max(self.BUCKETS[i-1] if i > 0 else 0.0, histogram["min"])
+                upper: float = min(self.BUCKETS[i] if i < len(self.BUCKETS) else histogram["max"], histogram["max"])
+                return(lower+(upper-lower)*(rank-cumulative)/count)
+            cumulative += count
+        return(histogram["max"])
+
+    def AsDict(self) -> dict:
+        phases: dict = {}
+        for phase, histogram in self.histograms.items():
+            phases[phase] = {"count": histogram["count"], "sum": round(histogram["sum"], 4), "mean": round(histogram["sum"]/histogram["count"], 4),
+                "min": round(histogram["min"], 4), "max": round(histogram["max"], 4), "p50": round(self.Quantile(phase, 0.5), 4),
+                "p90": round(self.Quantile(phase, 0.9), 4), "p99": round(self.Quantile(phase, 0.99), 4),
+                "buckets": dict(zip([str(bound) for bound in self.BUCKETS]+["+Inf"], histogram["buckets"]))}
+        return({"phases": phases, "counters": dict(self.counters), "gauges": dict(self.gauges)})
+
+    def Prometheus(self, prefix: str = "configurator") -> str:
+        """Prometheus text exposition format, for the textfile collector of node_exporter"""
+        lines: list = ["# HELP "+prefix+"_phase_seconds Time spent per phase of the run", "# TYPE "+prefix+"_phase_seconds histogram"]
+        for phase, histogram in sorted(self.histograms.items()):
+            cumulative: int = 0
+            for bound, count in zip([str(bound) for bound in self.BUCKETS]+["+Inf"], histogram["buckets"]):
+                cumulative += count
+                lines.append(prefix+'_phase_seconds_bucket{phase="'+phase+'",le="'+bound+'"} '+str(cumulative))
+            lines.append(prefix+'_phase_seconds_sum{phase="'+phase+'"} '+repr(histogram["sum"]))
+            lines.append(prefix+'_phase_seconds_count{phase="'+phase+'"} '+str(histogram["count"]))
+        lines += ["# HELP "+prefix+"_events_total Events counted during the run", "# TYPE "+prefix+"_events_total counter"]
+        lines += [prefix+'_events_total{event="'+event+'"} '+str(value) for event, value in sorted(self.counters.items())]
+        for name, value in sorted(self.gauges.items()):
+            lines += ["# TYPE "+prefix+"_"+name+" gauge", prefix+"_"+name+" "+str(value)]
+        return("\n".join(lines)+"\n")
+
+    def Export(self, json_path: str = "", prometheus_path: str = "") -> None:
+        """Writes the metrics as JSON and/or as a Prometheus textfile (written to a temporary file first, so the collector never reads half a file)"""
+        if json_path:
+            with open(json_path, "w", encoding="utf-8") as file:
+                dump(self.AsDict(), file, indent=1)
+        if prometheus_path:
+            with open(prometheus_path+".tmp", "w", encoding="utf-8") as file:
+                file.write(self.Prometheus())
+            replace(prometheus_path+".tmp", prometheus_path)
+
+    def Summary(self) -> str:
+        """One line summary of the run"""
+        summary: list = [str(int(self.counters.get("devices_ok", 0)))+" devices OK, "+str(int(self.counters.get("devices_failed", 0)))+" failed"]
+        for phase, name in (("connect", "login"), ("clear_buffer", "prompt"), ("command", "command"), ("transfer", "SCP")):
+            if phase in self.histograms: summary.append(name+" p50 "+str(round(self.Quantile(phase, 0.5), 2))+"s / p99 "+str(round(self.Quantile(phase, 0.99), 2))+"s")
+        return(", ".join(summary))
+
+class Scheduler():
+    """Bounded worker pool. At most MAX_WORKERS jobs run at the same time and new jobs are started at most SPAWN_RATE per second (0 = no limit).
+    A worker only takes the next item when its current job is done, exceptions are turned into an error result so a slot can never be leaked.
+    With a LIMITER, MAX_WORKERS is the hard ceiling and every job waits for a slot of the limiter."""
+    def __init__(self, MAX_WORKERS: int, SPAWN_RATE: float = 0, LIMITER: AdaptiveLimiter = None) -> None:
+        self.MAX_WORKERS: int = MAX_WORKERS if MAX_WORKERS and MAX_WORKERS > 0 else 1
+        self.SPAWN_RATE: float = SPAWN_RATE if SPAWN_RATE and SPAWN_RATE > 0 else 0
+        self.LIMITER: AdaptiveLimiter = LIMITER # Optional, further limits the running jobs below MAX_WORKERS
+        self.next_start: float = 0.0
+
+    async def Pace(self) -> None:
+        if not self.SPAWN_RATE: return
+        now: float = get_event_loop().time()
+        wait: float = self.next_start-now
+        self.next_start: float = max(now, self.next_start)+1/self.SPAWN_RATE
+        if wait > 0: await sleep(wait)
+
+    async def Run(self, ITEMS: list, WORKER, ERROR, resultsQueue: Queue) -> None:
+        """ITEMS: list <> Items to work on
+        WORKER: async function <> Called with each item, the return value is put in the resultsQueue
+        ERROR: function <> Called with the item and the exception if WORKER fails, the return value is put in the resultsQueue"""
+        pending = iter(ITEMS)
+        async def worker() -> None:
+            for item in pending:
+                acquired: bool = False
+                try:
+                    if self.LIMITER:
+                        await self.LIMITER.Acquire()
+                        acquired: bool = True
+                    await self.Pace()
+                    result = await WORKER(item)
+                except (Exception, SystemExit) as e:
+                    PLOG.info("[ Scheduler ] Exception occurred ("+str(e)+"), traceback:", exc_info=True)
+                    result = ERROR(item, e)
+                finally:
+                    if acquired: await self.LIMITER.Release()
+                await resultsQueue.put(result)
+        await gather(*[worker() for _ in range(min(self.MAX_WORKERS, len(ITEMS)))])
+
+def RunShard(SETTINGS: dict, DEVICELIST: list, COMMANDLIST: list, SPOOL_DIR: str) -> list:
+    """Runs in a worker process of InitiateShardedExecution, returns [results, Metrics]"""
+    Config = Configurator(**SETTINGS)
+    async def execute() -> list:
+        try:
+            return([await Config.InitiateExecution(DEVICELIST, COMMANDLIST, SPOOL_DIR), Config.METRICS])
+        finally:
+            await Config.CloseSessions()
+            flush_logger(PLOG)
+    return(run(execute()))
 
 class Configurator():
     if version_info[0] == 3 and version_info[1] >= 8 and platform.startswith('win'): # Check for operating system
@@ -104,7 +755,9 @@ class Configurator():
         set_event_loop(ProactorEventLoop())
         set_event_loop_policy(WindowsSelectorEventLoopPolicy()) # Bug is not present in Linux
     
-    def __init__(self, CLI_USER: str, CLI_PASS: str, CLI_ENABLE: str = "", CONTROLCHAR: list = ["#"], COMMANDTIMEOUT: int = 15, COMMANDSLEEP: float = 0.300, MAX_DEVICE_CONNECTIONS: int = 6, LOGIN_TIMEOUT: int = 30) -> None:
+    def __init__(self, CLI_USER: str, CLI_PASS: str, CLI_ENABLE: str = "", CONTROLCHAR: list = ["#"], COMMANDTIMEOUT: int = 15, COMMANDSLEEP: float = 0.300, MAX_DEVICE_CONNECTIONS: int = 6, LOGIN_TIMEOUT: int = 30, READ_PROFILE: str = "prompt", REUSE_SESSIONS: bool = False, SPAWN_RATE: float = 20, MAX_SOCKET_CONNECTIONS: int = 500, REACHABILITY_TTL: float = 300, SKIP_PROBE: bool = False, ADAPTIVE_CONNECTIONS: bool = False, CONNECTION_CEILING: int = 64, BATCH_SIZE: int = 0, VERIFY_TRANSFERS: bool = False, RETRY_POLICY: RetryPolicy = None, CIRCUIT_BREAKER: bool = True, ALGORITHM_CACHE: str = "", JSON_LOG: bool = False, SSH_PORT: int = 22) -> None:
+        self.SETTINGS: dict = {key: value for key, value in locals().items() if key != "self"} # Used to create the Configurator of a shard
+        start_logging()
         self.CLI_USER: str = CLI_USER
         self.CLI_PASS: str = CLI_PASS
         self.CLI_ENABLE: str = CLI_ENABLE if CLI_ENABLE else ""
@@ -113,14 +766,52 @@ class Configurator():
         self.COMMANDSLEEP: float = COMMANDSLEEP if COMMANDSLEEP else 0.300
         self.MAX_DEVICE_CONNECTIONS: int = MAX_DEVICE_CONNECTIONS if MAX_DEVICE_CONNECTIONS else 6
         self.LOGIN_TIMEOUT: int = LOGIN_TIMEOUT if LOGIN_TIMEOUT else 30
+        self.CONNECTION_CEILING: int = max(CONNECTION_CEILING, self.MAX_DEVICE_CONNECTIONS) if CONNECTION_CEILING else 64
+        self.LIMITER: AdaptiveLimiter = AdaptiveLimiter(self.MAX_DEVICE_CONNECTIONS, self.CONNECTION_CEILING) if ADAPTIVE_CONNECTIONS else None # Kept for the lifetime of the object, so the learned limit carries over to the next call
+        self.SPAWN_RATE: float = SPAWN_RATE if SPAWN_RATE and SPAWN_RATE > 0 else 0
+        self.READ_PROFILE: str = READ_PROFILE if READ_PROFILE in ("prompt", "legacy") else "prompt"
+        self.REUSE_SESSIONS: bool = REUSE_SESSIONS
+        self.BATCH_SIZE: int = BATCH_SIZE if BATCH_SIZE and BATCH_SIZE > 1 else 0
+        self.VERIFY_TRANSFERS: bool = VERIFY_TRANSFERS
+        self.RETRY_POLICY: RetryPolicy = RETRY_POLICY if RETRY_POLICY else RetryPolicy()
+        self.CIRCUIT_BREAKER: bool = CIRCUIT_BREAKER
+        if JSON_LOG: set_log_format(PLOG, True)
+        self.FAILED: dict = {} # Circuit breaker: {ipaddress: error} of devices that could not be connected to
+        self.SESSIONS: dict = {} # Session pool: {ipaddress: [connection, _stdin, _stdout, clear_shell]}
+        self.SESSION_LOCKS: dict = {} # One lock per device, so only one task at a time uses the pooled shell
         self.SOCKET_TIMEOUT: int = 1 # Socket timeout
-        self.MAX_SOCKET_CONNECTIONS: int = 100 # Number of connections to test at the same time
+        self.SSH_PORT: int = SSH_PORT if SSH_PORT else 22
+        self.MAX_SOCKET_CONNECTIONS: int = MAX_SOCKET_CONNECTIONS if MAX_SOCKET_CONNECTIONS else 500 # Number of connections to test at the same time
+        self.DNS_CACHE: dict = {} # Resolved addresses: {hostname: ipaddress}
+        self.DNS_FAILED: dict = {} # Names that could not be resolved: {hostname: monotonic() of the lookup}
+        self.DNS_NEGATIVE_TTL: float = 30 # Seconds a failed lookup is cached, so a DNS hiccup does not fail the device for the lifetime of the object
+        self.DEVICE_RTT: dict = {} # Port 22 connect time of the last probe: {ipaddress: seconds}
+        self.REACHABILITY_TTL: float = REACHABILITY_TTL if REACHABILITY_TTL and REACHABILITY_TTL > 0 else 0
+        self.SKIP_PROBE: bool = SKIP_PROBE
+        self.REACHABLE: dict = {} # Last time a device was proven reachable: {ipaddress: monotonic()}
         self.MAX_BUFFER: int = 65535 # Bytes, do not change, could break the program (65535 is the max possible value)
-        self.KEYALGS: list = ["curve25519-sha256","curve25519-sha256@libssh.org","curve448-sha512","ecdh-sha2-nistp521","ecdh-sha2-nistp384","ecdh-sha2-nistp256",
-                    "ecdh-sha2-1.3.132.0.10","diffie-hellman-group-exchange-sha256","diffie-hellman-group14-sha256","diffie-hellman-group15-sha512",
+        self.KEYALGS: list = ["curve25519-sha256","curve25519-sha256@libssh.org","ecdh-sha2-nistp256","ecdh-sha2-nistp384","ecdh-sha2-nistp521","curve448-sha512",
+                    "ecdh-sha2-1.3.132.0.10","diffie-hellman-group14-sha256","diffie-hellman-group-exchange-sha256","diffie-hellman-group15-sha512",
                     "diffie-hellman-group16-sha512","diffie-hellman-group17-sha512","diffie-hellman-group18-sha512","diffie-hellman-group14-sha1",
-                    "rsa2048-sha256","diffie-hellman-group1-sha1"]
-        self.ENCRYPTION: list = ["aes256-ctr", "aes192-ctr", "aes128-ctr", "aes256-cbc", "aes192-cbc", "aes128-cbc"]
+                    "rsa2048-sha256","diffie-hellman-group1-sha1"] # Fastest first, the fixed group14 before the group-exchange round trip
+        self.ENCRYPTION: list = ["aes128-gcm@openssh.com", "aes256-gcm@openssh.com", "aes256-ctr", "aes192-ctr", "aes128-ctr", "aes256-cbc", "aes192-cbc", "aes128-cbc"]
+        self.ALGORITHM_CACHE: str = ALGORITHM_CACHE if ALGORITHM_CACHE else ""
+        self.ALGORITHMS: dict = self.LoadAlgorithms() # {ipaddress: {"kex": algorithm, "cipher": algorithm, "handshake": seconds}}
+        self.NEGOTIATED: dict = {} # Entries of ALGORITHMS learned by this object, not saved yet
+        self.HANDSHAKES: dict = {} # Handshake time of every login: {ipaddress: [seconds, True if the remembered algorithms were used]}
+        self.CONNECTION_OPTIONS: dict = {} # {(kex, cipher): SSHClientConnectionOptions}, built once per algorithm order
+        self.METRICS: Metrics = Metrics() # Per phase latencies and counters for the lifetime of the object
+        self.MD5: re.Pattern = re.compile(r"=\s*([0-9a-fA-F]{32})") # verify /md5 (flash:file.cfg) = 0123456789abcdef0123456789abcdef
+        self.CONFIG_MODE: re.Pattern = re.compile(r"conf\w*\s+t\w*$") # conf t, configure terminal
+        self.HOSTNAME: re.Pattern = re.compile(r"hostname\s+\S+$") # Changes the prompt
+        self.ANY_PROMPT: re.Pattern = re.compile(r"(?:^|[\r\n])([^\s#>()]+)(?:\([^)\r\n]*\))?["+re.escape("".join(self.CONTROLCHAR))+r"#>]\s*$") # Prompt of any hostname
+        self.PROMPTS: dict = {} # Prompt learned at the last login: {ipaddress: "SW01#"}
+        self.LOGIN_DEADLINES: dict = {LoginState.BANNER: 10.0, LoginState.USERNAME: 5.0, LoginState.EXEC: 2.5, LoginState.PASSWORD: 5.0} # Seconds per login state
+        self.LOGIN_QUIET: float = 0.5 # Seconds of silence before a newline is sent to make the device print its prompt (banner only)
+        self.LOGIN_USERNAME: re.Pattern = re.compile(r"(?i)(?:username|login)\s*:\s*\Z")
+        self.LOGIN_PASSWORD: re.Pattern = re.compile(r"(?i)password\s*:\s*\Z")
+        self.LOGIN_DENIED: tuple = ("% access denied", "% bad secrets", "% bad passwords", "% authentication failed", "% login invalid")
+        self.INTERACTIVE: re.Pattern = re.compile(r"(continue\?[^\n]*|really sure[^\n]*|\[confirm\]|SHUTDOWN[^\n]*|\]\? )$") # Prompts waiting for an answer
     
     CLI_USER: property = property(attrgetter("_CLI_USER"))
 
@@ -136,102 +827,293 @@ class Configurator():
         if not clipass: raise Exception("CLI Password cannot be empty.")
         self._CLI_PASS: str = clipass
 
-    async def TestPortOnNetworkDevice(self, ipaddress: str, commandlist: list, taskQueue: Queue, resultsQueue: Queue) -> None:
+    @property
+    def CONNECTION_LIMIT(self) -> int:
+        """Number of devices worked on at the same time right now"""
+        return(self.LIMITER.Limit if self.LIMITER else self.MAX_DEVICE_CONNECTIONS)
+
+    async def ResolveHost(self, host: str) -> str:
+        """Returns the IPv4 address of the host, "" if it can not be resolved. Lookups are cached for the lifetime of the Configurator object,
+        failed lookups for DNS_NEGATIVE_TTL seconds"""
+        if host in self.DNS_CACHE: return(self.DNS_CACHE[host])
+        if host in self.DNS_FAILED and monotonic()-self.DNS_FAILED[host] < self.DNS_NEGATIVE_TTL: return("")
+        try:
+            ip_address(host)
+            address: str = host
+        except ValueError:
+            try:
+                with self.METRICS.Measure("dns"):
+                    info: list = await get_event_loop().getaddrinfo(host, self.SSH_PORT, family=AF_INET, type=SOCK_STREAM)
+                address: str = info[0][4][0] if info else ""
+            except gaierror:
+                address: str = ""
+        if not address:
+            self.DNS_FAILED[host] = monotonic()
+            self.METRICS.Count("dns_failed")
+            return(address)
+        self.DNS_FAILED.pop(host, None)
+        self.DNS_CACHE[host] = address
+        return(address)
+
+    async def TestPortOnNetworkDevice(self, ipaddress: str, commandlist: list) -> list:
         try:
-            await sleep(round(uniform(0.01, 0.09), 2))
             ipaddress: str = ipaddress.strip()
-            DnsLookup: tuple = gethostbyname_ex(ipaddress)
-            if DnsLookup[-1]:
-                ipaddress: str = DnsLookup[-1][0]
+            address: str = await self.ResolveHost(ipaddress)
+            if address:
+                ipaddress: str = address
                 loop: AbstractEventLoop = get_event_loop()
                 with socket(AF_INET, SOCK_STREAM) as sock: # Create socket stream
-                    sock.settimeout(self.SOCKET_TIMEOUT) # Set socket timeout
-                    with ThreadPoolExecutor() as executor:
-                        for result in as_completed([loop.run_in_executor(executor, sock.connect_ex, (ipaddress,22))]):
-                            result: Future
-                            results = await result
-                            if results == 0: # If SSH connection is successful
-                                if commandlist: await resultsQueue.put([ipaddress, 22, commandlist])
-                                else: await resultsQueue.put([ipaddress, 22])
-                            else: # If connection attempts failed
-                                await resultsQueue.put([ipaddress, "Not Available", ["Error: Could not connect to: "+ipaddress]])
-                                PLOG.info("[ TestPortOnNetworkDevice ]: Could not connect to: "+ipaddress)
+                    sock.setblocking(False) # Non-blocking connect on the event loop, no threads needed
+                    start: float = loop.time()
+                    try:
+                        await wait_for(loop.sock_connect(sock, (ipaddress, self.SSH_PORT)), self.SOCKET_TIMEOUT)
+                        reachable: bool = True
+                    except (OSError, TimeoutError):
+                        reachable: bool = False
+                if reachable: # If SSH connection is successful
+                    self.DEVICE_RTT[ipaddress] = loop.time()-start
+                    self.METRICS.Observe("probe", self.DEVICE_RTT[ipaddress])
+                    if commandlist: return([ipaddress, self.SSH_PORT, commandlist])
+                    else: return([ipaddress, self.SSH_PORT])
+                else: # If connection attempts failed
+                    log_event("[ TestPortOnNetworkDevice ]: Could not connect to: "+ipaddress, ipaddress, "probe", outcome=ErrorKind.UNREACHABLE.name)
+                    self.METRICS.Count("probe_failed")
+                    return(DeviceResult.Failed(ipaddress, ErrorKind.UNREACHABLE, "Error: Could not connect to: "+ipaddress))
             else: PLOG.info("[ TestPortOnNetworkDevice ]: Unable to resolve: "+ipaddress)
-            taskQueue.task_done()
-            taskQueue.get_nowait()
+            return([])
         except Exception as e:
             e: str = str(e)
             PLOG.info("[ TestPortOnNetworkDevice ] [ "+ipaddress+" ] Exception occurred ("+e+"), traceback:", exc_info=True)
             exit()
 
-    async def CheckDeviceConnectivity(self, deviceList: list) -> list:
+    def IsReachable(self, ipaddress: str) -> bool:
+        """True if the device was proven reachable within the last REACHABILITY_TTL seconds"""
+        return(ipaddress in self.REACHABLE and monotonic()-self.REACHABLE[ipaddress] < self.REACHABILITY_TTL)
+
+    async def CheckDeviceConnectivity(self, deviceList: list, BYPASS_BREAKER: bool = False) -> list:
         try:
             CheckConnectivity: list = []
             AppendResults = CheckConnectivity.append
-            taskQueue: Queue = Queue(maxsize=self.MAX_SOCKET_CONNECTIONS)
             resultsQueue: Queue = Queue()
+            probeList: list = []
+            hosts: list = list({device[0].strip() for device in deviceList})
+            addresses: dict = dict(zip(hosts, await gather(*[self.ResolveHost(host) for host in hosts]))) # All lookups at the same time, not one by one
             for device in deviceList:
                 device: list
-                if len(device) > 1:
-                    await taskQueue.put(create_task(self.TestPortOnNetworkDevice(device[0], device[1], taskQueue, resultsQueue)))
-                else:
-                    await taskQueue.put(create_task(self.TestPortOnNetworkDevice(device[0], [], taskQueue, resultsQueue)))
-            await taskQueue.join()
+                address: str = addresses[device[0].strip()]
+                if address in self.FAILED and not BYPASS_BREAKER:
+                    AppendResults(DeviceResult.Failed(address, ErrorKind.SKIPPED, self.Skipped(address)))
+                elif address and (self.SKIP_PROBE or self.IsReachable(address)):
+                    if len(device) > 1 and device[1]: AppendResults([address, self.SSH_PORT, device[1]])
+                    else: AppendResults([address, self.SSH_PORT])
+                else: probeList.append(device)
+            def worker(device: list):
+                return(self.TestPortOnNetworkDevice(device[0], device[1] if len(device) > 1 else []))
+            def error(device: list, e: BaseException) -> list:
+                return(DeviceResult.Failed(device[0].strip(), ErrorKind.UNREACHABLE, "Error: Could not connect to: "+device[0].strip()))
+            await Scheduler(self.MAX_SOCKET_CONNECTIONS).Run(probeList, worker, error, resultsQueue)
             while not resultsQueue.empty():
-                AppendResults(await resultsQueue.get())
+                result: list = await resultsQueue.get()
+                if result:
+                    if not isinstance(result, DeviceResult): self.REACHABLE[result[0]] = monotonic()
+                    else: self.Trip(result)
+                    AppendResults(result)
                 resultsQueue.task_done()
             await resultsQueue.join()
-            PLOG.info("[ CheckDeviceConnectivity ]: Checking device connectivity... [ COMPLETED ]")
+            PLOG.info("[ CheckDeviceConnectivity ]: Checking device connectivity... "+str(len(probeList))+" probed, "+str(len(deviceList)-len(probeList))+" known as reachable [ COMPLETED ]")
             return(CheckConnectivity)
         except Exception as e:
             e: str = str(e)
             PLOG.info("[ CheckDeviceConnectivity ] Exception occurred ("+e+"), traceback:", exc_info=True)
             exit()
 
-    async def ClearBuffer(self, _stdin, _stdout, controlchar: list) -> str:
+    def Trip(self, result: list) -> list:
+        """Opens the circuit breaker of the device in the error result (DeviceResult or SCP result), later calls skip the device"""
+        if self.CIRCUIT_BREAKER:
+            self.FAILED[result[0]] = result[2][0] if isinstance(result[2], list) else result[2]
+            self.REACHABLE.pop(result[0], None)
+        return(result)
+
+    def Skipped(self, device_ip: str) -> str:
+        reason: str = self.FAILED[device_ip].split("Error:", 1)[-1].replace("[ SKIPPED ]", "").strip()
+        return("Device: "+device_ip+" Error: Skipped, failed earlier in this run: "+reason+" [ SKIPPED ]")
+
+    def DeviceScheduler(self) -> Scheduler:
+        if self.LIMITER: return(Scheduler(self.CONNECTION_CEILING, self.SPAWN_RATE, self.LIMITER))
+        return(Scheduler(self.MAX_DEVICE_CONNECTIONS, self.SPAWN_RATE))
+
+    def Congestion(self, reason: str) -> None:
+        if self.LIMITER: self.LIMITER.Congestion(reason)
+
+    def LoadAlgorithms(self) -> dict:
+        """Reads the ALGORITHM_CACHE file, {} when there is no cache"""
+        if not self.ALGORITHM_CACHE or not exists(self.ALGORITHM_CACHE): return({})
+        try:
+            with open(self.ALGORITHM_CACHE, "r", encoding="utf-8") as file:
+                algorithms: dict = load(file)
+            return(algorithms if isinstance(algorithms, dict) else {})
+        except (OSError, ValueError) as e:
+            PLOG.info("[ LoadAlgorithms ]: Ignoring unreadable algorithm cache "+self.ALGORITHM_CACHE+" ("+str(e)+")")
+            return({})
+
+    def SaveAlgorithms(self) -> None:
+        """Merges the algorithms negotiated since the last save into the ALGORITHM_CACHE file, and logs the average handshake times"""
+        if not self.ALGORITHM_CACHE or not self.NEGOTIATED: return
+        algorithms: dict = self.LoadAlgorithms() # Another Configurator (e.g. a shard) may have saved in the meantime
+        algorithms.update(self.NEGOTIATED)
+        self.NEGOTIATED.clear()
+        try:
+            with open(self.ALGORITHM_CACHE+".tmp", "w", encoding="utf-8") as file:
+                dump(algorithms, file, indent=1)
+            replace(self.ALGORITHM_CACHE+".tmp", self.ALGORITHM_CACHE)
+        except OSError as e:
+            PLOG.info("[ SaveAlgorithms ]: Unable to save the algorithm cache "+self.ALGORITHM_CACHE+" ("+str(e)+")")
+            return
+        for cached in (True, False):
+            times: list = [handshake[0] for handshake in self.HANDSHAKES.values() if handshake[1] is cached]
+            if times: PLOG.info("[ SaveAlgorithms ]: Average handshake "+str(round(sum(times)/len(times), 3))+"s for "+str(len(times))+(" device(s) using remembered algorithms" if cached else " device(s) negotiating from scratch"))
+        PLOG.info("[ SaveAlgorithms ]: Saved the algorithms of "+str(len(algorithms))+" device(s) to "+self.ALGORITHM_CACHE+" [ COMPLETED ]")
+
+    def ConnectionOptions(self, device_ip: str) -> SSHClientConnectionOptions:
+        """Connection options with the algorithms the device negotiated last time offered first"""
+        remembered: dict = self.ALGORITHMS.get(device_ip, {})
+        kex: str = remembered.get("kex", "") if remembered.get("kex") in self.KEYALGS else ""
+        cipher: str = remembered.get("cipher", "") if remembered.get("cipher") in self.ENCRYPTION else ""
+        if (kex, cipher) not in self.CONNECTION_OPTIONS:
+            self.CONNECTION_OPTIONS[(kex, cipher)] = SSHClientConnectionOptions(
+                kex_algs=[kex]+[alg for alg in self.KEYALGS if alg != kex] if kex else self.KEYALGS,
+                encryption_algs=[cipher]+[alg for alg in self.ENCRYPTION if alg != cipher] if cipher else self.ENCRYPTION)
+        return(self.CONNECTION_OPTIONS[(kex, cipher)])
+
+    def RecordHandshake(self, device_ip: str, connection: SSHClientConnection, login: float) -> None:
+        client: SessionClient = connection.get_owner()
+        kex: str = client.kex if isinstance(client, SessionClient) else ""
+        cipher: str = connection.get_extra_info("send_cipher") or ""
+        handshake: float = client.handshake if isinstance(client, SessionClient) and client.handshake else login
+        remembered: dict = self.ALGORITHMS.get(device_ip, {})
+        self.HANDSHAKES[device_ip] = [handshake, bool(remembered) and remembered.get("kex") == kex]
+        self.METRICS.Observe("connect", login)
+        self.METRICS.Observe("handshake", handshake)
+        self.METRICS.Count("logins_cached_algorithms" if self.HANDSHAKES[device_ip][1] else "logins")
+        if not self.ALGORITHM_CACHE or not (kex or cipher): return
+        entry: dict = {"kex": kex, "cipher": cipher, "handshake": round(handshake, 4)}
+        if remembered.get("kex") != kex or remembered.get("cipher") != cipher:
+            PLOG.info("[ Connect ]: Device: "+device_ip+" negotiated "+kex+" / "+cipher+" in "+str(round(handshake, 3))+"s")
+        self.ALGORITHMS[device_ip] = entry
+        self.NEGOTIATED[device_ip] = entry
+
+    def SessionLock(self, device_ip: str) -> Lock:
+        if not self.REUSE_SESSIONS: return(Lock())
+        if device_ip not in self.SESSION_LOCKS: self.SESSION_LOCKS[device_ip] = Lock()
+        return(self.SESSION_LOCKS[device_ip])
+
+    async def Connect(self, device_ip: str, port: int) -> SSHClientConnection:
+        """Returns the pooled connection of the device, or logs into the device"""
+        if self.REUSE_SESSIONS and device_ip in self.SESSIONS:
+            return(self.SESSIONS[device_ip][0])
+        start: float = monotonic()
+        connection: SSHClientConnection = await wait_for(connect(device_ip, port, username=self.CLI_USER, password=self.CLI_PASS, known_hosts=None, client_factory=partial(SessionClient, self.SESSIONS, device_ip), options=self.ConnectionOptions(device_ip)), timeout=self.LOGIN_TIMEOUT)
+        self.REACHABLE[device_ip] = monotonic()
+        self.RecordHandshake(device_ip, connection, self.REACHABLE[device_ip]-start)
+        log_event("[ Connect ]: Device: "+device_ip+" logged in", device_ip, "connect", duration=self.REACHABLE[device_ip]-start, outcome="OK")
+        if self.LIMITER: self.LIMITER.Login(self.REACHABLE[device_ip]-start)
+        if self.REUSE_SESSIONS: self.SESSIONS[device_ip] = [connection, None, None, ""]
+        return(connection)
+
+    async def OpenShell(self, device_ip: str, port: int, controlchar: list) -> list:
+        """Returns [connection, _stdin, _stdout, clear_shell], the pooled shell is reused when it is still open"""
+        connection: SSHClientConnection = await self.Connect(device_ip, port)
+        session: list = self.SESSIONS.get(device_ip)
+        if session and session[1] is not None and not session[1].is_closing():
+            return(session)
+        try:
+            _stdin, _stdout, _ = await connection.open_session(term_type="Dumb", term_size=(300, 24))
+            with self.METRICS.Measure("clear_buffer"):
+                clear_shell: str = await self.ClearBuffer(_stdin, _stdout, controlchar, device_ip)
+        except BaseException:
+            self.CloseUnpooled(device_ip, connection)
+            raise
+        shell: list = [connection, _stdin, _stdout, clear_shell]
+        if session and "Reached timeout" not in clear_shell and "Unable to enter enable mode" not in clear_shell:
+            self.SESSIONS[device_ip] = shell
+        return(shell)
+
+    async def ReleaseSession(self, device_ip: str, connection: SSHClientConnection, keep: bool = True) -> None:
+        """Closes the connection unless it is kept in the session pool"""
+        if self.REUSE_SESSIONS and keep and device_ip in self.SESSIONS:
+            return
+        session: list = self.SESSIONS.get(device_ip)
+        if session and session[0] is connection:
+            del self.SESSIONS[device_ip]
+        connection.close()
+        await connection.wait_closed()
+
+    def CloseUnpooled(self, device_ip: str, connection: SSHClientConnection) -> None:
+        """Closes the connection unless it is the pooled connection of the device, used when an exception (or exit()) ends the work on the device"""
+        session: list = self.SESSIONS.get(device_ip)
+        if not session or session[0] is not connection:
+            connection.close()
+
+    def DropSession(self, device_ip: str) -> None:
+        session: list = self.SESSIONS.pop(device_ip, None)
+        if session:
+            session[0].close()
+
+    async def CloseSessions(self) -> None:
+        """Closes all pooled connections, use when the run is done"""
+        sessions: list = list(self.SESSIONS.values())
+        self.SESSIONS.clear()
+        for session in sessions:
+            session[0].close()
+        await gather(*[session[0].wait_closed() for session in sessions], return_exceptions=True)
+        PLOG.info("[ CloseSessions ]: Closed "+str(len(sessions))+" pooled session(s) [ COMPLETED ]")
+
+    async def ClearBuffer(self, _stdin, _stdout, controlchar: list, device_ip: str = "") -> str:
+        if self.READ_PROFILE == "prompt":
+            return(await self.ClearBufferLogin(_stdin, _stdout, controlchar, device_ip))
         try:
             timer: float = 0.0
             error: int = 0
             retry: int = 0
-            buffer: str = ""
+            buffer: OutputBuffer = OutputBuffer()
             await sleep(self.COMMANDSLEEP)
-            while not any(buffer.endswith(i) for i in controlchar):
+            while not buffer.EndsWith(controlchar):
                 if retry > 2 or error == 1:
                     if error == 0:
                         error: int = 1
-                        if "% Access denied" in buffer:
-                            errorDescription: str = " Unable to enter enable mode on device (access denied), buffer from switch:\n"+buffer.strip()
+                        if "% Access denied" in buffer.Value():
+                            errorDescription: str = " Unable to enter enable mode on device (access denied), buffer from switch:\n"+buffer.Value().strip()
                         else:
-                            errorDescription: str = " Reached timeout when trying to clear buffer:\n"+buffer.strip()
+                            errorDescription: str = " Reached timeout when trying to clear buffer:\n"+buffer.Value().strip()
                     break
                 output: str = _stdout.read(self.MAX_BUFFER)
                 try:
-                    buffer += await wait_for(output, 10)
+                    buffer.Append(await wait_for(output, 10))
                 except TimeoutError:
-                    if buffer.endswith(">") and self.CLI_ENABLE:
+                    if buffer.EndsWith([">"]) and self.CLI_ENABLE:
                         _stdin.write("enable\n")
                         await sleep(self.COMMANDSLEEP)
                         _stdin.write(self.CLI_ENABLE+"\n")
                         await sleep(self.COMMANDSLEEP)
-                        while buffer.endswith(">"):
+                        while buffer.EndsWith([">"]):
                             output: str = _stdout.read(self.MAX_BUFFER)
                             try:
-                                buffer += await wait_for(output, 2.5)
+                                buffer.Append(await wait_for(output, 2.5))
                             except TimeoutError:
-                                errorDescription: str = " Unable to enter enable mode on device (access denied), buffer from switch:\n"+buffer.strip()
+                                errorDescription: str = " Unable to enter enable mode on device (access denied), buffer from switch:\n"+buffer.Value().strip()
                                 error: int = 1
                                 break
-                            if any(buffer.endswith(i) for i in controlchar):
+                            if buffer.EndsWith(controlchar):
                                 break
                             if timer > 2.5:
-                                errorDescription: str = " Unable to enter enable mode on device (access denied), buffer from switch:\n"+buffer.strip()
+                                errorDescription: str = " Unable to enter enable mode on device (access denied), buffer from switch:\n"+buffer.Value().strip()
                                 error: int = 1
                                 break
                             timer += self.COMMANDSLEEP
                             await sleep(self.COMMANDSLEEP)
                         retry += 1
                         continue
-                    elif buffer.endswith(">"):
+                    elif buffer.EndsWith([">"]):
                         _stdin.write("enable\n")
                         await sleep(self.COMMANDSLEEP)
                         _stdin.write(self.CLI_PASS+"\n")
@@ -246,199 +1128,601 @@ class Configurator():
                     _stdin.write("\n")
                     await sleep(self.COMMANDSLEEP)
                 retry += 1
-            return(buffer.strip()) if error != 1 else errorDescription
+            return(buffer.Value().strip()) if error != 1 else errorDescription
         except BrokenPipeError as e:
             e: str = str(e)
-            if "authorization failed" in buffer.lower():
-                errorDescription: str = " Reached timeout, Username: "+self.CLI_USER+" does not have the necessary rights to fully access this device:\n"+buffer.strip()
-            else: errorDescription: str = " Reached timeout, terminal was disconnected while active ("+e+"):\n"+buffer.strip()
+            if "authorization failed" in buffer.Value().lower():
+                errorDescription: str = " Reached timeout, Username: "+self.CLI_USER+" does not have the necessary rights to fully access this device:\n"+buffer.Value().strip()
+            else: errorDescription: str = " Reached timeout, terminal was disconnected while active ("+e+"):\n"+buffer.Value().strip()
             return(errorDescription)
         except Exception as e:
             e: str = str(e)
             PLOG.info("[ ClearBuffer ] Exception occurred ("+e+"), traceback:", exc_info=True)
             exit()
 
-    async def ExecuteSingleCommand(self, command: str, _stdin, _stdout, controlchar: list, commandtimeout: int) -> str:
+    async def ClearBufferLogin(self, _stdin, _stdout, controlchar: list, device_ip: str = "") -> str:
+        """ClearBuffer of the "prompt" READ_PROFILE. The last line of the output is classified after every chunk (see LoginState) and answered
+        right away, so a device that prints its prompt at once is ready after one round trip. Returns the output up to the privileged prompt,
+        or the same error descriptions as the legacy loop."""
+        try:
+            chars: str = re.escape("".join(controlchar))
+            prompt: re.Pattern = re.compile(r"(?:^|[\r\n])([A-Za-z0-9][^\s#>"+chars+r"]{0,62}[#>"+chars+r"]) ?\Z")
+            known: str = self.PROMPTS.get(device_ip, "")
+            buffer: OutputBuffer = OutputBuffer()
+            state: LoginState = LoginState.BANNER
+            entered: float = monotonic()
+            deadline: float = entered+self.LOGIN_DEADLINES[state]
+            answered: int = 0 # Output size when the last prompt was answered, the same prompt is never answered twice
+            enable: bool = False
+            nudges: int = 0
+            def Enter(new: LoginState) -> None:
+                nonlocal state, entered, deadline
+                now: float = monotonic()
+                self.METRICS.Observe("login_"+state.value, now-entered)
+                state, entered = new, now
+                if new in self.LOGIN_DEADLINES: deadline = now+self.LOGIN_DEADLINES[new]
+            while state not in (LoginState.PRIVILEGED, LoginState.DENIED):
+                remaining: float = deadline-monotonic()
+                if remaining <= 0: break
+                try:
+                    chunk: str = await wait_for(_stdout.read(self.MAX_BUFFER), min(remaining, self.LOGIN_QUIET))
+                except TimeoutError:
+                    if state is LoginState.BANNER and nudges < 3:
+                        nudges += 1
+                        self.METRICS.Count("login_nudge")
+                        _stdin.write("\n")
+                    continue
+                if not chunk:
+                    raise BrokenPipeError("Channel closed")
+                window: str = buffer.Append(chunk)
+                if any(x in window.lower() for x in self.LOGIN_DENIED):
+                    Enter(LoginState.DENIED)
+                    break
+                tail: str = buffer.tail
+                start: int = tail.rfind("\n")+1
+                line: str = tail[start:].strip("\r")
+                match = prompt.search(tail)
+                if known and line.rstrip() == known or match and match.group(1)[-1] in controlchar:
+                    self.PROMPTS[device_ip] = line.rstrip() if known and line.rstrip() == known else match.group(1)
+                    Enter(LoginState.PRIVILEGED)
+                elif not line or len(buffer)-len(tail)+start < answered: continue
+                elif match and match.group(1)[-1] == ">":
+                    if enable:
+                        Enter(LoginState.DENIED)
+                        break
+                    enable: bool = True
+                    self.METRICS.Count("login_enable")
+                    _stdin.write("enable\n")
+                    answered: int = len(buffer)
+                    Enter(LoginState.EXEC)
+                elif self.LOGIN_USERNAME.search(line):
+                    if state is not LoginState.BANNER:
+                        Enter(LoginState.DENIED)
+                        break
+                    _stdin.write(self.CLI_USER+"\n")
+                    answered: int = len(buffer)
+                    Enter(LoginState.USERNAME)
+                elif self.LOGIN_PASSWORD.search(line):
+                    if state is LoginState.PASSWORD:
+                        Enter(LoginState.DENIED)
+                        break
+                    _stdin.write((self.CLI_ENABLE if enable and self.CLI_ENABLE else self.CLI_PASS)+"\n")
+                    answered: int = len(buffer)
+                    Enter(LoginState.PASSWORD)
+            if state is LoginState.PRIVILEGED:
+                return(buffer.Value().strip())
+            if state is LoginState.DENIED: self.METRICS.Count("login_denied")
+            if enable or "% access denied" in buffer.Value().lower():
+                return(" Unable to enter enable mode on device (access denied), buffer from switch:\n"+buffer.Value().strip())
+            return(" Reached timeout when trying to clear buffer:\n"+buffer.Value().strip())
+        except BrokenPipeError as e:
+            e: str = str(e)
+            if "authorization failed" in buffer.Value().lower():
+                errorDescription: str = " Reached timeout, Username: "+self.CLI_USER+" does not have the necessary rights to fully access this device:\n"+buffer.Value().strip()
+            else: errorDescription: str = " Reached timeout, terminal was disconnected while active ("+e+"):\n"+buffer.Value().strip()
+            return(errorDescription)
+        except Exception as e:
+            e: str = str(e)
+            PLOG.info("[ ClearBufferLogin ] Exception occurred ("+e+"), traceback:", exc_info=True)
+            exit()
+
+    def CompilePrompt(self, hostname: str, end: bool = True) -> re.Pattern:
+        """Compile the prompt learned in ClearBuffer (e.g. SW01#) into a regex that also matches the config mode prompts (e.g. SW01(config-if)#)
+        end: The prompt has to be at the end of the output, False also matches prompts followed by the echo of the next line"""
+        base: str = hostname.strip()
+        while base and base[-1] in self.CONTROLCHAR+["#", ">"]:
+            base: str = base[:-1]
+        return(re.compile(r"(?:^|[\r\n])"+re.escape(base)+r"(?:\([^)\r\n]*\))?["+re.escape("".join(self.CONTROLCHAR))+r"#>]"+(r"\s*$" if end else "")))
+
+    def Renamed(self, device_ip: str, result: str, hostname: str) -> str:
+        """Returns the prompt after a "hostname" line (read with ANY_PROMPT), the learned prompt and the pooled shell are updated
+        so the next commands and logins do not wait for the old prompt"""
+        match = self.ANY_PROMPT.search(result)
+        if not match or "Invalid input detected" in result: return(hostname)
+        renamed: str = match.group(1)+hostname.strip()[-1]
+        self.PROMPTS[device_ip] = renamed
+        session: list = self.SESSIONS.get(device_ip)
+        if session: session[3] = renamed
+        PLOG.info("[ Renamed ]: Device: "+device_ip+" prompt: "+hostname.strip()+" -> "+renamed)
+        return(renamed)
+
+    def PlanCommands(self, commandlist: list) -> list:
+        """Groups the configuration mode lines into lists of at most BATCH_SIZE lines, all other commands are sent one at a time"""
+        steps: list = []
+        batch: list = []
+        config: bool = False
+        for command in commandlist:
+            command: str
+            if command.startswith("!"): continue
+            if config and "\n" not in command and not self.HOSTNAME.match(command.strip()): # The prompt changes after a hostname line
+                batch.append(command)
+                if command.strip() == "end": config: bool = False
+                if len(batch) >= self.BATCH_SIZE or not config:
+                    steps.append(batch)
+                    batch: list = []
+                continue
+            if batch:
+                steps.append(batch)
+                batch: list = []
+            steps.append(command)
+            if self.BATCH_SIZE and self.READ_PROFILE == "prompt" and self.CONFIG_MODE.match(command.strip()): config: bool = True
+        if batch: steps.append(batch)
+        return(steps)
+
+    async def ExecuteSingleCommandPrompt(self, command: str, _stdin, _stdout, prompt: re.Pattern, commandtimeout: int, spool: SpoolFile = None) -> str:
+        try:
+            error: int = 0
+            buffer: OutputBuffer = OutputBuffer()
+            echo: str = command.splitlines()[0].strip() if command.strip() else ""
+            start: int = -1 if echo else 0 # Only look for the prompt after the echoed command, stale prompts are ignored
+            answered: int = 0 # Position in the buffer after the last answered interactive prompt
+            _stdin.write(command+"\n")
+            while start < 0 or not buffer.Search(prompt, start):
+                output: str = _stdout.read(self.MAX_BUFFER)
+                try:
+                    chunk: str = await wait_for(output, commandtimeout)
+                except TimeoutError:
+                    errorDescription: str = " Reached timeout when executing command: [ "+command+" ] - buffer from switch:\n"+buffer.Value().strip()
+                    error: int = 1
+                    break
+                if not chunk:
+                    errorDescription: str = " Reached timeout, terminal was disconnected while executing command: [ "+command+" ] - buffer from switch:\n"+buffer.Value().strip()
+                    error: int = 1
+                    break
+                buffer.Append(chunk)
+                if start < 0:
+                    begin: int = buffer.Value().find(echo) # Only the few bytes before the echo are searched again
+                    if begin < 0: continue
+                    buffer: OutputBuffer = OutputBuffer(buffer.Value()[begin:], SPOOL=spool)
+                    start: int = len(echo)
+                    answered: int = start
+                if "\n" not in command: # Commands with embedded answers (e.g. "reload in 30\ny\n\n") answer themselves
+                    interactive = buffer.Search(self.INTERACTIVE, answered)
+                    if interactive:
+                        answered: int = len(buffer)
+                        question: str = interactive.group(1)
+                        if question.startswith("continue?") or question.startswith("really sure"):
+                            _stdin.write("y\n")
+                        else: _stdin.write("\n\n")
+            if error != 1:
+                text: str = buffer.Value()
+                if "Invalid input detected" in text:
+                    bufferdesc: list = [x.strip() for x in text.strip().replace("\r", "").splitlines() if x]
+                    return(" Invalid input detected: "+" - ".join(bufferdesc))
+                if "Unknown command or computer name" in text:
+                    bufferdesc: list = [x.strip() for x in text.strip().replace("\r", "").splitlines() if x]
+                    return(" Unknown command or computer name: "+" - ".join(bufferdesc))
+                return(buffer.Strip().replace('\x08','').replace('\x07',''))
+            return(errorDescription)
+        except Exception as e:
+            e: str = str(e)
+            PLOG.info("[ ExecuteSingleCommandPrompt ] Exception occurred ("+e+"), traceback:", exc_info=True)
+            exit()
+
+    async def ExecuteBatch(self, commands: list, _stdin, _stdout, prompt: re.Pattern, commandtimeout: int) -> list:
+        """Writes all lines at once and splits the output on the echo of each line and the prompt after it.
+        prompt: CompilePrompt(hostname, False). Returns one response per line, in the format of ExecuteSingleCommandPrompt"""
+        try:
+            results: list = []
+            AppendResults = results.append
+            buffer: str = "" # Only holds the output of one window of configuration lines
+            position: int = 0
+            _stdin.write("".join(command+"\n" for command in commands))
+            for command in commands:
+                command: str
+                echo: str = command.strip()
+                while True:
+                    begin: int = buffer.find(echo, position)
+                    end = prompt.search(buffer, begin+len(echo)) if begin >= 0 else None
+                    if end: break
+                    output: str = _stdout.read(self.MAX_BUFFER)
+                    try:
+                        chunk: str = await wait_for(output, commandtimeout)
+                    except TimeoutError:
+                        chunk: str = ""
+                    if not chunk:
+                        for remaining in commands[len(results):]: # The line that did not return and the lines after it
+                            AppendResults(" Reached timeout when executing command: [ "+remaining+" ] - buffer from switch:\n"+buffer[position:].strip())
+                        return(results)
+                    buffer += chunk
+                position: int = end.end()
+                segment: str = buffer[begin:position]
+                if "Invalid input detected" in segment:
+                    AppendResults(" Invalid input detected: "+" - ".join([x.strip() for x in segment.strip().replace("\r", "").splitlines() if x]))
+                elif "Unknown command or computer name" in segment:
+                    AppendResults(" Unknown command or computer name: "+" - ".join([x.strip() for x in segment.strip().replace("\r", "").splitlines() if x]))
+                else: AppendResults(segment.strip().replace('\x08','').replace('\x07',''))
+            return(results)
+        except Exception as e:
+            e: str = str(e)
+            PLOG.info("[ ExecuteBatch ] Exception occurred ("+e+"), traceback:", exc_info=True)
+            exit()
+
+    async def ExecuteSingleCommand(self, command: str, _stdin, _stdout, controlchar: list, commandtimeout: int, prompt: re.Pattern = None, spool: SpoolFile = None) -> str:
+        if prompt is not None and self.READ_PROFILE == "prompt":
+            return(await self.ExecuteSingleCommandPrompt(command, _stdin, _stdout, prompt, commandtimeout, spool))
         try:
             error: int = 0
-            buffer: str = ""
+            buffer: OutputBuffer = OutputBuffer(SPOOL=spool)
             _stdin.write(command+"\n")
             await sleep(self.COMMANDSLEEP)
-            while not any(buffer.endswith(i) for i in controlchar):
+            while not buffer.EndsWith(controlchar):
                 if error > 0:
                     break
                 output: str = _stdout.read(self.MAX_BUFFER)
                 try:
-                    buffer += await wait_for(output, commandtimeout)
+                    window: str = buffer.Append(await wait_for(output, commandtimeout))
                 except TimeoutError:
-                    if "continue?" in buffer:
+                    text: str = buffer.Value()
+                    if "continue?" in text:
                         _stdin.write("y\n")
                         await sleep(self.COMMANDSLEEP)
                         continue
-                    elif "really sure" in buffer:
+                    elif "really sure" in text:
                         _stdin.write("y\n")
                         await sleep(self.COMMANDSLEEP)
                         continue
-                    elif "confirm" in buffer:
+                    elif "confirm" in text:
                         _stdin.write("\n\n")
                         await sleep(self.COMMANDSLEEP)
                         continue
-                    elif "SHUTDOWN" in buffer:
+                    elif "SHUTDOWN" in text:
                         _stdin.write("\n\n")
                         await sleep(self.COMMANDSLEEP)
                         continue
-                    elif buffer.endswith("]? "):
+                    elif text.endswith("]? "):
                         _stdin.write("\n\n")
                         await sleep(self.COMMANDSLEEP)
                         continue
                     else:
-                        errorDescription: str = " Reached timeout when executing command: [ "+command+" ] - buffer from switch:\n"+buffer.strip()
+                        errorDescription: str = " Reached timeout when executing command: [ "+command+" ] - buffer from switch:\n"+text.strip()
                         error: int = 1
                         break
-                if "Invalid input detected" in buffer:
-                    bufferdesc: list = [x.strip() for x in buffer.strip().replace("\r", "").splitlines() if x]
+                if "Invalid input detected" in window: # Only the new output is scanned
+                    bufferdesc: list = [x.strip() for x in buffer.Value().strip().replace("\r", "").splitlines() if x]
                     error: int = 1
                     errorDescription: str = " Invalid input detected: "+" - ".join(bufferdesc)
                     continue
-                if "Unknown command or computer name" in buffer:
-                    bufferdesc: list = [x.strip() for x in buffer.strip().replace("\r", "").splitlines() if x]
+                if "Unknown command or computer name" in window:
+                    bufferdesc: list = [x.strip() for x in buffer.Value().strip().replace("\r", "").splitlines() if x]
                     error: int = 1
                     errorDescription: str = " Unknown command or computer name: "+" - ".join(bufferdesc)
                     continue
-            return(buffer.strip().replace('\x08','').replace('\x07','')) if error != 1 else errorDescription
+            return(buffer.Strip().replace('\x08','').replace('\x07','')) if error != 1 else errorDescription
         except Exception as e:
             e: str = str(e)
             PLOG.info("[ ExecuteSingleCommand ] Exception occurred ("+e+"), traceback:", exc_info=True)
             exit()
 
-    async def ExecuteCommands(self, device_ip: str, port: int, commandlist: list, taskQueue: Queue, resultsQueue: Queue, controlchar: list, commandtimeout: int, retry: bool = False) -> None:
+    async def ExecuteCommands(self, device_ip: str, port: int, commandlist: list, controlchar: list, commandtimeout: int, attempt: int = 1, spool_dir: str = "", today: str = "", bypass_breaker: bool = False) -> DeviceResult:
+        if device_ip in self.FAILED and not bypass_breaker: return(DeviceResult.Failed(device_ip, ErrorKind.SKIPPED, self.Skipped(device_ip)))
+        start: float = monotonic()
         try:
-            async with await wait_for(connect(device_ip, port, username=self.CLI_USER, password=self.CLI_PASS, known_hosts=None, options=SSHClientConnectionOptions(encryption_algs=self.ENCRYPTION, kex_algs=self.KEYALGS)), timeout=self.LOGIN_TIMEOUT) as connection:
-                _stdin, _stdout, _ = await connection.open_session(term_type="Dumb", term_size=(300, 24))
-                clear_shell: str = await self.ClearBuffer(_stdin, _stdout, controlchar)
-                total_commands: int = len(commandlist)
-                command_counter: int = 1
-                if "Reached timeout" not in clear_shell and "Unable to enter enable mode" not in clear_shell:
-                    hostname: str = clear_shell.splitlines()[-1]
-                    temp: list = []
-                    AppendTemp = temp.append
-                    for command in commandlist:
-                        command: str
-                        if not command.startswith("!"):
-                            result: str = await self.ExecuteSingleCommand(command, _stdin, _stdout, controlchar, commandtimeout)
+            async with self.SessionLock(device_ip):
+                connection, _stdin, _stdout, clear_shell = await self.OpenShell(device_ip, port, controlchar)
+                try:
+                    total_commands: int = len(commandlist)
+                    command_counter: int = 1
+                    if "Reached timeout" not in clear_shell and "Unable to enter enable mode" not in clear_shell:
+                        hostname: str = clear_shell.splitlines()[-1]
+                        prompt: re.Pattern = self.CompilePrompt(hostname)
+                        commands: list = []
+                        spool: SpoolFile = SpoolFile(spool_dir, device_ip, hostname, today if today else datetime.now().strftime("%d-%m-%Y_%H-%M")) if spool_dir else None
+                        batch_prompt: re.Pattern = self.CompilePrompt(hostname, False)
+                        def Collect(command: str, result: str, seconds: float, offset: int) -> None:
+                            kind: ErrorKind = ErrorKind.NONE
+                            output: str = ""
                             if "Reached timeout" not in result:
-                                if "Invalid input detected" in result:
-                                    AppendTemp("Device: "+device_ip+" Error:"+result.rstrip(" - "+hostname)+" [ SKIPPED ]")
-                                    PLOG.info("[ ExecuteCommands ]: Device: "+device_ip+result.rstrip(" - "+hostname))
-                                elif "Unknown command or computer name" in result:
-                                    AppendTemp("Device: "+device_ip+" Error:"+result.rstrip(" - "+hostname)+" [ SKIPPED ]")
-                                    PLOG.info("[ ExecuteCommands ]: Device: "+device_ip+result.rstrip(" - "+hostname))
+                                if "Invalid input detected" in result or "Unknown command or computer name" in result:
+                                    kind: ErrorKind = ErrorKind.INVALID_INPUT if "Invalid input detected" in result else ErrorKind.UNKNOWN_COMMAND
+                                    output: str = "Device: "+device_ip+" Error:"+result.rstrip(" - "+hostname)+" [ SKIPPED ]"
+                                    message: str = "[ ExecuteCommands ]: Device: "+device_ip+result.rstrip(" - "+hostname)
                                 else:
-                                    tmpResult: str = result.replace('\r', '').replace(hostname, '').replace(command, '').strip()
+                                    tmpResult: str = prompt.sub('', result.replace('\r', '')).replace(hostname, '').replace(command, '').strip() # Also the config mode prompt after the echo is no output
                                     if tmpResult:
-                                        AppendTemp(result.replace('\r', '').rstrip(hostname))
-                                    else: PLOG.info("[ ExecuteCommands ]: Device: "+device_ip+" command: [ "+command.rstrip()+" ] [ OK ]")
+                                        output: str = result.replace('\r', '').rstrip(hostname)
+                                    message: str = "[ ExecuteCommands ]: Device: "+device_ip+" command: [ "+command.rstrip()+" ] [ OK ]"
                             else:
-                                if "--more--" in result.lower(): AppendTemp("Device: "+device_ip+" Error: Reached timeout: Looks like paging is enabled [ SKIPPED ]")
-                                else: AppendTemp("Device: "+device_ip+" Error: Reached timeout after entering command [ "+command.rstrip()+" ] [ SKIPPED ]")
-                                PLOG.info("[ ExecuteCommands ]: Device: "+device_ip+result.replace('\r', ''))
-                            if command_counter == total_commands:
-                                PLOG.info("[ ExecuteCommands ]: Device: "+device_ip+" Command: "+str(command_counter)+" out of "+str(total_commands)+" [ COMPLETED ]")
-                            command_counter += 1
-                    await resultsQueue.put([device_ip, hostname, temp])
-                else:
-                    if "Unable to enter enable mode" in clear_shell or clear_shell.strip().endswith(">"):
-                        await resultsQueue.put([device_ip, "Not Available", ["Device: "+device_ip+" Error: Reached timeout: Unable to enter enable mode on device (access denied) [ SKIPPED ]"]])
-                    elif "terminal was disconnected" in clear_shell:
-                        await resultsQueue.put([device_ip, "Not Available", ["Device: "+device_ip+" Error: Reached timeout: Terminal was disconnected while active (Channel not open for sending) [ SKIPPED ]"]])
-                    elif "Reached timeout, Username:" in clear_shell:
-                        await resultsQueue.put([device_ip, "Not Available", ["Device: "+device_ip+" Error: Reached timeout: Username: "+self.CLI_USER+" does not have the necessary rights to fully access this device (% Authorization Failed) [ SKIPPED ]"]])
-                    else: await resultsQueue.put([device_ip, "Not Available", ["Device: "+device_ip+" Error: Reached timeout while trying to clear buffer [ SKIPPED ]"]])
-                    PLOG.info("[ ExecuteCommands ]: Device: "+device_ip+clear_shell)
-                taskQueue.task_done()
-                taskQueue.get_nowait()
+                                if "--more--" in result.lower():
+                                    kind: ErrorKind = ErrorKind.PAGING
+                                    output: str = "Device: "+device_ip+" Error: Reached timeout: Looks like paging is enabled [ SKIPPED ]"
+                                else:
+                                    kind: ErrorKind = ErrorKind.COMMAND_TIMEOUT
+                                    output: str = "Device: "+device_ip+" Error: Reached timeout after entering command [ "+command.rstrip()+" ] [ SKIPPED ]"
+                                message: str = "[ ExecuteCommands ]: Device: "+device_ip+result.replace('\r', '')
+                            log_event(message, device_ip, "command", command.rstrip(), seconds, kind.name if kind is not ErrorKind.NONE else "OK")
+                            self.METRICS.Observe("command", seconds)
+                            if kind is not ErrorKind.NONE: self.METRICS.Count("command_errors")
+                            if spool is None:
+                                commands.append(CommandResult(command, output, kind, seconds))
+                                return
+                            if output: spool.Write(output+"\n\n") # Only the errors are kept in memory in spool mode
+                            commands.append(CommandResult(command, output if kind is not ErrorKind.NONE else "", kind, seconds, offset, spool.Tell()-offset))
+                        try:
+                            for step in self.PlanCommands(commandlist):
+                                begin: float = monotonic()
+                                if isinstance(step, list):
+                                    results: list = await self.ExecuteBatch(step, _stdin, _stdout, batch_prompt, commandtimeout)
+                                    seconds: float = (monotonic()-begin)/len(step) # The lines of a batch share the time of the batch
+                                    for command, result in zip(step, results):
+                                        Collect(command, result, seconds, spool.Tell() if spool is not None else -1)
+                                    command_counter += len(step)-1
+                                else:
+                                    command: str = step
+                                    offset: int = spool.Tell() if spool is not None else -1
+                                    renamed: bool = bool(self.HOSTNAME.match(command.strip()))
+                                    result: str = await self.ExecuteSingleCommand(command, _stdin, _stdout, controlchar, commandtimeout, self.ANY_PROMPT if renamed else prompt, spool)
+                                    if renamed and "Reached timeout" not in result:
+                                        hostname: str = self.Renamed(device_ip, result, hostname)
+                                        prompt: re.Pattern = self.CompilePrompt(hostname)
+                                        batch_prompt: re.Pattern = self.CompilePrompt(hostname, False)
+                                    Collect(command, result, monotonic()-begin, offset)
+                                if command_counter >= total_commands:
+                                    PLOG.info("[ ExecuteCommands ]: Device: "+device_ip+" Command: "+str(command_counter)+" out of "+str(total_commands)+" [ COMPLETED ]")
+                                command_counter += 1
+                        finally:
+                            size: int = spool.Close() if spool is not None else 0
+                        deviceResult: DeviceResult = DeviceResult(device_ip, hostname, commands, spool.path if spool is not None else "", size)
+                    else:
+                        if "Unable to enter enable mode" in clear_shell or clear_shell.strip().endswith(">"):
+                            deviceResult: DeviceResult = DeviceResult.Failed(device_ip, ErrorKind.ENABLE_DENIED, "Device: "+device_ip+" Error: Reached timeout: Unable to enter enable mode on device (access denied) [ SKIPPED ]")
+                        elif "terminal was disconnected" in clear_shell:
+                            deviceResult: DeviceResult = DeviceResult.Failed(device_ip, ErrorKind.DISCONNECTED, "Device: "+device_ip+" Error: Reached timeout: Terminal was disconnected while active (Channel not open for sending) [ SKIPPED ]")
+                        elif "Reached timeout, Username:" in clear_shell:
+                            deviceResult: DeviceResult = DeviceResult.Failed(device_ip, ErrorKind.AUTHORIZATION, "Device: "+device_ip+" Error: Reached timeout: Username: "+self.CLI_USER+" does not have the necessary rights to fully access this device (% Authorization Failed) [ SKIPPED ]")
+                        else: deviceResult: DeviceResult = DeviceResult.Failed(device_ip, ErrorKind.CLEAR_BUFFER, "Device: "+device_ip+" Error: Reached timeout while trying to clear buffer [ SKIPPED ]")
+                        PLOG.info("[ ExecuteCommands ]: Device: "+device_ip+clear_shell)
+                    await self.ReleaseSession(device_ip, connection, "Reached timeout" not in clear_shell and "Unable to enter enable mode" not in clear_shell)
+                    deviceResult.seconds = monotonic()-start
+                    log_event("[ ExecuteCommands ]: Device: "+device_ip+" done in "+str(round(deviceResult.seconds, 3))+"s", device_ip, "execute", duration=deviceResult.seconds, outcome=deviceResult.kind.name if deviceResult.failed else "OK")
+                    return(deviceResult)
+                finally:
+                    self.CloseUnpooled(device_ip, connection) # Not closed by ReleaseSession when a command raised
         except ConnectionResetError as e:
-            if not retry: await self.ExecuteCommands(device_ip, port, commandlist, taskQueue, resultsQueue, controlchar, commandtimeout, True)
-            else:
-                e: str = str(e)
-                PLOG.info("[ ExecuteCommands ] Unable to connect to Device: "+device_ip+", "+e+" (Connection reset by peer).")
-                await resultsQueue.put([device_ip, "Not Available", ["Device: "+device_ip+" Error: Unable to connect. "+e+" (Connection reset by peer) [ SKIPPED ]"]])
-                taskQueue.task_done()
-                taskQueue.get_nowait()
-        except PermissionDenied:
-            PLOG.info("[ ExecuteCommands ] Unable to connect to Device: "+device_ip+", Unauthorized for Username: "+self.CLI_USER+" (Permission Denied).")
-            await resultsQueue.put([device_ip, "Not Available", ["Device: "+device_ip+" Error: Unable to connect. Unauthorized for Username: "+self.CLI_USER+" (Permission Denied) [ SKIPPED ]"]])
-            taskQueue.task_done()
-            taskQueue.get_nowait()
+            self.DropSession(device_ip)
+            self.Congestion("connection reset: "+device_ip)
+            if await self.RETRY_POLICY.Wait(e, attempt, device_ip): return(await self.ExecuteCommands(device_ip, port, commandlist, controlchar, commandtimeout, attempt+1, spool_dir, today, bypass_breaker))
+            e: str = str(e)
+            log_event("[ ExecuteCommands ] Unable to connect to Device: "+device_ip+", "+e+" (Connection reset by peer).", device_ip, "connect", outcome=ErrorKind.CONNECTION_RESET.name)
+            return(self.Trip(DeviceResult.Failed(device_ip, ErrorKind.CONNECTION_RESET, "Device: "+device_ip+" Error: Unable to connect. "+e+" (Connection reset by peer) [ SKIPPED ]")))
+        except PermissionDenied as e:
+            self.Congestion("permission denied: "+device_ip)
+            if await self.RETRY_POLICY.Wait(e, attempt, device_ip): return(await self.ExecuteCommands(device_ip, port, commandlist, controlchar, commandtimeout, attempt+1, spool_dir, today, bypass_breaker))
+            log_event("[ ExecuteCommands ] Unable to connect to Device: "+device_ip+", Unauthorized for Username: "+self.CLI_USER+" (Permission Denied).", device_ip, "connect", outcome=ErrorKind.PERMISSION_DENIED.name)
+            return(self.Trip(DeviceResult.Failed(device_ip, ErrorKind.PERMISSION_DENIED, "Device: "+device_ip+" Error: Unable to connect. Unauthorized for Username: "+self.CLI_USER+" (Permission Denied) [ SKIPPED ]")))
         except TimeoutError as e:
-            if not retry: await self.ExecuteCommands(device_ip, port, commandlist, taskQueue, resultsQueue, controlchar, commandtimeout, True)
-            else:
-                e: str = str(e)
-                PLOG.info("[ ExecuteCommands ] Connection timed out for device: "+device_ip+", "+e+" (Connect call failed).")
-                await resultsQueue.put([device_ip, "Not Available", ["Device: "+device_ip+" Error: Connection timed out. "+e+" (Connect call failed) [ SKIPPED ]"]])
-                taskQueue.task_done()
-                taskQueue.get_nowait()
+            self.DropSession(device_ip)
+            self.Congestion("timeout: "+device_ip)
+            if await self.RETRY_POLICY.Wait(e, attempt, device_ip): return(await self.ExecuteCommands(device_ip, port, commandlist, controlchar, commandtimeout, attempt+1, spool_dir, today, bypass_breaker))
+            e: str = str(e)
+            log_event("[ ExecuteCommands ] Connection timed out for device: "+device_ip+", "+e+" (Connect call failed).", device_ip, "connect", outcome=ErrorKind.TIMEOUT.name)
+            return(self.Trip(DeviceResult.Failed(device_ip, ErrorKind.TIMEOUT, "Device: "+device_ip+" Error: Connection timed out. "+e+" (Connect call failed) [ SKIPPED ]")))
+        except OSError as e: # Connection refused or unreachable, e.g. when SKIP_PROBE is used
+            self.DropSession(device_ip)
+            self.REACHABLE.pop(device_ip, None)
+            if await self.RETRY_POLICY.Wait(e, attempt, device_ip): return(await self.ExecuteCommands(device_ip, port, commandlist, controlchar, commandtimeout, attempt+1, spool_dir, today, bypass_breaker))
+            e: str = str(e)
+            log_event("[ ExecuteCommands ] Could not connect to: "+device_ip+", "+e, device_ip, "connect", outcome=ErrorKind.UNREACHABLE.name)
+            return(self.Trip(DeviceResult.Failed(device_ip, ErrorKind.UNREACHABLE, "Device: "+device_ip+" Error: Could not connect to: "+device_ip+" ("+e+") [ SKIPPED ]")))
         except Exception as e:
+            self.DropSession(device_ip)
+            if await self.RETRY_POLICY.Wait(e, attempt, device_ip): return(await self.ExecuteCommands(device_ip, port, commandlist, controlchar, commandtimeout, attempt+1, spool_dir, today, bypass_breaker))
             e: str = str(e)
             PLOG.info("[ ExecuteCommands ] Exception occurred ("+e+"), traceback:", exc_info=True)
-            await resultsQueue.put([device_ip, "Not Available", ["Device: "+device_ip+" Error: Exception occurred: [ "+e+" ] - Commands: "+str(commandlist)+" [ SKIPPED ]"]])
-            taskQueue.task_done()
-            taskQueue.get_nowait()
+            return(DeviceResult.Failed(device_ip, ErrorKind.EXCEPTION, "Device: "+device_ip+" Error: Exception occurred: [ "+e+" ] - Commands: "+str(commandlist)+" [ SKIPPED ]"))
 
-    async def InitiateExecution(self, DEVICELIST: list, COMMANDLIST: list = []) -> list:
+    def ExecutionError(self, device: list, e: BaseException) -> DeviceResult:
+        """Result entry for a device whose job failed with an unhandled exception"""
+        return(DeviceResult.Failed(device[0], ErrorKind.EXCEPTION, "Device: "+device[0]+" Error: Exception occurred: [ "+str(e)+" ] [ SKIPPED ]"))
+
+    async def StreamExecution(self, DEVICELIST: list, COMMANDLIST: list = [], SPOOL_DIR: str = "", BYPASS_BREAKER: bool = False):
         PLOG.info("\n\n------------------------------------\n-------STARTING: CLI EXECUTION------\n------------------------------------\n")
+        resultsQueue: Queue = Queue()
+        today: str = datetime.now().strftime("%d-%m-%Y_%H-%M")
+        async def produce() -> None:
+            try:
+                DEVICES: list = await self.CheckDeviceConnectivity(DEVICELIST, BYPASS_BREAKER)
+                jobs: list = []
+                for device in DEVICES:
+                    device: list
+                    if isinstance(device, DeviceResult): # Could not be reached
+                        await resultsQueue.put(device)
+                        continue
+                    if COMMANDLIST:
+                        jobs.append([device[0], device[1], COMMANDLIST])
+                    else:
+                        if isinstance(device[2], list) and device[2]:
+                            jobs.append(device)
+                jobs.sort(key=lambda device: self.DEVICE_RTT.get(device[0], 0), reverse=True) # Start the slowest devices first, so they do not end up last
+                await self.DeviceScheduler().Run(jobs, lambda device: self.ExecuteCommands(device[0], device[1], device[2], self.CONTROLCHAR, self.COMMANDTIMEOUT, 1, SPOOL_DIR, today, BYPASS_BREAKER), self.ExecutionError, resultsQueue)
+            finally:
+                self.SaveAlgorithms()
+                await resultsQueue.put(None) # Tells the consumer that all devices are done
+        if not DEVICELIST:
+            PLOG.info("[ StreamExecution ] No device list received.")
+            return
+        producer: Task = create_task(produce())
+        try:
+            while True:
+                result: list = await resultsQueue.get()
+                if result is None: break
+                self.METRICS.Device(result)
+                yield result
+            await producer
+        finally:
+            if not producer.done(): producer.cancel()
+
+    async def InitiateExecution(self, DEVICELIST: list, COMMANDLIST: list = [], SPOOL_DIR: str = "", BYPASS_BREAKER: bool = False) -> list:
+        try:
+            return([result async for result in self.StreamExecution(DEVICELIST, COMMANDLIST, SPOOL_DIR, BYPASS_BREAKER)])
+        except Exception as e:
+            e: str = str(e)
+            PLOG.info("[ InitiateExecution ] Exception occurred ("+e+"), traceback:", exc_info=True)
+            exit()
+
+    def ShardSettings(self, SHARDS: int) -> dict:
+        """Settings of this Configurator, with the connection limits divided between the shards"""
+        settings: dict = dict(self.SETTINGS)
+        for key, default in (("MAX_DEVICE_CONNECTIONS", 6), ("MAX_SOCKET_CONNECTIONS", 500), ("CONNECTION_CEILING", 64)):
+            settings[key] = max(1, (settings[key] if settings[key] else default)//SHARDS)
+        settings["SPAWN_RATE"] = self.SPAWN_RATE/SHARDS
+        return(settings)
+
+    async def StreamShardedExecution(self, DEVICELIST: list, COMMANDLIST: list = [], SHARDS: int = 0, SPOOL_DIR: str = ""):
+        PLOG.info("\n\n------------------------------------\n-----STARTING: SHARDED EXECUTION----\n------------------------------------\n")
+        if not DEVICELIST:
+            PLOG.info("[ StreamShardedExecution ] No device list received.")
+            return
+        SHARDS: int = min(SHARDS if SHARDS and SHARDS > 0 else (cpu_count() or 1), len(DEVICELIST))
+        shards: list = [DEVICELIST[i::SHARDS] for i in range(SHARDS)] # Round robin, so every shard gets a part of each site
+        settings: dict = self.ShardSettings(SHARDS)
+        loop: AbstractEventLoop = get_event_loop()
+        context = get_context("spawn") # Spawn, forking the threads of the GUI is not safe
+        logQueue = context.Queue()
+        listener: handlers.QueueListener = shard_log_listener(logQueue)
+        pool = ProcessPoolExecutor(max_workers=SHARDS, mp_context=context, initializer=start_shard_logging, initargs=(logQueue,))
+        try:
+            for shard in as_completed([loop.run_in_executor(pool, RunShard, settings, shard, COMMANDLIST, SPOOL_DIR) for shard in shards]):
+                results, metrics = await shard
+                self.METRICS.Merge(metrics)
+                PLOG.info("[ StreamShardedExecution ]: Shard with "+str(len(results))+" device(s) [ COMPLETED ]")
+                for result in results:
+                    yield result
+        finally: # Also when the consumer stops early, the shards are waited for so no process is left behind
+            await loop.run_in_executor(None, partial(pool.shutdown, wait=True, cancel_futures=True))
+            listener.stop()
+
+    async def InitiateShardedExecution(self, DEVICELIST: list, COMMANDLIST: list = [], SHARDS: int = 0, SPOOL_DIR: str = "") -> list:
+        try:
+            return([result async for result in self.StreamShardedExecution(DEVICELIST, COMMANDLIST, SHARDS, SPOOL_DIR)])
+        except Exception as e:
+            e: str = str(e)
+            PLOG.info("[ InitiateShardedExecution ] Exception occurred ("+e+"), traceback:", exc_info=True)
+            exit()
+
+    async def ExecuteOnDevice(self, device_ip: str, port: int, commandlist: list, BYPASS_BREAKER: bool = False) -> DeviceResult:
+        """Runs the commands on a single device, returns the same DeviceResult as InitiateExecution"""
+        result: DeviceResult = await self.ExecuteCommands(device_ip, port, commandlist, self.CONTROLCHAR, self.COMMANDTIMEOUT, bypass_breaker=BYPASS_BREAKER)
+        self.METRICS.Device(result)
+        return(result)
+
+    async def InitiatePipeline(self, DEVICELIST: list, WORKFLOW) -> list:
+        PLOG.info("\n\n------------------------------------\n-----STARTING: DEVICE PIPELINE------\n------------------------------------\n")
         returnResults: list = []
         AppendResults = returnResults.append
         try:
             if DEVICELIST:
                 DEVICELIST: list = await self.CheckDeviceConnectivity(DEVICELIST)
                 if DEVICELIST:
-                    taskQueue: Queue = Queue(maxsize=self.MAX_DEVICE_CONNECTIONS)
                     resultsQueue: Queue = Queue()
-                    for device in DEVICELIST:
-                        device: list
-                        if len(device) > 2 and "Error" in device[2][0]:
-                            await resultsQueue.put(device)
-                            continue
-                        if COMMANDLIST:
-                            await taskQueue.put(create_task(self.ExecuteCommands(device[0], device[1], COMMANDLIST, taskQueue, resultsQueue, self.CONTROLCHAR, self.COMMANDTIMEOUT)))
-                        else:
-                            if isinstance(device[2], list) and device[2]:
-                                await taskQueue.put(create_task(self.ExecuteCommands(device[0], device[1], device[2], taskQueue, resultsQueue, self.CONTROLCHAR, self.COMMANDTIMEOUT)))
-                        await sleep(round(uniform(0.25, 0.30), 2))
-                    await taskQueue.join()
+                    await self.DeviceScheduler().Run(DEVICELIST, WORKFLOW, self.ExecutionError, resultsQueue)
                     while not resultsQueue.empty():
                         result: list = await resultsQueue.get()
                         AppendResults(result)
                         resultsQueue.task_done()
                     await resultsQueue.join()
+                self.SaveAlgorithms()
             else:
-                PLOG.info("[ InitiateExecution ] No device list received.")
+                PLOG.info("[ InitiatePipeline ] No device list received.")
             return(returnResults)
         except Exception as e:
             e: str = str(e)
-            PLOG.info("[ InitiateExecution ] Exception occurred ("+e+"), traceback:", exc_info=True)
+            PLOG.info("[ InitiatePipeline ] Exception occurred ("+e+"), traceback:", exc_info=True)
             exit()
 
-    async def TransferFile(self, deviceip: str, port: int, source: str, dest: str, transferQueue: Queue, transferQueueResults: Queue) -> None:
+    def LocalMd5(self, path: str) -> str:
+        digest = md5()
+        with open(path, "rb") as r:
+            for block in iter(lambda: r.read(1048576), b""):
+                digest.update(block)
+        return(digest.hexdigest())
+
+    async def VerifyFile(self, device_ip: str, port: int, dest: str) -> str:
+        """Returns the MD5 of the file on the device, "" when the file does not exist or could not be verified
+        and None when the device does not support "verify /md5" (Invalid input / Unknown command)"""
+        result: DeviceResult = await self.ExecuteCommands(device_ip, port, ["verify /md5 "+dest], self.CONTROLCHAR, self.COMMANDTIMEOUT)
+        if result.kind in (ErrorKind.INVALID_INPUT, ErrorKind.UNKNOWN_COMMAND): return(None)
+        match = self.MD5.search(" ".join(result[2]))
+        return(match.group(1).lower() if match else "")
+
+    def Transferred(self, start: float, outcome: str) -> float:
+        """Records the duration and outcome of a TransferFile call, returns the duration"""
+        seconds: float = monotonic()-start
+        self.METRICS.Observe("transfer", seconds)
+        self.METRICS.Count("transfers_"+outcome.lower())
+        return(seconds)
+
+    async def UploadFile(self, deviceip: str, port: int, source: str, dest: str) -> None:
+        async with self.SessionLock(deviceip):
+            connection: SSHClientConnection = await self.Connect(deviceip, port)
+            try:
+                with self.METRICS.Measure("upload"):
+                    await scp(source, (connection, dest)) # Opens a new channel on the (pooled) connection
+                self.METRICS.Count("upload_bytes", getsize(source))
+            finally:
+                await self.ReleaseSession(deviceip, connection)
+
+    async def TransferFile(self, deviceip: str, port: int, source: str, dest: str, attempt: int = 1) -> list:
+        if deviceip in self.FAILED: return([deviceip, False, "SCP transfer failed. "+self.Skipped(deviceip)])
+        start: float = monotonic()
         try:
-            async with await wait_for(connect(deviceip, port, username=self.CLI_USER, password=self.CLI_PASS, known_hosts=None, options=SSHClientConnectionOptions(encryption_algs=self.ENCRYPTION, kex_algs=self.KEYALGS)), timeout=self.LOGIN_TIMEOUT) as connection:
-                await scp(source, (connection, dest))
-            PLOG.info("[ TransferFile ]: Upload to device: "+deviceip+" ("+dest+") [ COMPLETED ]")
-            await transferQueueResults.put([deviceip, True, dest])
-            transferQueue.task_done()
-            transferQueue.get_nowait()
+            if not self.VERIFY_TRANSFERS:
+                await self.UploadFile(deviceip, port, source, dest)
+                log_event("[ TransferFile ]: Upload to device: "+deviceip+" ("+dest+") [ COMPLETED ]", deviceip, "transfer", dest, self.Transferred(start, "OK"), "OK")
+                return([deviceip, True, dest])
+            local: str = await get_event_loop().run_in_executor(None, self.LocalMd5, source)
+            present: str = await self.VerifyFile(deviceip, port, dest)
+            if present == local:
+                log_event("[ TransferFile ]: Device: "+deviceip+" already has "+dest+" (MD5: "+local+") [ SKIPPED UPLOAD ]", deviceip, "transfer", dest, self.Transferred(start, "PRESENT"), "PRESENT")
+                return([deviceip, True, dest])
+            for upload in range(2): # Upload once more if the MD5 does not match
+                await self.UploadFile(deviceip, port, source, dest)
+                remote: str = await self.VerifyFile(deviceip, port, dest) if present is not None else None
+                if remote is None: # The device can not verify the file, trust the upload
+                    log_event("[ TransferFile ]: Upload to device: "+deviceip+" ("+dest+") verify /md5 not supported [ COMPLETED ]", deviceip, "transfer", dest, self.Transferred(start, "UNVERIFIED"), "UNVERIFIED")
+                    return([deviceip, True, dest])
+                if remote == local:
+                    log_event("[ TransferFile ]: Upload to device: "+deviceip+" ("+dest+") MD5 verified [ COMPLETED ]", deviceip, "transfer", dest, self.Transferred(start, "OK"), "OK")
+                    return([deviceip, True, dest])
+                PLOG.info("[ TransferFile ]: Upload to device: "+deviceip+" ("+dest+") MD5 mismatch, local: "+local+" device: "+(remote if remote else "not available")+" (upload "+str(upload+1)+")")
+            log_event("[ TransferFile ]: Upload to device: "+deviceip+" ("+dest+") [ FAILED ]", deviceip, "transfer", dest, self.Transferred(start, "MD5_MISMATCH"), "MD5_MISMATCH")
+            return([deviceip, False, "SCP transfer failed. Device: "+deviceip+" Error: MD5 of "+dest+" on the device does not match the local file"])
         except Exception as e:
+            if isinstance(e, (PermissionDenied, TimeoutError, ConnectionResetError)): self.Congestion(type(e).__name__+": "+deviceip)
+            if isinstance(e, (ConnectionResetError, TimeoutError)): self.DropSession(deviceip)
+            if await self.RETRY_POLICY.Wait(e, attempt, deviceip): return(await self.TransferFile(deviceip, port, source, dest, attempt+1))
+            unreachable: bool = isinstance(e, (PermissionDenied, OSError, TimeoutError))
             e: str = str(e)
             if "Administratively disabled" in e:
                 error: str = "SCP transfer failed. Device: "+deviceip+" Error: "+e+" Please enable SCP on your device."
-                PLOG.info("[ TransferFile ]: SCP failed. Device: "+deviceip+" Error: "+e+" Please enable SCP on your device.")
             else:
                 error: str = "SCP transfer failed. Device: "+deviceip+" Error: "+e
-                PLOG.info("[ TransferFile ]: SCP failed. Device: "+deviceip+" Error: "+e)
-            await transferQueueResults.put([deviceip, False, error])
-            transferQueue.task_done()
-            transferQueue.get_nowait()
+            log_event("[ TransferFile ]: "+error.replace("SCP transfer failed.", "SCP failed."), deviceip, "transfer", dest, self.Transferred(start, "FAILED"), "FAILED")
+            return(self.Trip([deviceip, False, error]) if unreachable else [deviceip, False, error])
+
+    async def TransferOnDevice(self, device_ip: str, port: int, source: str, dest: str) -> list:
+        """Transfers the file to a single device, returns [ipaddress, True/False, destination or error description]"""
+        return(await self.TransferFile(device_ip, port, source, dest))
 
     async def InitiateScpTransfer(self, ListOfDevicesAndFilenames: list) -> list:
         PLOG.info("\n\n------------------------------------\n-------STARTING: SCP TRANSFER-------\n------------------------------------\n")
@@ -449,20 +1733,18 @@ class Configurator():
             ConnectedDevices: list = await self.CheckDeviceConnectivity(DeviceConnectivity)
             if ConnectedDevices:
                 ListOfDevices: list = [[x[0], x[1], d[1], d[2]] for x in ConnectedDevices for d in ListOfDevicesAndFilenames if x[0] == d[0]]
-                transferQueue: Queue = Queue(maxsize=self.MAX_DEVICE_CONNECTIONS)
                 transferQueueResults: Queue = Queue()
-                for device in ListOfDevices:
-                    device: list
-                    await transferQueue.put(create_task(self.TransferFile(device[0], device[1], device[2], device[3], transferQueue, transferQueueResults)))
-                    await sleep(round(uniform(0.25, 0.30), 2))
-                await transferQueue.join()
+                def error(device: list, e: BaseException) -> list:
+                    return([device[0], False, "SCP transfer failed. Device: "+device[0]+" Error: "+str(e)])
+                await self.DeviceScheduler().Run(ListOfDevices, lambda device: self.TransferFile(device[0], device[1], device[2], device[3]), error, transferQueueResults)
                 while not transferQueueResults.empty():
                     result: list = await transferQueueResults.get()
                     AppendResults(result)
                     transferQueueResults.task_done()
                 await transferQueueResults.join()
+                self.SaveAlgorithms()
             return(returnResults)
         except Exception as e:
             e: str = str(e)
             PLOG.info("[ InitiateScpTransfer ] Exception occurred ("+e+"), traceback:", exc_info=True)
-            exit()
\ No newline at end of file
+            exit()
@@ -2,10 +2,6 @@
 # Written by Rune Johannesen, (c)2021-2023
 from subprocess import run
 from sys import platform
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.backends import default_backend
 from base64 import urlsafe_b64encode
 from os.path import expanduser, splitext, basename, exists
 from sqlite3 import connect, Cursor
@@ -14,9 +10,9 @@ from traceback import format_exc
 class CredentialHandler():
     def __init__(self, db: str) -> None:
         """db: string <> Directory path and name of database to save data to. db must contain the full directory path.
-        Example: c:\\user\\test\\database.db"""
-        self.KDF: str = PBKDF2HMAC(algorithm=hashes.SHA512(),length=32,salt=self.CreateMachineUUID(),iterations=400000,backend=default_backend())
-        self.FERNET_KEY: bytes = urlsafe_b64encode(self.KDF.derive(expanduser("~").encode()))
+        Example: c:\\user\\test\\database.db
+        The key is derived (400k PBKDF2 iterations over the machine ID) on the first encrypt/decrypt, not here, so creating the handler is instant."""
+        self._FERNET_KEY: bytes = b""
         self.db: str = db
         if not self.db.endswith(".db"): self.db = f"{self.db}.db"
         self.script_name: str = splitext(basename(__file__))[0]
@@ -37,11 +33,23 @@ class CredentialHandler():
                 return(self.decryptString(data[1]), self.decryptString(data[2]), self.decryptString(data[3]))
             except: return(None,None,None)
 
+    @property
+    def FERNET_KEY(self) -> bytes:
+        if not self._FERNET_KEY:
+            from cryptography.hazmat.primitives import hashes
+            from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+            from cryptography.hazmat.backends import default_backend
+            KDF: PBKDF2HMAC = PBKDF2HMAC(algorithm=hashes.SHA512(),length=32,salt=self.CreateMachineUUID(),iterations=400000,backend=default_backend())
+            self._FERNET_KEY: bytes = urlsafe_b64encode(KDF.derive(expanduser("~").encode()))
+        return(self._FERNET_KEY)
+
     def encryptString(self, string: str) -> str:
+        from cryptography.fernet import Fernet
         cipher: Fernet = Fernet(self.FERNET_KEY)
         return(cipher.encrypt(string.encode()).decode())
 
     def decryptString(self, string: str) -> str:
+        from cryptography.fernet import Fernet
         cipher: Fernet = Fernet(self.FERNET_KEY)
         return(cipher.decrypt(string.encode()).decode())
 
@@ -81,4 +89,10 @@ class CredentialHandler():
             commands: list = ["ioreg -c IOPlatformExpertDevice -d 2 | awk -F\" '/IOPlatformSerialNumber/{print $(NF-1)}'", "ioreg -c IOPlatformExpertDevice -d 2 | awk -F\" '/manufacturer/{print $(NF-1)}'"]
             return(b"".join([_run(x).replace(b"\r",b"").replace(b"\n",b"").replace(b" ",b"") for x in commands]))
         if os_type.startswith("linux"):
-            return(_run('cat /etc/machine-id')) if _run('cat /etc/machine-id') else _run('cat /var/lib/dbus/machine-id')
\ No newline at end of file
+            for path in ("/etc/machine-id", "/var/lib/dbus/machine-id"): # Read directly, same bytes as "cat" without starting a shell
+                try:
+                    with open(path) as r:
+                        machine_id: bytes = r.read().strip().encode()
+                except OSError: continue
+                if machine_id: return(machine_id)
+            return(b"")
\ No newline at end of file
@@ -1,30 +1,36 @@
 # -*- coding: utf-8 -*-
 # Written by Rune Johannesen, (c)2021-2023
+from __future__ import annotations # DeviceResult is only imported for type checkers, Configurator_Object (asyncssh) is imported on first use
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
+from tkinter import TclError
 from tkinter.filedialog import askopenfilename
-from PIL import Image, ImageTk
-from os.path import splitext, basename, dirname, realpath, join, exists
+from tkinter.messagebox import askyesno
+from os.path import splitext, basename, dirname, realpath, join, exists, getmtime
 from os import getcwd, chdir, mkdir
 from subprocess import Popen
 from threading import Thread
-from Configurator_Object import Configurator
-from sys import version_info, platform
-from asyncio import set_event_loop, set_event_loop_policy, get_event_loop, sleep, gather
-from re import search, findall
+from sys import version_info, platform, argv
+from asyncio import set_event_loop, set_event_loop_policy, get_event_loop
 from itertools import chain
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from json import dump
+from importlib import import_module
+from typing import TYPE_CHECKING
 from ScrollableFrame import ScrollableFrame
 from CredentialHandler import CredentialHandler
+from Tasks import Tasks, read_devices, read_show_check, read_global, read_port
+if TYPE_CHECKING: from Configurator_Object import DeviceResult
 
-class Main(ttk.Frame):
+class Main(ttk.Frame, Tasks):
 	def __init__(self, parent):
 		if version_info[0] == 3 and version_info[1] >= 8 and platform.startswith('win'):
 			from asyncio import ProactorEventLoop, WindowsSelectorEventLoopPolicy
 			set_event_loop(ProactorEventLoop())
 			set_event_loop_policy(WindowsSelectorEventLoopPolicy())
 		super().__init__(parent)
+		self.startup_times: dict = {} # {phase: seconds}, see startup_lap & report_startup
+		self.startup_mark: float = perf_counter()
 		self.place(x=0, y=0, relwidth=1, relheight=1)
 		self.loop = get_event_loop()
 		self.script_name: str = splitext(basename(__file__))[0]
@@ -33,42 +39,76 @@ class Main(ttk.Frame):
 		if self.current_dir != self.script_dir:
 			chdir(self.script_dir)
 			self.current_dir: str = self.script_dir
-		device_show_config: str = "SHOW_CONFIGURATIONS"
-		device_check_config: str = "CHECK_CONFIGURATIONS"
-		device_config: str = "DEVICE_CONFIGURATIONS"
-		self.show_config_dir: str = join(self.current_dir, device_show_config)
-		self.check_config_dir: str = join(self.current_dir, device_check_config)
-		self.device_config_dir: str = join(self.current_dir, device_config)
-		if not exists(self.show_config_dir):
-			mkdir(self.show_config_dir)
-		if not exists(self.check_config_dir):
-			mkdir(self.check_config_dir)
-		if not exists(self.device_config_dir):
-			mkdir(self.device_config_dir)
-		self.txt_file_icon: ImageTk.PhotoImage = ImageTk.PhotoImage(Image.open(join(self.current_dir, "txt-file-icon.png")).resize((15,15), Image.ANTIALIAS))
-		self.folder_file_icon: ImageTk.PhotoImage = ImageTk.PhotoImage(Image.open(join(self.current_dir, "folder-open-icon.png")).resize((15,15), Image.ANTIALIAS))
-		self.reload_file_icon: ImageTk.PhotoImage = ImageTk.PhotoImage(Image.open(join(self.current_dir, "reload-file-icon.png")).resize((20,20), Image.ANTIALIAS))
-		self.preview_folder: ImageTk.PhotoImage = ImageTk.PhotoImage(Image.open(join(self.current_dir, "folder-open-icon.png")).resize((20,20), Image.ANTIALIAS))
+		Tasks.__init__(self, self.current_dir)
+		self.sleep_time: float = 1.5
+		self.startup_lap("directories")
+		self.icon_cache_dir: str = join(self.current_dir, "ICON_CACHE")
+		self.icons: dict = {} # {"name_size.png": PhotoImage}, the icons of the result rows are loaded when the first row is shown
+		self.reload_file_icon: ttk.PhotoImage = self.icon("reload-file-icon.png", 20)
+		self.preview_folder: ttk.PhotoImage = self.icon("folder-open-icon.png", 20)
+		self.startup_lap("icons")
 		self.device_help: str = "devices.help"
 		self.show_check_help: str = "show_check.help"
 		self.global_config_help: str = "global_config.help"
 		self.port_config_help: str = "port.help"
 		self.about_help: str = "about.help"
 		self.help_help: str = "help.help"
-		self.shorten_int: dict = {"FastEthernet": "Fa", "GigabitEthernet": "Gi", "TwoGigabitEthernet": "Tw", "TenGigabitEthernet": "Te", "TwentyFiveGigE": "Twe", "FortyGigabitEthernet": "Fo", "HundredGigE": "Hu", "FourHundredGigE": "F", "Loopback": "Lo"}
-		self.devices: list = []
-		self.show_cmd: list = []
-		self.check_cmd: list = []
-		self.global_config: list = []
-		self.port_include: list = []
-		self.port_exclude: list = []
-		self.port_config: list = []
 		self.widgets: list = []
 		self.title_width: list = [20,40,84,10]
 		self.title_placement: list = [0.01,0.139,0.391,0.914]
+		self.device_title_width: list = [20,30,16,10,35,15,11,13]
+		self.device_title_placement: list = [0.01,0.139,0.3295,0.434,0.502,0.7235,0.822,0.8955]
 		self.credHandler = CredentialHandler(join(self.current_dir, "Configurator_GUI.db"))
+		self.startup_lap("credentials")
 		self.create_menu()
+		self.startup_lap("menu")
 		self.create_main()
+		self.startup_lap("result tabs")
+
+	def startup_lap(self, phase: str) -> None:
+		now: float = perf_counter()
+		self.startup_times[phase] = now-self.startup_mark
+		self.startup_mark: float = now
+
+	def report_startup(self, times: dict) -> None:
+		"""Writes the startup time per phase to METRICS/Startup_Times.json (printed as well with --startup-times),
+		then imports Configurator_Object and derives the credential key in the background, so the first run does not wait for them"""
+		times: dict = {phase: round(seconds, 4) for phase, seconds in times.items()}
+		try:
+			with open(join(self.metrics_dir, "Startup_Times.json"), "w") as w:
+				dump(times, w, indent=4)
+		except OSError:
+			pass
+		if "--startup-times" in argv:
+			for phase, seconds in times.items():
+				print(f"{phase:<20} {seconds:>8.3f} s")
+		Thread(target=self.prepare, name="prepare_thread", daemon=True).start()
+
+	def prepare(self) -> None:
+		import_module("Configurator_Object")
+		self.credHandler.FERNET_KEY # Derived on first use
+
+	def icon(self, filename: str, size: int) -> ttk.PhotoImage:
+		"""Resized once and kept in ICON_CACHE, so later starts load the small PNG with Tk instead of decoding and resizing the full size image"""
+		name: str = f"{splitext(filename)[0]}_{size}.png"
+		if name in self.icons: return(self.icons[name])
+		source: str = join(self.current_dir, filename)
+		cached: str = join(self.icon_cache_dir, name)
+		if not exists(cached) or getmtime(cached) < getmtime(source):
+			from PIL import Image, ImageTk
+			image: Image.Image = Image.open(source).resize((size,size), Image.LANCZOS)
+			try:
+				if not exists(self.icon_cache_dir): mkdir(self.icon_cache_dir)
+				image.save(cached)
+			except OSError: # Read-only program directory
+				self.icons[name] = ImageTk.PhotoImage(image)
+				return(self.icons[name])
+		try:
+			self.icons[name] = ttk.PhotoImage(file=cached)
+		except TclError: # Tk without PNG support (older than 8.6)
+			from PIL import Image, ImageTk
+			self.icons[name] = ImageTk.PhotoImage(Image.open(cached))
+		return(self.icons[name])
 
 	def menu_item_selected(self, action):
 		if action == "Exit": self.quit()
@@ -122,26 +162,24 @@ class Main(ttk.Frame):
 			else: path: str = askopenfilename(title='Select Device list')
 			self.menu_device_reload.config(bootstyle='secondary')
 		if path:
-			self.devices: list = []
-			with open(path) as r:
-				self.devices: list = [[search(r"(^[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3})", x.strip()).group(1)] for x in r.readlines() if x.strip() and search(r"^[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}", x.strip())]
-				if self.devices:
-					self.device_path.set(path)
-					self.device_preview.set(", ".join([x for i,x in enumerate(chain(*self.devices)) if i <= 4]))
-					self.menu_device1.config(foreground='lime')
-					self.menu_device2.config(foreground="lime")
-					self.device_total.set(f"Total devices: {len(self.devices)}")
-					self.menu_check_btn.config(state='normal')
-					self.menu_device_reload.config(state='normal')
-					self.menu_device_preview.config(state='normal')
-				else:
-					path_file: str = path.split("/")[-1]
-					self.device_path.set(f"No devices found in file: {path_file}")
-					self.device_preview.set(f"No devices found in file: {path_file}")
-					self.menu_device_reload.config(state='disabled', bootstyle='secondary')
-					self.menu_device_preview.config(state='disabled')
-					self.menu_device1.config(foreground='orange')
-					self.menu_device2.config(foreground="orange")
+			self.devices: list = read_devices(path)
+			if self.devices:
+				self.device_path.set(path)
+				self.device_preview.set(", ".join([x for i,x in enumerate(chain(*self.devices)) if i <= 4]))
+				self.menu_device1.config(foreground='lime')
+				self.menu_device2.config(foreground="lime")
+				self.device_total.set(f"Total devices: {len(self.devices)}")
+				self.menu_check_btn.config(state='normal')
+				self.menu_device_reload.config(state='normal')
+				self.menu_device_preview.config(state='normal')
+			else:
+				path_file: str = path.split("/")[-1]
+				self.device_path.set(f"No devices found in file: {path_file}")
+				self.device_preview.set(f"No devices found in file: {path_file}")
+				self.menu_device_reload.config(state='disabled', bootstyle='secondary')
+				self.menu_device_preview.config(state='disabled')
+				self.menu_device1.config(foreground='orange')
+				self.menu_device2.config(foreground="orange")
 		else:
 			if not "\\" in self.device_path.get() and not "/" in self.device_path.get():
 				self.device_path.set("No device file selected yet.")
@@ -163,38 +201,8 @@ class Main(ttk.Frame):
 			path: str = askopenfilename(title='Select Show/Check Commands list')
 			self.menu_show_reload.config(bootstyle='secondary')
 		if path:
-			self.show_cmd: list = []
-			self.check_cmd: list = []
-			with open(path) as r:
-				line: str = r.readline().strip()
-				while line:
-					if not line.strip() or line.startswith("#") or line.startswith("!"):
-						line: str = r.readline().strip()
-						continue
-					if line.lower() == ";; show ;;":
-						line: str = r.readline().strip()
-						while line:
-							if not line.strip() or line.startswith("#") or line.startswith("!"):
-								line: str = r.readline().strip()
-								continue
-							if line.lower() == ";; check ;;": break
-							self.show_cmd.append(line.strip())
-							line: str = r.readline().strip()
-					if line.lower() == ";; check ;;":
-						line: str = r.readline().strip()
-						while line:
-							if not line.strip() or line.startswith("#") or line.startswith("!"):
-								line: str = r.readline().strip()
-								continue
-							if line.lower() == ";; show ;;": break
-							self.check_cmd.append(line.strip())
-							line: str = r.readline().strip()
-					if line.lower() == ";; show ;;" or line.lower() == ";; check ;;":
-						continue
-					try: line: str = r.readline().strip()
-					except: break
+			self.show_cmd, self.check_cmd = read_show_check(path)
 			if self.show_cmd or self.check_cmd:
-				if self.show_cmd: self.show_cmd = ["terminal length 0"]+self.show_cmd
 				self.show_check_path.set(path)
 				self.menu_show.config(foreground='lime')
 				self.menu_show_text.set("Task Enabled.")
@@ -232,9 +240,7 @@ class Main(ttk.Frame):
 			path: str = askopenfilename(title='Select Global Configuration list')
 			self.menu_global_reload.config(bootstyle='secondary')
 		if path:
-			self.global_config: list = []
-			with open(path) as r:
-				self.global_config: list = [x.strip() for x in r.readlines() if x.strip() and not x.strip().startswith("#") and not x.strip().startswith("!")]
+			self.global_config: list = read_global(path)
 			if self.global_config:
 				self.menu_check_config.set(1)
 				self.global_path.set(path)
@@ -274,61 +280,18 @@ class Main(ttk.Frame):
 			path: str = askopenfilename(title='Select Port Configuration list')
 			self.menu_port_reload.config(bootstyle='secondary')
 		if path:
-			self.port_config: list = []
-			self.port_include: list = []
-			self.port_exclude: list = []
-			with open(path) as r:
-				if not ";; config ;;" in r.read().lower():
-					path_file: str = path.split("/")[-1]
-					self.port_path.set(f"No Port Configuration commands (;; CONFIG ;;) found in file: {path_file}")
-					self.menu_port_text.set("Task Disabled.")
-					self.menu_port_btn.config(state='disabled')
-					self.menu_port_reload.config(state='disabled', bootstyle='secondary')
-					self.menu_port_preview.config(state='disabled')
-					self.menu_port_config.set(0)
-					self.menu_port.config(foreground="orange")
-					return
-				else:
-					r.seek(0)
-					line: str = r.readline().strip()
-					while line:
-						if not line.strip() or line.startswith("#") or line.startswith("!"):
-							line: str = r.readline().strip()
-							continue
-						if line.lower() == ";; include ;;":
-							line: str = r.readline().strip()
-							while line:
-								if not line.strip() or line.startswith("#") or line.startswith("!"):
-									line: str = r.readline().strip()
-									continue
-								if line.lower() == ";; exclude ;;" or line.lower() == ";; config ;;":
-									break
-								self.port_include.append(line.strip())
-								line: str = r.readline().strip()
-						if line.lower() == ";; exclude ;;":
-							line: str = r.readline().strip()
-							while line:
-								if not line.strip() or line.startswith("#") or line.startswith("!"):
-									line: str = r.readline().strip()
-									continue
-								if line.lower() == ";; include ;;" or line.lower() == ";; config ;;":
-									break
-								self.port_exclude.append(line.strip())
-								line: str = r.readline().strip()
-						if line.lower() == ";; config ;;":
-							line: str = r.readline().strip()
-							while line:
-								if not line.strip() or line.startswith("#") or line.startswith("!"):
-									line: str = r.readline().strip()
-									continue
-								if line.lower() == ";; include ;;" or line.lower() == ";; exclude ;;":
-									break
-								self.port_config.append(line.strip())
-								line: str = r.readline().strip()
-						if line.lower() == ";; include ;;" or line.lower() == ";; exclude ;;" or line.lower() == ";; config ;;":
-							continue
-						try: line: str = r.readline().strip()
-						except: break
+			port: tuple = read_port(path)
+			if port is None:
+				path_file: str = path.split("/")[-1]
+				self.port_path.set(f"No Port Configuration commands (;; CONFIG ;;) found in file: {path_file}")
+				self.menu_port_text.set("Task Disabled.")
+				self.menu_port_btn.config(state='disabled')
+				self.menu_port_reload.config(state='disabled', bootstyle='secondary')
+				self.menu_port_preview.config(state='disabled')
+				self.menu_port_config.set(0)
+				self.menu_port.config(foreground="orange")
+				return
+			self.port_include, self.port_exclude, self.port_config = port
 			if self.port_config:
 				self.menu_check_config.set(1)
 				self.port_path.set(path)
@@ -400,24 +363,19 @@ class Main(ttk.Frame):
 		self.menu_global_preview.config(state='disabled')
 		self.menu_port_preview.config(state='disabled')
 
+	def status_label(self, frame: ttk.Frame, result: DeviceResult, style: str, width: int, font: str) -> ttk.Label:
+		if not result.failed: return(ttk.Label(frame, text="OK", bootstyle=style, width=width, font=font, foreground='lime'))
+		return(ttk.Label(frame, text=result.reason or "FAILED", bootstyle=style, width=width, font=font, foreground='orange'))
+
 	def build_save_results(self, frame: ttk.Frame, results: list) -> None:
-		def place_objects(frame: ttk.Frame, entry: list, style: str, row: float) -> None:
-			error: str = ""
-			for i, value in enumerate(entry):
-				if isinstance(value, list):
-					if not any("Error" in x for x in value):
-						_ = ttk.Label(frame, text="OK", bootstyle=style, width=self.title_width[i], font='Calibri 11', foreground='lime')
-					else:
-						for err in value:
-							if search(r"Error:\s.+?(\s\[ SKIPPED \]|\n|$)", err):
-								error: str = search(r"Error:\s(.+?)(\s\[ SKIPPED \]|\n|$)", err).group(1)
-								_ = ttk.Label(frame, text=error, bootstyle=style, width=self.title_width[i], font='Calibri 11', foreground='orange')
-								break
-							else: _ = ttk.Label(frame, text="FAILED", bootstyle=style, width=self.title_width[i], font='Calibri 11', foreground='orange')
-				else:
-					_ = ttk.Label(frame, text=value, bootstyle=style, width=self.title_width[i], font='Calibri 11')
+		def place_objects(frame: ttk.Frame, entry: DeviceResult, style: str, row: float) -> None:
+			for i, value in enumerate([entry.ip, entry.hostname]):
+				_ = ttk.Label(frame, text=value, bootstyle=style, width=self.title_width[i], font='Calibri 11')
 				self.widgets.append(_)
 				_.place(relx=self.title_placement[i], rely=row)
+			_ = self.status_label(frame, entry, style, self.title_width[2], 'Calibri 11')
+			self.widgets.append(_)
+			_.place(relx=self.title_placement[2], rely=row)
 		row: float = 0.05
 		for index, entry in enumerate(["IP Address","Hostname","Write Memory Status"]):
 			_ = ttk.Label(frame, text=entry, bootstyle="inverse-secondary", width=self.title_width[index], font='Calibri 11 bold')
@@ -431,31 +389,21 @@ class Main(ttk.Frame):
 				place_objects(frame, entry, "inverse-dark", row)
 
 	def build_show_results(self, frame: ttk.Frame, results: list) -> None:
-		def place_objects(frame: ttk.Frame, entry: list, style: str, row: float) -> None:
-			error: str = ""
-			for i, value in enumerate(entry):
-				if isinstance(value, list):
-					if not any("Error" in x for x in value):
-						_ = ttk.Label(frame, text="OK", bootstyle=style, width=self.title_width[i], font='Calibri 11', foreground='lime')
-					else:
-						for err in value:
-							if search(r"Error:\s.+?(\s\[ SKIPPED \]|\n|$)", err):
-								error: str = search(r"Error:\s(.+?)(\s\[ SKIPPED \]|\n|$)", err).group(1)
-								_ = ttk.Label(frame, text=error, bootstyle=style, width=self.title_width[i], font='Calibri 11', foreground='orange')
-								break
-							else: _ = ttk.Label(frame, text="FAILED", bootstyle=style, width=self.title_width[i], font='Calibri 11', foreground='orange')
-				else:
-					if "\\" in r"%r" % value or "/" in value:
-						_ = ttk.Button(frame, image=self.txt_file_icon, compound='top', bootstyle='secondary-outline', padding=0, command=lambda j=value: self.open_file(j))
-						self.widgets.append(_)
-						_.place(relx=self.title_placement[i], rely=row, height=20, width=35)
-						_ = ttk.Button(frame, image=self.folder_file_icon, compound='top', bootstyle='secondary-outline', padding=0, command=lambda: self.open_file(self.show_config_dir))
-						self.widgets.append(_)
-						_.place(relx=self.title_placement[i]+0.033, rely=row, height=20, width=35)
-						continue
-					else: _ = ttk.Label(frame, text=value, bootstyle=style, width=self.title_width[i], font='Calibri 11')
+		def place_objects(frame: ttk.Frame, entry: DeviceResult, style: str, row: float) -> None:
+			for i, value in enumerate([entry.ip, entry.hostname.rstrip("#")]):
+				_ = ttk.Label(frame, text=value, bootstyle=style, width=self.title_width[i], font='Calibri 11')
 				self.widgets.append(_)
 				_.place(relx=self.title_placement[i], rely=row)
+			_ = self.status_label(frame, entry, style, self.title_width[2], 'Calibri 11')
+			self.widgets.append(_)
+			_.place(relx=self.title_placement[2], rely=row)
+			if entry.path:
+				_ = ttk.Button(frame, image=self.icon("txt-file-icon.png", 15), compound='top', bootstyle='secondary-outline', padding=0, command=lambda j=entry.path: self.open_file(j))
+				self.widgets.append(_)
+				_.place(relx=self.title_placement[3], rely=row, height=20, width=35)
+				_ = ttk.Button(frame, image=self.icon("folder-open-icon.png", 15), compound='top', bootstyle='secondary-outline', padding=0, command=lambda: self.open_file(self.show_config_dir))
+				self.widgets.append(_)
+				_.place(relx=self.title_placement[3]+0.033, rely=row, height=20, width=35)
 		row: float = 0.05
 		for index, entry in enumerate(["IP Address","Hostname","Command Status","Actions"]):
 			_ = ttk.Label(frame, text=entry, bootstyle="inverse-secondary", width=self.title_width[index], font='Calibri 11 bold')
@@ -469,65 +417,57 @@ class Main(ttk.Frame):
 			else:
 				place_objects(frame, entry, "inverse-dark", row)
 
-	def build_device_results(self, frame: ttk.Frame, reload_start: list, scp_ena: list, scp_transfer: list, copy: list, scp_dis: list, reload_cancel: list, results: list) -> None:
-		def place_objects(frame: ttk.Frame, entry: list, style: str, row: float, title_width: list, title_placement: list, subjects: list, sub_results: list) -> None:
-			error: str = ""
-			if not any("Error" in x for x in entry[2]):
-				_ = ttk.Label(frame, text=entry[0], bootstyle=style, width=title_width[0], font='Calibri 10')
-				self.widgets.append(_)
-				_.place(relx=title_placement[0], rely=row)
-				_ = ttk.Label(frame, text=entry[1].rstrip("#"), bootstyle=style, width=title_width[1], font='Calibri 10')
-				self.widgets.append(_)
-				_.place(relx=title_placement[1], rely=row)
-				for i in range(len(subjects)):
-					if i > 1:
-						for data in sub_results[i]:
-							if entry[0] == data[0]:
-								if not any("Error" in x for x in data[2]):
-									if i == 4:
-										flash: str = data[2].split(":")[1] if ":" in data[2] else data[2]
-										_ = ttk.Label(frame, text=flash, bootstyle=style, width=title_width[i], font='Calibri 10', foreground='lime')
-									else: _ = ttk.Label(frame, text="OK", bootstyle=style, width=title_width[i], font='Calibri 10', foreground='lime')
-									self.widgets.append(_)
-									_.place(relx=title_placement[i], rely=row)
-									break
-								else:
-									if i == 4:
-										flash: str = data[2].split(":")[1] if ":" in data[2] else data[2]
-										_ = ttk.Label(frame, text=flash, bootstyle=style, width=title_width[i], font='Calibri 10', foreground='orange')
-									else: _ = ttk.Label(frame, text="FAILED", bootstyle=style, width=title_width[i], font='Calibri 10', foreground='orange')
-									self.widgets.append(_)
-									_.place(relx=title_placement[i], rely=row)
-			else:
-				_ = ttk.Label(frame, text=entry[0], bootstyle=style, width=title_width[0], font='Calibri 10')
-				self.widgets.append(_)
-				_.place(relx=title_placement[0], rely=row)
-				for err in entry[2]:
-					if search(r"Error:\s.+?(\s\[ SKIPPED \]|\n|$)", err):
-						error: str = search(r"Error:\s(.+?)(\s\[ SKIPPED \]|\n|$)", err).group(1)
-						_ = ttk.Label(frame, text=error, bootstyle=style, width=136, font='Calibri 10', foreground='orange')
-						break
-					else: _ = ttk.Label(frame, text="FAILED", bootstyle=style, width=136, font='Calibri 10', foreground='orange')
-				self.widgets.append(_)
-				_.place(relx=title_placement[1], rely=row)
-		sub_results: list = [None, None, reload_start, scp_ena, scp_transfer, copy, scp_dis, reload_cancel]
-		row: float = 0.05
-		title_width: list = [20,30,16,10,35,15,11,13]
-		title_placement: list = [0.01,0.139,0.3295,0.434,0.502,0.7235,0.822,0.8955]
-		subjects: list = ["IP Address","Hostname","Reload in 30 Mins","SCP Enable","SCP Transfer","Config->Running","SCP Disable","Reload Cancel"]
-		for index, entry in enumerate(subjects):
-			_ = ttk.Label(frame, text=entry, bootstyle="inverse-secondary", width=title_width[index], font='Calibri 10 bold')
+	def build_device_header(self, frame: ttk.Frame) -> None:
+		for index, entry in enumerate(self.device_subjects):
+			_ = ttk.Label(frame, text=entry, bootstyle="inverse-secondary", width=self.device_title_width[index], font='Calibri 10 bold')
 			self.widgets.append(_)
-			_.place(relx=title_placement[index], rely=row)
+			_.place(relx=self.device_title_placement[index], rely=0.05)
 		btn1 = ttk.Button(frame, text='Open Device Config', bootstyle="success", command=lambda: self.open_file(self.device_config_dir))
 		btn1.place(relx=0.85, rely=0.95)
 		self.widgets.append(btn1)
+
+	def build_device_row(self, frame: ttk.Frame, index: int, entry: DeviceResult, sub_results: list) -> None:
+		title_width: list = self.device_title_width
+		title_placement: list = self.device_title_placement
+		style: str = "inverse-secondary" if (index % 2) == 0 else "inverse-dark"
+		row: float = 0.05+0.0235*(index+1)
+		if not entry.failed:
+			_ = ttk.Label(frame, text=entry.ip, bootstyle=style, width=title_width[0], font='Calibri 10')
+			self.widgets.append(_)
+			_.place(relx=title_placement[0], rely=row)
+			_ = ttk.Label(frame, text=entry.hostname.rstrip("#"), bootstyle=style, width=title_width[1], font='Calibri 10')
+			self.widgets.append(_)
+			_.place(relx=title_placement[1], rely=row)
+			if entry.ip in self.up_to_date:
+				_ = ttk.Label(frame, text="Up to date, nothing to push", bootstyle=style, width=100, font='Calibri 10', foreground='lime')
+				self.widgets.append(_)
+				_.place(relx=title_placement[2], rely=row)
+			for i in range(len(self.device_subjects)):
+				if i > 1:
+					for data in sub_results[i]:
+						if entry.ip == data[0]:
+							if i == 4: # SCP transfer result: [ipaddress, True/False, destination or error description]
+								flash: str = data[2].split(":")[1] if ":" in data[2] else data[2]
+								if data[1] is True: _ = ttk.Label(frame, text=flash, bootstyle=style, width=title_width[i], font='Calibri 10', foreground='lime')
+								else: _ = ttk.Label(frame, text="FAILED", bootstyle=style, width=title_width[i], font='Calibri 10', foreground='orange')
+							elif not data.failed: _ = ttk.Label(frame, text="OK", bootstyle=style, width=title_width[i], font='Calibri 10', foreground='lime')
+							else: _ = ttk.Label(frame, text="FAILED", bootstyle=style, width=title_width[i], font='Calibri 10', foreground='orange')
+							self.widgets.append(_)
+							_.place(relx=title_placement[i], rely=row)
+							break
+		else:
+			_ = ttk.Label(frame, text=entry.ip, bootstyle=style, width=title_width[0], font='Calibri 10')
+			self.widgets.append(_)
+			_.place(relx=title_placement[0], rely=row)
+			_ = self.status_label(frame, entry, style, 136, 'Calibri 10')
+			self.widgets.append(_)
+			_.place(relx=title_placement[1], rely=row)
+
+	def build_device_results(self, frame: ttk.Frame, reload_start: list, scp_ena: list, scp_transfer: list, copy: list, scp_dis: list, reload_cancel: list, results: list) -> None:
+		sub_results: list = [None, None, reload_start, scp_ena, scp_transfer, copy, scp_dis, reload_cancel]
+		self.build_device_header(frame)
 		for index, entry in enumerate(results):
-			row += 0.0235
-			if (index % 2) == 0:
-				place_objects(frame, entry, "inverse-secondary", row, title_width, title_placement, subjects, sub_results)
-			else:
-				place_objects(frame, entry, "inverse-dark", row, title_width, title_placement, subjects, sub_results)
+			self.build_device_row(frame, index, entry, sub_results)
 
 	def build_check_results(self, frame: ttk.Frame, results: list) -> None:
 		def place_objects(frame: ttk.Treeview, results: list) -> None:
@@ -556,219 +496,74 @@ class Main(ttk.Frame):
 		self.widgets.append(btn2)
 		place_objects(my_tree, results)
 
-	async def save_files(self, results: list, operation: str = "show") -> list:
-		def normalizefilename(fn: str) -> str:
-			validchars: str = "-_.() "
-			out: str = ""
-			for c in fn:
-				if str.isalpha(c) or str.isdigit(c) or (c in validchars):
-					out += c
-			return out 
-		returnResults: list = []
-		today: str = datetime.now().strftime("%d-%m-%Y_%H-%M")
-		try:
-			with ThreadPoolExecutor() as executor:
-				if operation == "check":
-					filename: str = f"Check_Configurations_{today}.csv"
-					with open(join(self.check_config_dir, filename), "w") as w:
-						for device in results:
-							cmd_found: list = []
-							cmd_gui: list = []
-							if not "Error" in device[2][0]:
-								show_run: str = device[2][0].replace("show run","").strip()
-								interfaces: list = findall(r"(interface [A-Z].+[\S\n ]+?!)", show_run)
-								for check in self.check_cmd:
-									tmpint: list = []
-									found: bool = False
-									for interface in interfaces:
-										if check.lower() in interface.lower():
-											i: str = interface.splitlines()[0].split(" ")[1]
-											for key, value in self.shorten_int.items():
-												if i.startswith(key):
-													i: str = i.replace(key,value)
-											tmpint.append(i)
-									if tmpint:
-										tmpstr: str = ",".join(tmpint)
-										cmd_found.append(f"OK ({tmpstr})")
-										cmd_gui.append(f"OK ({tmpstr})")
-										continue
-									for line in show_run.splitlines():
-										if check.lower() in line.lower():
-											cmd_found.append(f"OK ({line.strip()})")
-											found: bool = True
-									for line in show_run.splitlines():
-										if check.lower() in line.lower():
-											cmd_gui.append(f"OK ({line.strip()})")
-											break
-									if not found:
-										cmd_found.append(f"NOT FOUND ({check})")
-										cmd_gui.append(f"NOT FOUND ({check})")
-							else: cmd_found.append(search(r"Error:\s(.+?)(\s\[ SKIPPED \]|\n|$)", device[2][0]).group(1))
-							await self.loop.run_in_executor(executor, w.write, f"{device[0]};{device[1].rstrip('#')};{';'.join(cmd_found)}\n")
-							if len(cmd_found) > len(self.check_cmd):
-								returnResults.append([device[0], device[1].rstrip("#"), cmd_gui, join(self.check_config_dir, filename)])
-							else: returnResults.append([device[0], device[1].rstrip("#"), cmd_found, join(self.check_config_dir, filename)])
-				else:
-					for device in results:
-						filename: str = f"{device[0]}_{normalizefilename(device[1])}_{today}.txt"
-						with open(join(self.show_config_dir, filename), "w") as w:
-							for command in device[2]:
-								await self.loop.run_in_executor(executor, w.write, f"{command}\n\n")
-						returnResults.append([device[0], device[1].rstrip("#"), device[2], join(self.show_config_dir, filename)])
-		except Exception as e:
-			self.menu_error_label.config(foreground='orange')
-			self.menu_error.set(f"Program Exception: {e}")
-		return(returnResults)
-
-	async def create_device_configurations(self, config_prechecks: list) -> tuple:
-		scp_transfer: list = []; scp_ena: list = []; scp_dis: list = []; copy: list = []; reload_start: list = []; reload_cancel: list = []
-		today: str = datetime.now().strftime("%d-%m-%Y_%H-%M")
-		with ThreadPoolExecutor() as executor:
-			for device in config_prechecks:
-				if any("Error" in x for x in device[2]):
-					continue
-				show_run: str = ""; flash: str = ""
-				enableScp: list = []; disableScp: list = []; interfaces: list = []; interfacelist: list = []
-				for config in device[2]:
-					if "show run" in config:
-						show_run: str = config.replace("show run","").strip()
-					elif "dir all-filesystems" in config:
-						flash: str = config.replace("dir all-filesystems | in (Directory of flash|Directory of bootflash)","").strip().splitlines()[0].split(" ")[-1].replace("/","")
-				if "ip scp server enable" not in show_run:
-					enableScp: list = ["conf t", "ip scp server enable", "end"]
-					disableScp: list = ["conf t", "no ip scp server enable", "end"]
-				interfaces: list = findall(r"(interface G.+[\S\n ]+?!|interface F.+[\S\n ]+?!|interface T.+[\S\n ]+?!|interface H.+[\S\n ]+?!)", show_run)
-				if self.port_include:
-					interfacelist: list = [x for x in interfaces if any(y.lower() in x.lower() for y in self.port_include)]
-				if self.port_exclude:
-					if interfacelist: interfacelist: list = [x for x in interfacelist if not any(y.lower() in x.lower() for y in self.port_exclude)]
-					else: interfacelist: list = [x for x in interfaces if not any(y.lower() in x.lower() for y in self.port_exclude)]
-				if not interfacelist:
-					interfacelist: list = interfaces
-				filename: str = f"{device[0]}_{today}.cfg"
-				flash_copy: str = f"copy {flash}{filename} running-config\n\n"
-				with open(join(self.device_config_dir, filename), "w") as w:
-					if self.menu_global_config.get():
-						if self.global_config:
-							for globalcfg in self.global_config:
-								await self.loop.run_in_executor(executor, w.write, f"{globalcfg}\n")
-					if self.menu_port_config.get():
-						if self.port_config:
-							for interface in interfacelist:
-								if any(";; default ;;" in x.lower() for x in self.port_config):
-									await self.loop.run_in_executor(executor, w.write, f"default {interface.splitlines()[0]}\n")
-								await self.loop.run_in_executor(executor, w.write, f"{interface.splitlines()[0]}\n")
-								for portcfg in self.port_config:
-									if portcfg.lower() != ";; default ;;":
-										await self.loop.run_in_executor(executor, w.write, f"{portcfg}\n")
-					await self.loop.run_in_executor(executor, w.write, f"end")
-				with open(join(self.device_config_dir, f"{device[0]}_{today}_backup.cfg"), "w") as w:
-					await self.loop.run_in_executor(executor, w.write, show_run)
-				reload_start.append([device[0], ["reload in 30\ny\n\n"]])
-				scp_transfer.append([device[0], join(self.device_config_dir, filename), flash+filename])
-				copy.append([device[0], [flash_copy]])
-				reload_cancel.append([device[0], ["reload cancel\n\n"]])
-				if enableScp:
-					scp_ena.append([device[0], enableScp])
-					scp_dis.append([device[0], disableScp])
-		return(reload_start, scp_ena, scp_transfer, copy, scp_dis, reload_cancel)
+	def show_task(self) -> bool:
+		return(bool(self.menu_show_config.get()))
+
+	def global_task(self) -> bool:
+		return(bool(self.menu_global_config.get()))
+
+	def port_task(self) -> bool:
+		return(bool(self.menu_port_config.get()))
+
+	def save_task(self) -> bool:
+		return(bool(self.menu_check_config.get()))
+
+	def status(self, text: str) -> None:
+		self.menu_error.set(text)
+
+	def error(self, text: str) -> None:
+		self.menu_error_label.config(foreground='orange')
+		self.menu_error.set(text)
+
+	def show_done(self, results: list) -> None:
+		if results:
+			self.main_show_config.set("Show Configurations:")
+			self.build_show_results(self.main_show, results)
+		else:
+			self.main_show_label.config(foreground='orange')
+			self.main_show_config.set(f"No results returned or operation failed, check the logs under: {self.current_dir}")
+
+	def check_done(self, results: list) -> None:
+		if results:
+			self.main_check_config.set("Check Configurations:")
+			self.build_check_results(self.main_check, results)
+		else:
+			self.main_check_label.config(foreground='orange')
+			self.main_check_config.set(f"No results returned or operation failed, check the logs under: {self.current_dir}")
+
+	def config_started(self) -> None:
+		self.main_global_config.set("Device Configurations:")
+		self.build_device_header(self.main_global)
+
+	def device_done(self, index: int, precheck: DeviceResult) -> None:
+		self.build_device_row(self.main_global, index, precheck, self.device_sub_results)
+
+	def config_done(self, reload_start: list, scp_ena: list, scp_transfer: list, copy: list, scp_dis: list, reload_cancel: list, results: list) -> None:
+		self.main_global_config.set("Device Configurations:")
+		self.build_device_results(self.main_global, reload_start, scp_ena, scp_transfer, copy, scp_dis, reload_cancel, results)
+
+	def save_done(self, results: list) -> None:
+		if results:
+			self.main_save_config.set("Save Configurations Status:")
+			self.build_save_results(self.main_save, results)
+		else:
+			self.main_save_label.config(foreground='orange')
+			self.main_save_config.set(f"No results returned or operation failed, check the logs under: {self.current_dir}")
+
+	def run_done(self, summary: str) -> None:
+		self.menu_error_label.config(foreground='lime')
+		self.menu_error.set(summary)
 
 	async def do_work(self) -> None:
 		self.menu_error_label.config(foreground='lime')
-		Config = Configurator(self.menu_username.get(), self.menu_password.get())
-		show_results: list = []
-		check_results: list = []
-		run: bool = False
-		sleep_time: float = 1.5
-		if self.menu_show_config.get():
-			if self.show_cmd and self.check_cmd:
-				self.menu_error.set("Show & Check Commands: Execution started...")
-				show_results, check_results = await gather(Config.InitiateExecution(self.devices, self.show_cmd), Config.InitiateExecution(self.devices, ["terminal length 0", "show run"]),)
-				self.menu_error.set("Show & Check Commands: Execution completed!")
-				run: bool = True
-			if self.show_cmd:
-				if not show_results:
-					self.menu_error.set("Show Commands: Execution started...")
-					show_results: list = await Config.InitiateExecution(self.devices, self.show_cmd)
-					self.menu_error.set("Show Commands: Execution completed!")
-					run: bool = True
-				if show_results:
-					save_show_results: list = await self.save_files(show_results)
-					self.main_show_config.set("Show Configurations:")
-					self.build_show_results(self.main_show, save_show_results)
-				else:
-					self.main_show_label.config(foreground='orange')
-					self.main_show_config.set(f"No results returned or operation failed, check the logs under: {self.current_dir}")
-			if self.check_cmd:
-				if not check_results:
-					self.menu_error.set("Check Commands: Execution started...")
-					check_results: list = await Config.InitiateExecution(self.devices, ["terminal length 0", "show run"])
-					self.menu_error.set("Check Commands: Execution completed!")
-					run: bool = True
-				if check_results:
-					save_check_results: list = await self.save_files(check_results, "check")
-					self.main_check_config.set("Check Configurations:")
-					self.build_check_results(self.main_check, save_check_results)
-				else:
-					self.main_check_label.config(foreground='orange')
-					self.main_check_config.set(f"No results returned or operation failed, check the logs under: {self.current_dir}")
-		if self.menu_global_config.get() or self.menu_port_config.get():
-			if not self.menu_global_config.get():
-				self.menu_error.set("Global Task disabled, skipping...")
-				await sleep(sleep_time)
-			elif not self.menu_port_config.get():
-				self.menu_error.set("Port Task disabled, skipping...")
-				await sleep(sleep_time)
-			if self.global_config or self.port_config:
-				self.menu_error.set("Device configurations started...")
-				scp_ena_result: list = []; scp_dis_result: list = []
-				if run: await sleep(sleep_time)
-				self.config_prechecks: list = await Config.InitiateExecution(self.devices, ["terminal length 0", "show run", "dir all-filesystems | in (Directory of flash|Directory of bootflash)"])
-				reload_start, scp_ena, scp_transfer, copy, scp_dis, reload_cancel = await self.create_device_configurations(self.config_prechecks)
-				await sleep(sleep_time)
-				self.menu_error.set("Device configurations: setting reload in 30 mins...")
-				reload_start_result: list = await Config.InitiateExecution(reload_start)
-				if scp_ena:
-					await sleep(sleep_time)
-					self.menu_error.set(f"Device configurations: enabling SCP transfer...")
-					scp_ena_result: list = await Config.InitiateExecution(scp_ena)
-				await sleep(sleep_time)
-				self.menu_error.set("Device configurations: Starting SCP transfers...")
-				scp_transfer_result: list = await Config.InitiateScpTransfer(scp_transfer)
-				await sleep(sleep_time)
-				self.menu_error.set("Device configurations: copying config to running-config...")
-				copy_result: list = await Config.InitiateExecution(copy)
-				if scp_dis:
-					await sleep(sleep_time)
-					self.menu_error.set(f"Device configurations: disabling SCP transfer...")
-					scp_dis_result: list = await Config.InitiateExecution(scp_dis)
-				await sleep(sleep_time)
-				self.menu_error.set("Device configurations: cancelling reloads...")
-				reload_cancel_result: list = await Config.InitiateExecution(reload_cancel)
-				self.menu_error.set("Device configurations completed!")
-				run: bool = True
-				self.main_global_config.set("Device Configurations:")
-				self.build_device_results(self.main_global, reload_start_result, scp_ena_result, scp_transfer_result, copy_result, scp_dis_result, reload_cancel_result, self.config_prechecks)
-		if self.menu_check_config.get():
-			if run: await sleep(sleep_time)
-			self.menu_error.set("Saving configurations (write memory) started...")
-			write_mem: list = await Config.InitiateExecution(self.devices, ["write memory"])
-			self.menu_error.set("Saving configurations (write memory) completed!")
-			if write_mem:
-				self.main_save_config.set("Save Configurations Status:")
-				self.build_save_results(self.main_save, write_mem)
-			else:
-				self.main_save_label.config(foreground='orange')
-				self.main_save_config.set(f"No results returned or operation failed, check the logs under: {self.current_dir}")
-		await sleep(sleep_time)
-		self.menu_error.set("")
-		self.menu_error_label.config(foreground='orange')
+		await self.run_tasks(self.menu_username.get(), self.menu_password.get())
 
 	def _asyncio_thread(self) -> None:
 		self.loop.run_until_complete(self.do_work())
 
 	def do_tasks(self) -> None:
 		show: bool = False
+		self.menu_error_label.config(foreground='orange') # The summary of the last run is shown in lime
 		if not self.devices or self.menu_username.get() == "Enter TACACS SSH credentials to use for logging into devices." or not self.menu_password.get():
 			self.menu_error.set("You must select devices, enter username and password and at least select one configuration option.")
 			return
@@ -788,6 +583,12 @@ class Main(ttk.Frame):
 				self.main_global_config.set("No Device Configurations to display.")
 				self.main_save_config.set("No Configurations have been saved yet.")
 				self.widgets: list = []
+			pending: int = self.pending_run()
+			self.pipelined_config: bool = bool(self.menu_pipelined_config.get())
+			self.delta_config: bool = bool(self.menu_delta_config.get())
+			self.adaptive_connections: bool = bool(self.menu_adaptive_connections.get())
+			self.verify_transfers: bool = bool(self.menu_verify_transfers.get())
+			self.resume: bool = bool(pending) and askyesno("Resume", f"The last run of these devices and templates did not finish, {pending} device phases were completed.\n\nSkip the completed devices and phases?")
 			self.credHandler.save_creds(self.device_path.get(), self.menu_username.get(), self.menu_password.get())
 			Thread(target=self._asyncio_thread, name="tkinter_thread").start()
 		else:
@@ -873,6 +674,8 @@ class Main(ttk.Frame):
 		self.menu_global_btn.config(state='disabled')
 		ttk.Button(menu, text='Select Global Config...', bootstyle="light", command=lambda:self.open_global(), padding=2).place(relx=0.02, rely=0.53)
 		ttk.Button(menu, text='Global Config Help', bootstyle="light", command=lambda:self.msgBox(self.global_config_help), padding=2).place(relx=0.32, rely=0.53)
+		self.menu_pipelined_config = ttk.IntVar(value=0)
+		ttk.Checkbutton(menu, text='Configure every device on its own.', style='Roundtoggle.Toolbutton', variable=self.menu_pipelined_config, onvalue=1, offvalue=0).place(relx=0.60, rely=0.53)
 		ttk.Label(menu, text='Loaded File:', font='Calibri 12').place(relx=0.02, rely=0.57)
 		self.menu_global_reload = ttk.Button(menu, image=self.reload_file_icon, compound='center', bootstyle='secondary-outline', padding=1, command=lambda: self.open_global(reload=True), takefocus=0)
 		self.menu_global_reload.place(relx=0.27, rely=0.57)
@@ -916,6 +719,10 @@ class Main(ttk.Frame):
 		self.menu_error = ttk.StringVar(value='')
 		self.menu_error_label = ttk.Label(menu, textvariable=self.menu_error, font='Calibri 12 bold', foreground='orange')
 		self.menu_error_label.place(relx=0.02, rely=0.87)
+		self.menu_adaptive_connections = ttk.IntVar(value=0)
+		ttk.Checkbutton(menu, text='Adapt the number of concurrent devices (6 up to 64).', style='Roundtoggle.Toolbutton', variable=self.menu_adaptive_connections, onvalue=1, offvalue=0).place(relx=0.02, rely=0.825)
+		self.menu_verify_transfers = ttk.IntVar(value=0)
+		ttk.Checkbutton(menu, text='Verify transfers (MD5).', style='Roundtoggle.Toolbutton', variable=self.menu_verify_transfers, onvalue=1, offvalue=0).place(relx=0.65, rely=0.825)
 		# Separator
 		ttk.Separator(menu).place(relx=0, rely=0.925, relwidth=1)
 		# Execute
@@ -923,6 +730,8 @@ class Main(ttk.Frame):
 		self.menu_check_btn = ttk.Checkbutton(menu, text='Save device configuration.', style='Roundtoggle.Toolbutton', variable=self.menu_check_config, onvalue=1, offvalue=0)
 		self.menu_check_btn.place(relx=0.02, rely=0.955)
 		self.menu_check_btn.config(state='disabled')
+		self.menu_delta_config = ttk.IntVar(value=0)
+		ttk.Checkbutton(menu, text='Only push missing lines.', style='Roundtoggle.Toolbutton', variable=self.menu_delta_config, onvalue=1, offvalue=0).place(relx=0.33, rely=0.955)
 		ttk.Button(menu, text='Reset Options', bootstyle="info", command=lambda:self.reset_menu()).place(relx=0.650, rely=0.945)
 		ttk.Button(menu, text='Start Execution', bootstyle="danger", command=lambda:self.do_tasks()).place(relx=0.835, rely=0.945)
 		# Add tabs
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+# Written by Rune Johannesen, (c)2021-2023
+from argparse import ArgumentParser, Namespace
+from asyncio import sleep, run, Event
+from functools import partial
+from hashlib import md5
+from os import makedirs
+from os.path import join, exists
+from random import random
+from tempfile import mkdtemp
+from asyncssh import SSHServer, SSHServerProcess, SFTPServer, SSHServerChannel, BreakReceived, TerminalSizeChanged, generate_private_key, create_server
+"""
+-----------
+How to use:
+-----------
+    A mock Cisco IOS switch for testing and benchmarking Configurator_Object without real devices.
+    Every address of 127.0.0.0/8 is a local address on Linux, so every device gets its own loopback address (127.1.0.1, 127.1.0.2, ...)
+    and its own hostname (MOCK-127-1-0-1), flash directory and session, while one server answers for all of them.
+    python MockIOSServer.py [--host 0.0.0.0] [--port 8022] [--login-delay 0.05] [--command-delay 0.01] [--run-lines 2000] [--fail-auth 0.01] [--drop 0.001]
+        Then use Configurator("cisco", "cisco", SSH_PORT=8022) with the device list [["127.1.0.1"], ["127.1.0.2"], ...].
+    Or from Python:
+        from MockIOSServer import MockIOSServer
+        Mock = MockIOSServer(PORT=8022, COMMAND_DELAY=0.01)
+        await Mock.Start()
+        ...
+        Mock.Close()
+    Emulates:
+        User exec ">" (START_EXEC) and privileged "#" prompts, "enable" with ENABLE_PASSWORD, "% Access denied" for a wrong enable password.
+        "terminal length 0", "show run" (with --More-- paging until terminal length 0 is set), "dir all-filesystems", "show ...",
+        "conf t" with (config)/(config-if) prompts, "reload in" / "copy" / "write memory" confirm prompts, "reload cancel",
+        "verify /md5 flash:file" and SCP uploads to flash: (a directory per device under ROOT).
+        Lines starting with "bad" in configuration mode and unknown exec commands answer "% Invalid input detected at '^' marker."
+    Latency: LOGIN_DELAY (password check) & COMMAND_DELAY (before every answer), both +/- JITTER.
+    Output size: RUN_LINES lines of show run, sent in CHUNK sized writes.
+    Failure injection: FAIL_AUTH (share of logins rejected) & DROP (chance of dropping the connection after each command).
+"""
+
+class MockOptions():
+    """Behaviour of the mock devices"""
+    def __init__(self, PASSWORD: str = "cisco", ENABLE_PASSWORD: str = "cisco", START_EXEC: bool = False, BANNER: str = "", LOGIN_DELAY: float = 0.0,
+                 COMMAND_DELAY: float = 0.0, JITTER: float = 0.2, RUN_LINES: int = 200, CHUNK: int = 4096, FAIL_AUTH: float = 0.0, DROP: float = 0.0,
+                 ROOT: str = "", KEX_ALGS: list = None) -> None:
+        self.PASSWORD: str = PASSWORD
+        self.ENABLE_PASSWORD: str = ENABLE_PASSWORD
+        self.START_EXEC: bool = START_EXEC
+        self.BANNER: str = BANNER
+        self.LOGIN_DELAY: float = LOGIN_DELAY
+        self.COMMAND_DELAY: float = COMMAND_DELAY
+        self.JITTER: float = JITTER
+        self.RUN_LINES: int = RUN_LINES
+        self.CHUNK: int = CHUNK if CHUNK and CHUNK > 0 else 4096
+        self.FAIL_AUTH: float = FAIL_AUTH
+        self.DROP: float = DROP
+        self.ROOT: str = ROOT if ROOT else mkdtemp(prefix="mockios_")
+        self.KEX_ALGS: list = KEX_ALGS if KEX_ALGS else () # () = the asyncssh defaults
+
+    async def Delay(self, seconds: float) -> None:
+        if seconds > 0: await sleep(seconds*(1+self.JITTER*(2*random()-1)))
+
+    def Flash(self, device_ip: str) -> str:
+        flash: str = join(self.ROOT, device_ip)
+        if not exists(flash): makedirs(flash, exist_ok=True)
+        return(flash)
+
+class MockSSHServer(SSHServer):
+    """Password authentication with LOGIN_DELAY and FAIL_AUTH"""
+    def __init__(self, OPTIONS: MockOptions) -> None:
+        self.OPTIONS: MockOptions = OPTIONS
+
+    def begin_auth(self, username: str) -> bool:
+        return(True)
+
+    def password_auth_supported(self) -> bool:
+        return(True)
+
+    async def validate_password(self, username: str, password: str) -> bool:
+        await self.OPTIONS.Delay(self.OPTIONS.LOGIN_DELAY)
+        if random() < self.OPTIONS.FAIL_AUTH: return(False)
+        return(password == self.OPTIONS.PASSWORD)
+
+class MockFlash(SFTPServer):
+    """SCP target, flash:file.cfg is stored as ROOT/ipaddress/file.cfg"""
+    def __init__(self, OPTIONS: MockOptions, chan: SSHServerChannel) -> None:
+        super().__init__(chan, chroot=OPTIONS.Flash(chan.get_extra_info("sockname")[0]).encode())
+
+    def map_path(self, path: bytes) -> bytes:
+        if b":" in path: path = path.split(b":", 1)[1]
+        return(super().map_path(path))
+
+class MockIOSServer():
+    def __init__(self, HOST: str = "0.0.0.0", PORT: int = 8022, **OPTIONS) -> None:
+        self.HOST: str = HOST
+        self.PORT: int = PORT
+        self.OPTIONS: MockOptions = MockOptions(**OPTIONS)
+        self.SERVER = None
+        self.SESSIONS: int = 0 # Shell sessions opened since the start
+
+    async def Start(self):
+        self.SERVER = await create_server(partial(MockSSHServer, self.OPTIONS), self.HOST, self.PORT, server_host_keys=[generate_private_key("ssh-ed25519")],
+                                          process_factory=self.Session, sftp_factory=partial(MockFlash, self.OPTIONS), allow_scp=True, encoding="utf-8",
+                                          line_editor=False, kex_algs=self.OPTIONS.KEX_ALGS)
+        return(self.SERVER)
+
+    def Close(self) -> None:
+        if self.SERVER is not None: self.SERVER.close()
+
+    def ShowRun(self, hostname: str) -> str:
+        lines: list = ["Building configuration...", "", "Current configuration : "+str(self.OPTIONS.RUN_LINES*25)+" bytes", "!", "hostname "+hostname, "!"]
+        port: int = 0
+        while len(lines) < self.OPTIONS.RUN_LINES:
+            lines += ["interface GigabitEthernet1/0/"+str(port), " description mock", " switchport mode access", "!"]
+            port += 1
+        return("\n".join(lines+["end"]))
+
+    async def Session(self, process: SSHServerProcess) -> None:
+        self.SESSIONS += 1
+        options: MockOptions = self.OPTIONS
+        device_ip: str = process.get_extra_info("sockname")[0]
+        hostname: str = "MOCK-"+device_ip.replace(".", "-")
+        flash: str = options.Flash(device_ip)
+        _stdin, _stdout = process.stdin, process.stdout
+        state: dict = {"mode": ">" if options.START_EXEC else "#", "config": "", "paging": True}
+        def prompt() -> None:
+            _stdout.write(hostname+("("+state["config"]+")" if state["config"] else "")+state["mode"])
+        async def send(text: str) -> None:
+            for i in range(0, len(text), options.CHUNK):
+                _stdout.write(text[i:i+options.CHUNK])
+                await sleep(0)
+        try:
+            if options.BANNER: _stdout.write(options.BANNER+"\n")
+            _stdout.write("\n")
+            prompt()
+            while True:
+                line: str = await _stdin.readline()
+                if not line: break
+                command: str = line.strip()
+                _stdout.write(command+"\r\n")
+                await options.Delay(options.COMMAND_DELAY)
+                if random() < options.DROP:
+                    process.close()
+                    return
+                if not command: pass
+                elif state["mode"] == ">":
+                    if command == "enable":
+                        _stdout.write("Password: ")
+                        password: str = (await _stdin.readline()).strip()
+                        _stdout.write("\r\n")
+                        if password == options.ENABLE_PASSWORD: state["mode"] = "#"
+                        else: _stdout.write("\n% Access denied\n")
+                    else: _stdout.write("                 ^\n% Invalid input detected at '^' marker.\n\n")
+                elif state["config"]:
+                    if command == "end": state["config"] = ""
+                    elif command.startswith("interface "): state["config"] = "config-if"
+                    elif command == "exit": state["config"] = "config" if state["config"] != "config" else ""
+                    elif command.startswith("bad"): _stdout.write("                 ^\n% Invalid input detected at '^' marker.\n\n")
+                elif command in ("conf t", "configure terminal"):
+                    _stdout.write("Enter configuration commands, one per line.  End with CNTL/Z.\n")
+                    state["config"] = "config"
+                elif command == "terminal length 0": state["paging"] = False
+                elif command in ("show run", "show running-config"):
+                    text: str = self.ShowRun(hostname)
+                    if state["paging"]:
+                        lines: list = text.split("\n")
+                        await send("\n".join(lines[:22])+"\n --More-- ")
+                        await _stdin.read(1)
+                        _stdout.write("\n")
+                        text: str = "\n".join(lines[22:])
+                    await send(text+"\n")
+                elif command.startswith("dir all-filesystems"): _stdout.write("Directory of flash:/\n")
+                elif command.startswith("reload in"):
+                    _stdout.write("\nSystem configuration has been modified. Save? [yes/no]: ")
+                    _stdout.write((await _stdin.readline()).strip()+"\r\n")
+                    _stdout.write("Reload scheduled in 30 minutes\nProceed with reload? [confirm]")
+                    await _stdin.readline()
+                    _stdout.write("\n")
+                elif command == "reload cancel": _stdout.write("\n\n***\n*** --- SHUTDOWN ABORTED ---\n***\n")
+                elif command.startswith("copy "):
+                    _stdout.write("Destination filename [running-config]? ")
+                    await _stdin.readline()
+                    _stdout.write("\n123 bytes copied in 0.100 secs (1230 bytes/sec)\n")
+                elif command.startswith("write"): _stdout.write("Building configuration...\n[OK]\n")
+                elif command.startswith("verify /md5"):
+                    name: str = command.split()[-1]
+                    path: str = join(flash, name.split(":", 1)[-1])
+                    if exists(path):
+                        with open(path, "rb") as file:
+                            _stdout.write("...........Done!\nverify /md5 ("+name+") = "+md5(file.read()).hexdigest()+"\n\n")
+                    else: _stdout.write("%Error opening "+name+" (No such file or directory)\n")
+                elif command.startswith("show"): await send(command+" output for "+hostname+"\n")
+                else: _stdout.write("                 ^\n% Invalid input detected at '^' marker.\n\n")
+                prompt()
+        except (BreakReceived, TerminalSizeChanged, BrokenPipeError, ConnectionError):
+            pass
+        process.exit(0)
+
+async def serve(args: Namespace) -> None:
+    Mock = MockIOSServer(args.host, args.port, PASSWORD=args.password, ENABLE_PASSWORD=args.password, START_EXEC=args.start_exec, LOGIN_DELAY=args.login_delay,
+                         COMMAND_DELAY=args.command_delay, RUN_LINES=args.run_lines, FAIL_AUTH=args.fail_auth, DROP=args.drop)
+    await Mock.Start()
+    print("Mock IOS devices listening on "+args.host+":"+str(args.port)+", password: "+args.password+", flash: "+Mock.OPTIONS.ROOT)
+    await Event().wait()
+
+def main() -> None:
+    parser = ArgumentParser(description="Mock Cisco IOS SSH server")
+    parser.add_argument("--host", default="0.0.0.0", help="Listen address, 0.0.0.0 answers for every 127.x.x.x device address")
+    parser.add_argument("--port", type=int, default=8022)
+    parser.add_argument("--password", default="cisco", help="Login and enable password")
+    parser.add_argument("--start-exec", action="store_true", help="Start in user exec mode (>), enable is needed")
+    parser.add_argument("--login-delay", type=float, default=0.0, help="Seconds to check the password")
+    parser.add_argument("--command-delay", type=float, default=0.0, help="Seconds before answering a command")
+    parser.add_argument("--run-lines", type=int, default=200, help="Lines of show run")
+    parser.add_argument("--fail-auth", type=float, default=0.0, help="Share of logins that are rejected (0-1)")
+    parser.add_argument("--drop", type=float, default=0.0, help="Chance of dropping the connection after a command (0-1)")
+    args: Namespace = parser.parse_args()
+    try:
+        run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Written by Rune Johannesen, (c)2021-2023
+from sqlite3 import connect, Connection
+from datetime import datetime
+"""
+-----------
+How to use:
+-----------
+    Crash-safe journal of the runs of Tasks, one row per device and phase ("show", "check", "config" & "save"), committed as soon as
+    the result of the device arrives. A run is identified by a key (the digest of the devices, templates and selected tasks), so an
+    unfinished run can be resumed after the program was closed or crashed, by starting the same run again.
+        journal = RunJournal(join(current_dir, "Configurator_GUI_journal.db"))
+        journal.pending(key) -> number of device phases completed by the last run of key, 0 if that run finished (or there is none)
+        journal.begin(key, resume) -> number of completed device phases that are skipped, 0 when a new run is started
+        journal.done(ipaddress, phase) -> True if the resumed run already completed the phase on the device
+        journal.record(ipaddress, phase, ok, detail)
+        journal.finish()
+    Only successful phases are skipped, failed devices are tried again by the resumed run.
+    The database uses WAL with synchronous=NORMAL, so a crash of the program never loses a committed row, a power loss may lose the last few.
+"""
+
+class RunJournal():
+    def __init__(self, db: str, KEEP_RUNS: int = 20) -> None:
+        """db: string <> Directory path and name of the database, e.g. c:\\user\\test\\Configurator_GUI_journal.db
+        KEEP_RUNS: The phases of older runs are deleted when a new run begins"""
+        self.db: str = db
+        self.KEEP_RUNS: int = KEEP_RUNS
+        self.connection: Connection = None
+        self.run: int = 0
+        self.completed: set = set() # {(ipaddress, phase)} completed before the run was resumed
+
+    def open(self) -> Connection:
+        if self.connection is None:
+            self.connection = connect(self.db, isolation_level=None, check_same_thread=False) # Autocommit, every row is committed on its own
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS runs(id INTEGER PRIMARY KEY, key TEXT, started TEXT, finished TEXT)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS phases(run INTEGER, ip TEXT, phase TEXT, ok INTEGER, detail TEXT, time TEXT, PRIMARY KEY(run, ip, phase))")
+        return(self.connection)
+
+    def last_run(self, key: str) -> tuple:
+        """(id, finished) of the last run of key, or None"""
+        return(self.open().execute("SELECT id, finished FROM runs WHERE key = ? ORDER BY id DESC LIMIT 1", (key,)).fetchone())
+
+    def pending(self, key: str) -> int:
+        run: tuple = self.last_run(key)
+        if not run or run[1]: return(0)
+        return(self.open().execute("SELECT count(*) FROM phases WHERE run = ? AND ok = 1", (run[0],)).fetchone()[0])
+
+    def begin(self, key: str, resume: bool = False) -> int:
+        connection: Connection = self.open()
+        run: tuple = self.last_run(key)
+        self.completed: set = set()
+        if resume and run and not run[1]:
+            self.run: int = run[0]
+            self.completed: set = set(connection.execute("SELECT ip, phase FROM phases WHERE run = ? AND ok = 1", (self.run,)).fetchall())
+            return(len(self.completed))
+        self.run: int = connection.execute("INSERT INTO runs(key, started) VALUES(?, ?)", (key, datetime.now().isoformat(timespec="seconds"))).lastrowid
+        connection.execute("DELETE FROM phases WHERE run <= ?", (self.run-self.KEEP_RUNS,))
+        connection.execute("DELETE FROM runs WHERE id <= ?", (self.run-self.KEEP_RUNS,))
+        return(0)
+
+    def done(self, ip: str, phase: str) -> bool:
+        return((ip, phase) in self.completed)
+
+    def record(self, ip: str, phase: str, ok: bool, detail: str = "") -> None:
+        self.open().execute("INSERT OR REPLACE INTO phases VALUES(?, ?, ?, ?, ?, ?)", (self.run, ip, phase, int(ok), detail, datetime.now().isoformat(timespec="seconds")))
+
+    def finish(self) -> None:
+        self.open().execute("UPDATE runs SET finished = ? WHERE id = ?", (datetime.now().isoformat(timespec="seconds"), self.run))
+        self.completed: set = set()
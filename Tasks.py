@@ -0,0 +1,658 @@
+# -*- coding: utf-8 -*-
+# Written by Rune Johannesen, (c)2021-2023
+from __future__ import annotations # Configurator_Object (asyncssh) is imported when the tasks run, not when the GUI starts
+from os.path import join, exists
+from os import makedirs
+from asyncio import get_running_loop, sleep, gather, Queue
+from time import monotonic
+import re
+from datetime import datetime
+from hashlib import md5
+from json import dumps
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, TYPE_CHECKING
+from RunJournal import RunJournal
+if TYPE_CHECKING: from Configurator_Object import Configurator, DeviceResult, Metrics
+"""
+-----------
+How to use:
+-----------
+    The template readers and the run logic of the four tasks (Show/Check, Global, Port & Save), without any GUI.
+    Main (the GUI) and CLI (headless) both inherit from Tasks and only implement the hooks that show the progress and the results:
+        status(text), error(text), show_done(results), check_done(results), config_started(), device_done(index, precheck),
+        config_done(reload_start, scp_ena, scp_transfer, copy, scp_dis, reload_cancel, prechecks), save_done(results), run_done(summary)
+    And the task switches: show_task(), global_task(), port_task() & save_task()
+    Every device phase (show, check, config & save) is recorded in the RunJournal (Configurator_GUI_journal.db) when its result arrives.
+    With resume = True, run_tasks skips the devices and phases completed by the last unfinished run of the same devices, templates and tasks,
+    pending_run() returns how many there are. A device that was halfway through the configuration phases is configured again from the start
+    (reload in 30 first), and a resumed check writes a new CSV file with only the remaining devices.
+    The template readers return the commands of a template file:
+        read_devices(path) -> [[ipaddress], ...]
+        read_show_check(path) -> (show commands, check commands)
+        read_global(path) -> [global configuration, ...]
+        read_port(path) -> (include, exclude, port configuration) or None if the file has no ;; CONFIG ;; section
+    With delta_config = True only the global and port lines missing from the show run of the prechecks are pushed (see config_delta and
+    interface_delta), devices where nothing is missing are not reloaded, transferred to or copied at all and are listed in up_to_date.
+    Lines are compared as shown by show run, so abbreviated template lines (e.g. "int", "sw mode acc") are always pushed.
+    With single_fetch = True (default) and more than one of Show, Check and Global/Port enabled, the read-only commands (terminal length 0,
+    show run, dir all-filesystems and the show commands) run in one session per device, and the outputs are fanned out to the show files,
+    the check CSV and the configuration prechecks (see fetch_once). The show output is then saved when the device is done instead of spooled.
+"""
+
+def skip_line(line: str) -> bool:
+	return(not line.strip() or line.startswith("#") or line.startswith("!"))
+
+def read_devices(path: str) -> list:
+	with open(path) as r:
+		return([[re.search(r"(^[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3})", x.strip()).group(1)] for x in r.readlines() if x.strip() and re.search(r"^[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}", x.strip())])
+
+def read_show_check(path: str) -> tuple:
+	show_cmd: list = []
+	check_cmd: list = []
+	with open(path) as r:
+		line: str = r.readline().strip()
+		while line:
+			if skip_line(line):
+				line: str = r.readline().strip()
+				continue
+			if line.lower() == ";; show ;;":
+				line: str = r.readline().strip()
+				while line:
+					if skip_line(line):
+						line: str = r.readline().strip()
+						continue
+					if line.lower() == ";; check ;;": break
+					show_cmd.append(line.strip())
+					line: str = r.readline().strip()
+			if line.lower() == ";; check ;;":
+				line: str = r.readline().strip()
+				while line:
+					if skip_line(line):
+						line: str = r.readline().strip()
+						continue
+					if line.lower() == ";; show ;;": break
+					check_cmd.append(line.strip())
+					line: str = r.readline().strip()
+			if line.lower() == ";; show ;;" or line.lower() == ";; check ;;":
+				continue
+			try: line: str = r.readline().strip()
+			except: break
+	if show_cmd: show_cmd = ["terminal length 0"]+show_cmd
+	return(show_cmd, check_cmd)
+
+def read_global(path: str) -> list:
+	with open(path) as r:
+		return([x.strip() for x in r.readlines() if x.strip() and not x.strip().startswith("#") and not x.strip().startswith("!")])
+
+def read_port(path: str) -> tuple:
+	port_include: list = []
+	port_exclude: list = []
+	port_config: list = []
+	with open(path) as r:
+		if not ";; config ;;" in r.read().lower():
+			return(None)
+		r.seek(0)
+		line: str = r.readline().strip()
+		while line:
+			if skip_line(line):
+				line: str = r.readline().strip()
+				continue
+			if line.lower() == ";; include ;;":
+				line: str = r.readline().strip()
+				while line:
+					if skip_line(line):
+						line: str = r.readline().strip()
+						continue
+					if line.lower() == ";; exclude ;;" or line.lower() == ";; config ;;":
+						break
+					port_include.append(line.strip())
+					line: str = r.readline().strip()
+			if line.lower() == ";; exclude ;;":
+				line: str = r.readline().strip()
+				while line:
+					if skip_line(line):
+						line: str = r.readline().strip()
+						continue
+					if line.lower() == ";; include ;;" or line.lower() == ";; config ;;":
+						break
+					port_exclude.append(line.strip())
+					line: str = r.readline().strip()
+			if line.lower() == ";; config ;;":
+				line: str = r.readline().strip()
+				while line:
+					if skip_line(line):
+						line: str = r.readline().strip()
+						continue
+					if line.lower() == ";; include ;;" or line.lower() == ";; exclude ;;":
+						break
+					port_config.append(line.strip())
+					line: str = r.readline().strip()
+			if line.lower() == ";; include ;;" or line.lower() == ";; exclude ;;" or line.lower() == ";; config ;;":
+				continue
+			try: line: str = r.readline().strip()
+			except: break
+	return(port_include, port_exclude, port_config)
+
+SECTION = re.compile(r"^(interface|line|router|vlan \d|ip(v6)? access-list|policy-map|class-map|route-map|crypto|key chain|ip dhcp pool|archive|control-plane|redundancy|spanning-tree mst configuration) ", re.IGNORECASE)
+
+INTERFACE_RANGE = re.compile(r"^interface range (.+)$", re.IGNORECASE)
+INTERFACE = re.compile(r"^([a-z-]+?)\s*((?:\d+/)*)(\d+)(?:\s*-\s*(\d+))?$", re.IGNORECASE) # GigabitEthernet1/0/1, Gi1/0/1 - 4, Vlan10
+
+def config_line(line: str) -> str:
+	return(" ".join(line.split()))
+
+def parse_running_config(show_run: str) -> dict:
+	"""The running-config as a hierarchy by indentation: {"interface Gi1/0/1": {"switchport mode access": {}, ...}, "ntp server 1.1.1.1": {}, ...}"""
+	root: dict = {}
+	stack: list = [(-1, root)] # [(indentation, children)] of the open sections
+	for line in show_run.splitlines():
+		key: str = config_line(line)
+		if not key or key.startswith("!"): continue
+		indent: int = len(line)-len(line.lstrip())
+		while stack[-1][0] >= indent: stack.pop()
+		children: dict = stack[-1][1].setdefault(key, {})
+		stack.append((indent, children))
+	return(root)
+
+def interface_range(key: str, running: dict) -> list:
+	"""The interface sections of the running-config in an "interface range Gi1/0/1 - 4, Gi1/0/10" line, [] when one of them is not in the
+	running-config or the range could not be read. The interface types can be abbreviated like on the device."""
+	interfaces: list = [] # [(type, number, section)] of the running-config
+	for section in running:
+		match = INTERFACE.match(section[10:]) if section.lower().startswith("interface ") else None
+		if match and not match.group(4): interfaces.append((match.group(1).lower(), match.group(2)+match.group(3), section))
+	sections: list = []
+	for item in INTERFACE_RANGE.match(key).group(1).split(","):
+		match = INTERFACE.match(item.strip())
+		if not match: return([])
+		for number in range(int(match.group(3)), int(match.group(4) or match.group(3))+1):
+			section: str = next((x[2] for x in interfaces if x[0].startswith(match.group(1).lower()) and x[1] == match.group(2)+str(number)), "")
+			if not section: return([])
+			sections.append(section)
+	return(sections)
+
+def config_delta(lines: list, running: dict) -> list:
+	"""The lines of the global configuration that are not in the running-config. The sections (interface, line vty, router, address-family ...)
+	are followed like IOS does: a line is searched in the current section, then in the sections around it and in the global configuration.
+	The section lines are only pushed in front of the lines of a section that are missing, a global section that is missing from the
+	running-config is pushed with all of its lines (up to exit/end or the next section of the running-config). "interface range" is looked up
+	in every interface of the range. exit leaves one section, and is pushed when the section was. "no" lines are only skipped when the
+	running-config shows the exact line."""
+	delta: list = []
+	path: list = [] # Sections of the running-config the template is in, outermost first: [(section line, [children of the section])]
+	pushed: int = 0 # Number of sections of the path that are already in the delta
+	new: bool = False # The section is missing from the running-config, all of its lines are pushed
+	for line in lines:
+		key: str = config_line(line)
+		if key.lower() == "end":
+			path, pushed, new = [], 0, False
+			continue
+		if key.lower().startswith("exit"): # exit, exit-address-family, ...
+			if new or (path and pushed == len(path)): delta.append(line)
+			if path: path.pop()
+			pushed, new = min(pushed, len(path)), False
+			continue
+		levels: list = [[running]]+[x[1] for x in path] # The children of the global configuration and of each section of the path
+		depth: int = next((depth for depth in range(0 if new else len(path), -1, -1) if all(key in children for children in levels[depth])), -1)
+		if depth >= 0:
+			children: dict = levels[depth][0][key] if len(levels[depth]) == 1 else {} # The interfaces of a range are not followed into sub-sections
+			if new and not children: # Only a section of the running-config ends the missing section
+				delta.append(line)
+				continue
+			path: list = path[:depth]+[(key, [children])] if children else path[:depth]
+			pushed, new = min(pushed, depth), False
+			continue
+		interfaces: list = interface_range(key, running) if INTERFACE_RANGE.match(key) else []
+		if interfaces:
+			path, pushed, new = [(key, [running[x] for x in interfaces])], 0, False
+			continue
+		if new or SECTION.match(key):
+			path, pushed, new = [], 0, True
+			delta.append(line)
+			continue
+		delta.extend(x[0] for x in path[pushed:])
+		pushed: int = len(path)
+		delta.append(line) # A line that is not valid in the section is applied in the section around it by IOS
+	return(delta)
+
+def interface_delta(interface: str, port_config: list) -> list:
+	"""interface: Section of the running-config ("interface Gi1/0/1" up to "!"), returns the lines to push for the port configuration,
+	[] when nothing is missing. With ;; default ;; the interface must have exactly the port configuration, otherwise it is defaulted and
+	configured again like a full push."""
+	lines: list = interface.splitlines()
+	children: set = {config_line(x) for x in lines[1:] if config_line(x) and not config_line(x).startswith("!")}
+	commands: list = [x for x in port_config if x.lower() != ";; default ;;"]
+	if len(commands) != len(port_config):
+		if children == {config_line(x) for x in commands}: return([])
+		return([f"default {lines[0]}", lines[0]]+commands)
+	missing: list = [x for x in commands if config_line(x) not in children]
+	return([lines[0]]+missing if missing else [])
+
+async def drain(queue: Queue) -> AsyncIterator:
+	"""Yields the items of the queue until None"""
+	while True:
+		item = await queue.get()
+		if item is None: return
+		yield item
+
+class Tasks():
+	def __init__(self, current_dir: str) -> None:
+		self.current_dir: str = current_dir
+		self.metrics_dir: str = join(self.current_dir, "METRICS")
+		self.show_config_dir: str = join(self.current_dir, "SHOW_CONFIGURATIONS")
+		self.check_config_dir: str = join(self.current_dir, "CHECK_CONFIGURATIONS")
+		self.device_config_dir: str = join(self.current_dir, "DEVICE_CONFIGURATIONS")
+		for directory in (self.show_config_dir, self.metrics_dir, self.check_config_dir, self.device_config_dir):
+			if not exists(directory):
+				makedirs(directory)
+		self.shorten_int: dict = {"FastEthernet": "Fa", "GigabitEthernet": "Gi", "TwoGigabitEthernet": "Tw", "TenGigabitEthernet": "Te", "TwentyFiveGigE": "Twe", "FortyGigabitEthernet": "Fo", "HundredGigE": "Hu", "FourHundredGigE": "F", "Loopback": "Lo"}
+		self.devices: list = []
+		self.show_cmd: list = []
+		self.check_cmd: list = []
+		self.global_config: list = []
+		self.port_include: list = []
+		self.port_exclude: list = []
+		self.port_config: list = []
+		self.device_subjects: list = ["IP Address","Hostname","Reload in 30 Mins","SCP Enable","SCP Transfer","Config->Running","SCP Disable","Reload Cancel"]
+		self.pipelined_config: bool = False # Every device moves through the configuration phases on its own (no fleet-wide phase barriers), opt-in
+		self.shard_devices: int = 10000 # Show & check commands for this many devices or more are split across one worker process per CPU core
+		self.spool_show_output: bool = True # Show command output is written to SHOW_CONFIGURATIONS while it is received, instead of being kept in memory
+		self.sleep_time: float = 0.0 # Pause between the phases, so the status of every phase can be read in the GUI
+		self.prechecks_cmd: list = ["terminal length 0", "show run", "dir all-filesystems | in (Directory of flash|Directory of bootflash)"]
+		self.metrics: Metrics = None # Config.METRICS of the last run
+		self.journal: RunJournal = RunJournal(join(self.current_dir, "Configurator_GUI_journal.db"))
+		self.resume: bool = False # Skip the devices and phases completed by the last unfinished run (see pending_run)
+		self.delta_config: bool = False # Only push the global and port lines missing from the running-config
+		self.up_to_date: set = set() # Devices of the last run where delta_config found nothing to push
+		self.single_fetch: bool = True # One session per device for the show, check and precheck commands, see fetch_once
+		self.adaptive_connections: bool = False # Raise the 6 concurrent devices up to 64 while the logins stay fast (AdaptiveLimiter), opt-in
+		self.verify_transfers: bool = False # Compare the MD5 of the SCP transfers with "verify /md5" on the device and skip files already there, opt-in
+
+	def show_task(self) -> bool:
+		return(bool(self.show_cmd or self.check_cmd))
+
+	def global_task(self) -> bool:
+		return(bool(self.global_config))
+
+	def port_task(self) -> bool:
+		return(bool(self.port_config))
+
+	def save_task(self) -> bool:
+		return(False)
+
+	def status(self, text: str) -> None:
+		pass
+
+	def error(self, text: str) -> None:
+		pass
+
+	def show_done(self, results: list) -> None:
+		pass
+
+	def check_done(self, results: list) -> None:
+		pass
+
+	def config_started(self) -> None:
+		pass
+
+	def device_done(self, index: int, precheck: DeviceResult) -> None:
+		pass
+
+	def config_done(self, reload_start: list, scp_ena: list, scp_transfer: list, copy: list, scp_dis: list, reload_cancel: list, results: list) -> None:
+		pass
+
+	def save_done(self, results: list) -> None:
+		pass
+
+	def run_done(self, summary: str) -> None:
+		pass
+
+	def journal_key(self) -> str:
+		"""Only a run of the same devices, templates and tasks can be resumed"""
+		tasks: list = [self.devices, self.show_cmd, self.check_cmd, self.global_config, self.port_include, self.port_exclude, self.port_config,
+					   self.show_task(), self.global_task(), self.port_task(), self.save_task()]
+		return(md5(dumps(tasks).encode()).hexdigest())
+
+	def pending_run(self) -> int:
+		"""Number of device phases completed by the last run of the same devices and templates, 0 if that run finished"""
+		return(self.journal.pending(self.journal_key()))
+
+	def remaining(self, phase: str) -> list:
+		return([x for x in self.devices if not self.journal.done(x[0], phase)])
+
+	def journal_config(self, prechecks: list, sub_results: list) -> None:
+		failed: dict = {} # {ipaddress: [subjects of the failed phases]}
+		for i in range(2, len(self.device_subjects)):
+			for data in sub_results[i]:
+				ok: bool = data[1] is True if i == 4 else not data.failed # SCP transfer result: [ipaddress, True/False, destination or error description]
+				if not ok: failed.setdefault(data[0], []).append(self.device_subjects[i])
+		for precheck in prechecks:
+			if precheck.failed: self.journal.record(precheck.ip, "config", False, precheck.reason)
+			else: self.journal.record(precheck.ip, "config", precheck.ip not in failed, ", ".join(failed.get(precheck.ip, [])))
+
+	def command_view(self, device: DeviceResult, commands: list) -> DeviceResult:
+		"""The result of fetch_once with only the outputs of commands (in that order) and the device errors. The view has its own
+		CommandResults, so releasing the show outputs once they are saved keeps show run for the check and the configuration."""
+		from Configurator_Object import DeviceResult, CommandResult
+		results: dict = {}
+		for result in device.commands:
+			results.setdefault(result.command, result)
+		view: list = [results[x] for x in commands if x in results]+[x for x in device.commands if x.failed and not x.command]
+		return(DeviceResult(device.ip, device.hostname, [CommandResult(x.command, x.output, x.kind, x.seconds) for x in view], seconds=device.seconds))
+
+	async def fetch_once(self, execute, config: bool) -> tuple:
+		"""Runs every read-only command of the run in one session per device, returns (show results, check results, {ipaddress: precheck})"""
+		show_devices: set = {x[0] for x in self.remaining("show")} if self.show_cmd else set()
+		check_devices: set = {x[0] for x in self.remaining("check")} if self.check_cmd else set()
+		config_devices: set = {x[0] for x in self.remaining("config")} if config else set()
+		check_cmd: list = self.prechecks_cmd[:2] # terminal length 0, show run
+		commands: list = list(dict.fromkeys((self.prechecks_cmd if config_devices else check_cmd if check_devices else [])+self.show_cmd)) # Prechecks first, a failing show command does not affect them
+		devices: list = [x for x in self.devices if x[0] in show_devices or x[0] in check_devices or x[0] in config_devices]
+		show_queue: Queue = Queue()
+		check_queue: Queue = Queue()
+		prechecks: dict = {}
+		async def fan_out() -> None:
+			try:
+				async for device in execute(devices, commands):
+					if device.ip in show_devices: show_queue.put_nowait(self.command_view(device, self.show_cmd))
+					if device.ip in check_devices: check_queue.put_nowait(self.command_view(device, check_cmd))
+					if device.ip in config_devices: prechecks[device.ip] = self.command_view(device, self.prechecks_cmd)
+			finally:
+				show_queue.put_nowait(None)
+				check_queue.put_nowait(None)
+		async def nothing() -> list:
+			return([])
+		_, show_results, check_results = await gather(fan_out(), self.save_files(drain(show_queue)) if show_devices else nothing(), self.save_files(drain(check_queue), "check") if check_devices else nothing())
+		self.metrics.Count("single_fetch_devices", len(devices))
+		return(show_results, check_results, prechecks)
+
+	def evaluate_checks(self, show_run: str) -> tuple:
+		cmd_found: list = []
+		cmd_gui: list = []
+		interfaces: list = re.findall(r"(interface [A-Z].+[\S\n ]+?!)", show_run)
+		for check in self.check_cmd:
+			tmpint: list = []
+			found: bool = False
+			for interface in interfaces:
+				if check.lower() in interface.lower():
+					i: str = interface.splitlines()[0].split(" ")[1]
+					for key, value in self.shorten_int.items():
+						if i.startswith(key):
+							i: str = i.replace(key,value)
+					tmpint.append(i)
+			if tmpint:
+				tmpstr: str = ",".join(tmpint)
+				cmd_found.append(f"OK ({tmpstr})")
+				cmd_gui.append(f"OK ({tmpstr})")
+				continue
+			for line in show_run.splitlines():
+				if check.lower() in line.lower():
+					cmd_found.append(f"OK ({line.strip()})")
+					found: bool = True
+			for line in show_run.splitlines():
+				if check.lower() in line.lower():
+					cmd_gui.append(f"OK ({line.strip()})")
+					break
+			if not found:
+				cmd_found.append(f"NOT FOUND ({check})")
+				cmd_gui.append(f"NOT FOUND ({check})")
+		return(cmd_found, cmd_gui)
+
+	async def save_files(self, results: AsyncIterator, operation: str = "show") -> list:
+		def normalizefilename(fn: str) -> str:
+			validchars: str = "-_.() "
+			out: str = ""
+			for c in fn:
+				if str.isalpha(c) or str.isdigit(c) or (c in validchars):
+					out += c
+			return out
+		def write_file(path: str, outputs: list) -> None:
+			start: float = monotonic()
+			with open(path, "w") as w:
+				for command in outputs:
+					w.write(f"{command}\n\n")
+			self.metrics.Observe("save_file", monotonic()-start)
+		loop = get_running_loop()
+		returnResults: list = []
+		today: str = datetime.now().strftime("%d-%m-%Y_%H-%M")
+		try:
+			with ThreadPoolExecutor() as executor:
+				if operation == "check":
+					filename: str = f"Check_Configurations_{today}.csv"
+					with open(join(self.check_config_dir, filename), "w") as w:
+						async for device in results: # Devices arrive as soon as they are done, the others are still running meanwhile
+							cmd_found: list = []
+							cmd_gui: list = []
+							if not device.failed:
+								show_run: str = device.Output("show run").replace("show run","").strip()
+								cmd_found, cmd_gui = await loop.run_in_executor(executor, self.evaluate_checks, show_run)
+							else: cmd_found.append(device.reason)
+							await loop.run_in_executor(executor, w.write, f"{device.ip};{device.hostname.rstrip('#')};{';'.join(cmd_found)}\n")
+							self.journal.record(device.ip, "check", not device.failed, device.reason)
+							if len(cmd_found) > len(self.check_cmd):
+								returnResults.append([device.ip, device.hostname.rstrip("#"), cmd_gui, join(self.check_config_dir, filename)])
+							else: returnResults.append([device.ip, device.hostname.rstrip("#"), cmd_found, join(self.check_config_dir, filename)])
+				else:
+					async for device in results:
+						if not device.path: # Not spooled to disk by the Configurator
+							device.path = join(self.show_config_dir, f"{device.ip}_{normalizefilename(device.hostname)}_{today}.txt")
+							await loop.run_in_executor(executor, write_file, device.path, device.outputs)
+						device.Release() # Only the errors are kept for the GUI, so the outputs are released once written to disk
+						self.journal.record(device.ip, "show", not device.failed, device.reason)
+						returnResults.append(device)
+		except Exception as e:
+			self.error(f"Program Exception: {e}")
+		return(returnResults)
+
+	async def create_device_configurations(self, config_prechecks: list) -> tuple:
+		scp_transfer: list = []; scp_ena: list = []; scp_dis: list = []; copy: list = []; reload_start: list = []; reload_cancel: list = []
+		today: str = datetime.now().strftime("%d-%m-%Y_%H-%M")
+		loop = get_running_loop()
+		with ThreadPoolExecutor() as executor:
+			for device in config_prechecks:
+				device: DeviceResult
+				if device.failed:
+					continue
+				enableScp: list = []; disableScp: list = []; interfaces: list = []; interfacelist: list = []
+				show_run: str = device.Output("show run").replace("show run","").strip()
+				flash: str = device.Output(self.prechecks_cmd[2]).replace(self.prechecks_cmd[2],"").strip().splitlines()[0].split(" ")[-1].replace("/","")
+				if "ip scp server enable" not in show_run:
+					enableScp: list = ["conf t", "ip scp server enable", "end"]
+					disableScp: list = ["conf t", "no ip scp server enable", "end"]
+				interfaces: list = re.findall(r"(interface G.+[\S\n ]+?!|interface F.+[\S\n ]+?!|interface T.+[\S\n ]+?!|interface H.+[\S\n ]+?!)", show_run)
+				if self.port_include:
+					interfacelist: list = [x for x in interfaces if any(y.lower() in x.lower() for y in self.port_include)]
+				if self.port_exclude:
+					if interfacelist: interfacelist: list = [x for x in interfacelist if not any(y.lower() in x.lower() for y in self.port_exclude)]
+					else: interfacelist: list = [x for x in interfaces if not any(y.lower() in x.lower() for y in self.port_exclude)]
+				if not interfacelist:
+					interfacelist: list = interfaces
+				config: list = []
+				if self.delta_config:
+					if self.global_task(): config: list = config_delta(self.global_config, parse_running_config(show_run))
+					if self.port_task(): config.extend(x for interface in interfacelist for x in interface_delta(interface, self.port_config))
+				else:
+					if self.global_task():
+						config.extend(self.global_config)
+					if self.port_task() and self.port_config:
+						for interface in interfacelist:
+							if any(";; default ;;" in x.lower() for x in self.port_config):
+								config.append(f"default {interface.splitlines()[0]}")
+							config.append(interface.splitlines()[0])
+							config.extend(x for x in self.port_config if x.lower() != ";; default ;;")
+				self.metrics.Count("config_lines", len(config))
+				with open(join(self.device_config_dir, f"{device[0]}_{today}_backup.cfg"), "w") as w:
+					await loop.run_in_executor(executor, w.write, show_run)
+				if self.delta_config and not config: # Nothing to push, no reload, SCP or copy
+					self.up_to_date.add(device[0])
+					self.metrics.Count("devices_up_to_date")
+					continue
+				filename: str = f"{device[0]}_{today}.cfg"
+				with open(join(self.device_config_dir, filename), "w") as w:
+					await loop.run_in_executor(executor, w.write, "".join(f"{x}\n" for x in config)+"end")
+				with open(join(self.device_config_dir, filename), "rb") as r:
+					digest: str = md5(await loop.run_in_executor(executor, r.read)).hexdigest()
+				flash_file: str = f"{device[0]}_{digest[:12]}.cfg" # Same configuration, same name on flash, so a rerun finds the file that is already there
+				flash_copy: str = f"copy {flash}{flash_file} running-config\n\n"
+				reload_start.append([device[0], ["reload in 30\ny\n\n"]])
+				scp_transfer.append([device[0], join(self.device_config_dir, filename), flash+flash_file])
+				copy.append([device[0], [flash_copy]])
+				reload_cancel.append([device[0], ["reload cancel\n\n"]])
+				if enableScp:
+					scp_ena.append([device[0], enableScp])
+					scp_dis.append([device[0], disableScp])
+		return(reload_start, scp_ena, scp_transfer, copy, scp_dis, reload_cancel)
+
+	def copy_skipped(self, ip: str) -> DeviceResult:
+		from Configurator_Object import DeviceResult, ErrorKind
+		return(DeviceResult.Failed(ip, ErrorKind.SKIPPED, f"Device: {ip} Error: Not copied to running-config, the SCP transfer failed or could not be verified [ SKIPPED ]"))
+
+	async def configure_device(self, Config: Configurator, device: list, precheck: DeviceResult = None) -> DeviceResult:
+		"""Moves a single device through all configuration phases, device_done is called when the device is done
+		precheck: Result of the prechecks_cmd from fetch_once, they are run on the device when it is None"""
+		from Configurator_Object import DeviceResult
+		if isinstance(device, DeviceResult): precheck: DeviceResult = device # Could not be reached
+		elif precheck is None: precheck: DeviceResult = await Config.ExecuteOnDevice(device[0], device[1], self.prechecks_cmd)
+		reload_start, scp_ena, scp_transfer, copy, scp_dis, reload_cancel = await self.create_device_configurations([precheck])
+		sub_results: list = [None, None, [], [], [], [], [], []] # The results of this device only, for the journal
+		def add(index: int, result) -> None:
+			self.device_sub_results[index].append(result)
+			sub_results[index].append(result)
+		if reload_start:
+			add(2, await Config.ExecuteOnDevice(device[0], device[1], reload_start[0][1]))
+			if scp_ena:
+				add(3, await Config.ExecuteOnDevice(device[0], device[1], scp_ena[0][1]))
+			transfer: list = await Config.TransferOnDevice(device[0], device[1], scp_transfer[0][1], scp_transfer[0][2])
+			add(4, transfer)
+			if transfer[1] is True: add(5, await Config.ExecuteOnDevice(device[0], device[1], copy[0][1]))
+			else: add(5, self.copy_skipped(device[0]))
+			if scp_dis:
+				add(6, await Config.ExecuteOnDevice(device[0], device[1], scp_dis[0][1], True)) # Also after a failed transfer, the circuit breaker must not stop the cleanup
+			add(7, await Config.ExecuteOnDevice(device[0], device[1], reload_cancel[0][1], True))
+		self.journal_config([precheck], sub_results)
+		if self.save_task():
+			if isinstance(device, DeviceResult): self.write_mem_result.append(device)
+			else: self.write_mem_result.append(await Config.ExecuteOnDevice(device[0], device[1], ["write memory"]))
+			self.journal.record(precheck.ip, "save", not self.write_mem_result[-1].failed, self.write_mem_result[-1].reason)
+		self.config_prechecks.append(precheck)
+		self.device_done(len(self.config_prechecks)-1, precheck)
+		self.status(f"Device configurations: {len(self.config_prechecks)} of {len(self.devices)} devices completed...")
+		return(precheck)
+
+	async def run_tasks(self, username: str, password: str) -> None:
+		from Configurator_Object import Configurator
+		Config = Configurator(username, password, REUSE_SESSIONS=True, ADAPTIVE_CONNECTIONS=self.adaptive_connections, VERIFY_TRANSFERS=self.verify_transfers, ALGORITHM_CACHE=join(self.current_dir, "Configurator_GUI_algorithms.json"))
+		self.metrics: Metrics = Config.METRICS
+		started: float = monotonic()
+		self.up_to_date: set = set()
+		resumed: int = self.journal.begin(self.journal_key(), self.resume)
+		if resumed: self.status(f"Resuming the last run: {resumed} completed device phases are skipped...")
+		save_show_results: list = []
+		save_check_results: list = []
+		self.write_mem_result: list = []
+		run: bool = False
+		saved: bool = False
+		sleep_time: float = self.sleep_time
+		config: bool = bool((self.global_task() or self.port_task()) and (self.global_config or self.port_config))
+		prechecks: dict = {} # {ipaddress: precheck} read by fetch_once
+		if self.show_task():
+			execute = Config.StreamShardedExecution if len(self.devices) >= self.shard_devices else Config.StreamExecution
+			if self.single_fetch and bool(self.show_cmd)+bool(self.check_cmd)+config > 1:
+				self.status("Show, Check & Precheck Commands: Execution started (one session per device)...")
+				with self.metrics.Measure("phase_fetch"): save_show_results, save_check_results, prechecks = await self.fetch_once(execute, config)
+				self.status("Show, Check & Precheck Commands: Execution completed!")
+				run: bool = True
+			elif self.show_cmd and self.check_cmd:
+				self.status("Show & Check Commands: Execution started...")
+				with self.metrics.Measure("phase_show_check"): save_show_results, save_check_results = await gather(self.save_files(execute(self.remaining("show"), self.show_cmd, SPOOL_DIR=self.show_config_dir if self.spool_show_output else "")), self.save_files(execute(self.remaining("check"), ["terminal length 0", "show run"]), "check"),)
+				self.status("Show & Check Commands: Execution completed!")
+				run: bool = True
+			if self.show_cmd:
+				if not save_show_results:
+					self.status("Show Commands: Execution started...")
+					with self.metrics.Measure("phase_show"): save_show_results: list = await self.save_files(execute(self.remaining("show"), self.show_cmd, SPOOL_DIR=self.show_config_dir if self.spool_show_output else ""))
+					self.status("Show Commands: Execution completed!")
+					run: bool = True
+				self.show_done(save_show_results)
+			if self.check_cmd:
+				if not save_check_results:
+					self.status("Check Commands: Execution started...")
+					with self.metrics.Measure("phase_check"): save_check_results: list = await self.save_files(execute(self.remaining("check"), ["terminal length 0", "show run"]), "check")
+					self.status("Check Commands: Execution completed!")
+					run: bool = True
+				self.check_done(save_check_results)
+		if self.global_task() or self.port_task():
+			if not self.global_task():
+				self.status("Global Task disabled, skipping...")
+				await sleep(sleep_time)
+			elif not self.port_task():
+				self.status("Port Task disabled, skipping...")
+				await sleep(sleep_time)
+			if self.global_config or self.port_config:
+				if self.pipelined_config:
+					self.status("Device configurations: pipeline started...")
+					self.config_prechecks: list = []
+					self.device_sub_results: list = [None, None, [], [], [], [], [], []]
+					self.config_started()
+					with self.metrics.Measure("phase_config_pipeline"): await Config.InitiatePipeline(self.remaining("config"), lambda device: self.configure_device(Config, device, prechecks.pop(device[0], None)))
+					self.status("Device configurations completed!")
+					run: bool = True
+					saved: bool = self.save_task()
+				else:
+					self.status("Device configurations started...")
+					scp_ena_result: list = []; scp_dis_result: list = []
+					if run: await sleep(sleep_time)
+					with self.metrics.Measure("phase_prechecks"): self.config_prechecks: list = [prechecks[x[0]] for x in self.remaining("config") if x[0] in prechecks]+await Config.InitiateExecution([x for x in self.remaining("config") if x[0] not in prechecks], self.prechecks_cmd)
+					with self.metrics.Measure("phase_generate_configs"): reload_start, scp_ena, scp_transfer, copy, scp_dis, reload_cancel = await self.create_device_configurations(self.config_prechecks)
+					await sleep(sleep_time)
+					self.status("Device configurations: setting reload in 30 mins...")
+					with self.metrics.Measure("phase_reload_start"): reload_start_result: list = await Config.InitiateExecution(reload_start)
+					if scp_ena:
+						await sleep(sleep_time)
+						self.status(f"Device configurations: enabling SCP transfer...")
+						with self.metrics.Measure("phase_scp_enable"): scp_ena_result: list = await Config.InitiateExecution(scp_ena)
+					await sleep(sleep_time)
+					self.status("Device configurations: Starting SCP transfers...")
+					with self.metrics.Measure("phase_scp_transfer"): scp_transfer_result: list = await Config.InitiateScpTransfer(scp_transfer)
+					await sleep(sleep_time)
+					self.status("Device configurations: copying config to running-config...")
+					verified: list = [x[0] for x in scp_transfer_result if x[1] is True]
+					with self.metrics.Measure("phase_copy"): copy_result: list = await Config.InitiateExecution([x for x in copy if x[0] in verified])
+					copy_result.extend([self.copy_skipped(x[0]) for x in copy if x[0] not in verified])
+					if scp_dis:
+						await sleep(sleep_time)
+						self.status(f"Device configurations: disabling SCP transfer...")
+						with self.metrics.Measure("phase_scp_disable"): scp_dis_result: list = await Config.InitiateExecution(scp_dis, BYPASS_BREAKER=True)
+					await sleep(sleep_time)
+					self.status("Device configurations: cancelling reloads...")
+					with self.metrics.Measure("phase_reload_cancel"): reload_cancel_result: list = await Config.InitiateExecution(reload_cancel, BYPASS_BREAKER=True) # Also the devices that failed after "reload in 30"
+					self.status("Device configurations completed!")
+					run: bool = True
+					self.journal_config(self.config_prechecks, [None, None, reload_start_result, scp_ena_result, scp_transfer_result, copy_result, scp_dis_result, reload_cancel_result])
+					self.config_done(reload_start_result, scp_ena_result, scp_transfer_result, copy_result, scp_dis_result, reload_cancel_result, self.config_prechecks)
+		if self.save_task():
+			write_mem: list = self.write_mem_result if saved else []
+			pipelined: set = {x.ip for x in write_mem}
+			save_devices: list = [x for x in self.remaining("save") if x[0] not in pipelined] # Saved by the pipeline, or by the run that is resumed
+			if save_devices:
+				if run: await sleep(sleep_time)
+				self.status("Saving configurations (write memory) started...")
+				with self.metrics.Measure("phase_write_memory"): save_result: list = await Config.InitiateExecution(save_devices, ["write memory"])
+				for device in save_result:
+					self.journal.record(device.ip, "save", not device.failed, device.reason)
+				write_mem: list = write_mem+save_result
+				self.status("Saving configurations (write memory) completed!")
+			self.save_done(write_mem)
+		await Config.CloseSessions()
+		self.journal.finish()
+		self.metrics.Observe("run", monotonic()-started)
+		self.metrics.Gauge("connection_limit", Config.CONNECTION_LIMIT)
+		self.metrics.Gauge("devices_selected", len(self.devices))
+		summary: str = self.metrics.Summary()
+		try:
+			today: str = datetime.now().strftime("%d-%m-%Y_%H-%M")
+			self.metrics.Export(join(self.metrics_dir, f"Run_Metrics_{today}.json"), join(self.metrics_dir, "configurator.prom"))
+		except OSError as e:
+			summary: str = f"{summary} (metrics not saved: {e})"
+		await sleep(sleep_time)
+		self.run_done(f"Run completed in {round(monotonic()-started)}s: {summary}")
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+from pytest import fixture
+from Configurator_Object import setup_logger, PLOG, SCRIPT_NAME
+
+@fixture(autouse=True, scope="session")
+def log_dir(tmp_path_factory) -> str:
+    """The first Configurator calls start_logging, which changes to the directory of the program and writes CONFIGURATOR_OBJECT_LOG there.
+    PLOG already has its handler here, so start_logging leaves the working directory alone and the tests log to a temporary directory."""
+    directory: str = str(tmp_path_factory.mktemp("log"))
+    if not PLOG.handlers: setup_logger(SCRIPT_NAME, SCRIPT_NAME+".log", SCRIPT_NAME.upper()+"_LOG", directory)
+    return(directory)
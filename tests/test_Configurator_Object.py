@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+from asyncio import run, sleep, Queue
+from asyncio.base_events import BaseEventLoop
+from socket import gaierror
+from time import monotonic
+from Configurator_Object import Configurator, RetryPolicy, Metrics, DeviceResult, CommandResult, ErrorKind, SessionClient, Scheduler, AdaptiveLimiter
+
+def configurator(**settings) -> Configurator:
+    return(Configurator("username", "password", RETRY_POLICY=RetryPolicy(ATTEMPTS=2, BACKOFF=0), **settings))
+
+def test_transfer_retries_are_capped_with_verify_transfers():
+    """The MD5 re-upload loop must not reset the attempt counter of the retry policy"""
+    Config: Configurator = configurator(VERIFY_TRANSFERS=True, CIRCUIT_BREAKER=False)
+    uploads: list = []
+    async def UploadFile(deviceip: str, port: int, source: str, dest: str) -> None:
+        uploads.append(dest)
+        if len(uploads) > 10: raise RuntimeError("Retries are not capped")
+        raise ConnectionResetError("Connection lost")
+    async def VerifyFile(device_ip: str, port: int, dest: str) -> str:
+        return("")
+    Config.UploadFile = UploadFile
+    Config.VerifyFile = VerifyFile
+    Config.LocalMd5 = lambda path: "0123456789abcdef0123456789abcdef"
+    result: list = run(Config.TransferFile("127.0.0.1", 22, "file.cfg", "flash:file.cfg"))
+    assert result[1] is False
+    assert "Connection lost" in result[2]
+    assert len(uploads) == Config.RETRY_POLICY.ATTEMPTS
+
+def test_metrics_count_every_device_once():
+    """A device is counted once per run, and as failed when any of its calls failed"""
+    metrics: Metrics = Metrics()
+    for phase in range(3):
+        metrics.Device(DeviceResult("10.0.0.1", "SW01", [CommandResult("show version", "output")]))
+        metrics.Device(DeviceResult("10.0.0.2", "SW02", [CommandResult("show version", "output", ErrorKind.INVALID_INPUT if phase == 1 else ErrorKind.NONE)]))
+    shard: Metrics = Metrics()
+    shard.Device(DeviceResult.Failed("10.0.0.3", ErrorKind.UNREACHABLE, "Timeout"))
+    shard.Device(DeviceResult("10.0.0.1", "SW01", [CommandResult("show version", "output")]))
+    metrics.Merge(shard)
+    assert metrics.counters["devices"] == 3
+    assert metrics.counters["devices_ok"] == 1
+    assert metrics.counters["devices_failed"] == 2
+    assert metrics.counters["errors_invalid_input"] == 1
+    assert metrics.Summary().startswith("1 devices OK, 2 failed")
+
+def test_failing_worker_does_not_leak_a_limiter_slot():
+    limiter: AdaptiveLimiter = AdaptiveLimiter(START=2, CEILING=2)
+    scheduler: Scheduler = Scheduler(4, LIMITER=limiter)
+    async def WORKER(item: int) -> str:
+        await sleep(0)
+        if item == 3: exit()
+        if item % 2: raise RuntimeError("Channel closed")
+        return("OK "+str(item))
+    async def execute() -> list:
+        resultsQueue: Queue = Queue()
+        await scheduler.Run(list(range(6)), WORKER, lambda item, e: "ERROR "+str(item), resultsQueue)
+        return(sorted(resultsQueue.get_nowait() for _ in range(resultsQueue.qsize())))
+    acquire = limiter.Acquire
+    async def Acquire() -> None:
+        if failures: # No slot is taken, so none may be released
+            failures.pop()
+            raise RuntimeError("Acquire failed")
+        await acquire()
+    async def runs() -> list:
+        results: list = [await execute(), limiter.active]
+        failures.append(True)
+        limiter.Acquire = Acquire
+        return(results+[await execute(), limiter.active])
+    failures: list = []
+    assert run(runs()) == [["ERROR 1", "ERROR 3", "ERROR 5", "OK 0", "OK 2", "OK 4"], 0, ["ERROR 0", "ERROR 1", "ERROR 3", "ERROR 5", "OK 2", "OK 4"], 0]
+
+class FakeConnection():
+    def __init__(self) -> None:
+        self.closed: bool = False
+
+    async def open_session(self, term_type: str = "", term_size: tuple = ()) -> tuple:
+        return(None, None, None)
+
+    def close(self) -> None:
+        self.closed: bool = True
+
+    async def wait_closed(self) -> None:
+        pass
+
+def fake_login(Config: Configurator) -> FakeConnection:
+    connection: FakeConnection = FakeConnection()
+    async def Connect(device_ip: str, port: int) -> FakeConnection:
+        return(connection)
+    async def ClearBuffer(_stdin, _stdout, controlchar: list, device_ip: str = "") -> str:
+        return("SW01#")
+    Config.Connect = Connect
+    Config.ClearBuffer = ClearBuffer
+    return(connection)
+
+def test_connection_is_closed_when_exit_is_called_during_a_command():
+    Config: Configurator = configurator()
+    connection: FakeConnection = fake_login(Config)
+    async def ExecuteSingleCommand(*args) -> str:
+        exit()
+    Config.ExecuteSingleCommand = ExecuteSingleCommand
+    try:
+        run(Config.ExecuteCommands("127.0.0.1", 22, ["show version"], ["#"], 5))
+    except SystemExit: pass
+    assert connection.closed
+
+def test_connection_is_closed_when_the_login_fails():
+    Config: Configurator = configurator()
+    connection: FakeConnection = fake_login(Config)
+    async def ClearBuffer(_stdin, _stdout, controlchar: list, device_ip: str = "") -> str:
+        raise RuntimeError("Channel closed")
+    Config.ClearBuffer = ClearBuffer
+    result: DeviceResult = run(Config.ExecuteCommands("127.0.0.1", 22, ["show version"], ["#"], 5))
+    assert result.kind is ErrorKind.EXCEPTION
+    assert connection.closed
+
+def test_pooled_connection_is_kept_open():
+    Config: Configurator = configurator(REUSE_SESSIONS=True)
+    connection: FakeConnection = fake_login(Config)
+    Config.SESSIONS["127.0.0.1"] = [connection, None, None, ""]
+    async def ExecuteSingleCommand(*args) -> str:
+        return("show version\nCisco IOS Software\nSW01#")
+    Config.ExecuteSingleCommand = ExecuteSingleCommand
+    result: DeviceResult = run(Config.ExecuteCommands("127.0.0.1", 22, ["show version"], ["#"], 5))
+    assert not result.failed
+    assert not connection.closed
+
+def test_session_client_records_the_key_exchange():
+    class Connection():
+        def _choose_alg(self, alg_type: str, local_algs: list, remote_algs: list) -> bytes:
+            return(local_algs[0])
+    connection: Connection = Connection()
+    client: SessionClient = SessionClient({}, "127.0.0.1")
+    client.connection_made(connection)
+    assert connection._choose_alg("encryption", [b"aes128-gcm@openssh.com"], []) == b"aes128-gcm@openssh.com"
+    assert connection._choose_alg("key exchange", [b"curve25519-sha256"], []) == b"curve25519-sha256"
+    assert client.kex == "curve25519-sha256"
+
+def test_session_client_without_choose_alg():
+    """Another asyncssh version without the private _choose_alg, the key exchange is not recorded"""
+    client: SessionClient = SessionClient({}, "127.0.0.1")
+    client.connection_made(object())
+    assert client.kex == ""
+
+def test_hosts_are_resolved_at_the_same_time(monkeypatch):
+    lookups: list = []
+    running: list = [0, 0] # [now, most at the same time]
+    async def getaddrinfo(self, host: str, port: int, **kwargs) -> list:
+        lookups.append(host)
+        running[0] += 1
+        running[1] = max(running)
+        await sleep(0.05)
+        running[0] -= 1
+        if host.startswith("unknown"): raise gaierror("Name or service not known")
+        return([(2, 1, 6, "", ("10.0.0."+host[-1], port))])
+    monkeypatch.setattr(BaseEventLoop, "getaddrinfo", getaddrinfo)
+    Config: Configurator = configurator(SKIP_PROBE=True)
+    devices: list = [["sw1"], ["sw2"], ["sw3"], ["unknown4"], ["sw1"]]
+    reachable: list = run(Config.CheckDeviceConnectivity(devices))
+    assert sorted(device[0] for device in reachable) == ["10.0.0.1", "10.0.0.1", "10.0.0.2", "10.0.0.3"]
+    assert running[1] == 4
+    assert sorted(lookups) == ["sw1", "sw2", "sw3", "unknown4"]
+    run(Config.CheckDeviceConnectivity([["unknown4"]])) # Failed lookups are cached for DNS_NEGATIVE_TTL seconds
+    assert lookups.count("unknown4") == 1
+    Config.DNS_FAILED["unknown4"] -= Config.DNS_NEGATIVE_TTL
+    run(Config.CheckDeviceConnectivity([["unknown4"]]))
+    assert lookups.count("unknown4") == 2
+
+class FakeShell():
+    """Answers like an IOS device: echo, output and the prompt of the mode. Lines starting with "bad" are invalid,
+    the output is returned in chunks of CHUNK characters so echoes and prompts are split between reads."""
+    CHUNK: int = 7
+    def __init__(self, hostname: str = "SW01") -> None:
+        self.hostname: str = hostname
+        self.mode: str = ""
+        self.output: str = ""
+        self.written: list = []
+        self.invalid: tuple = ("bad",) # Commands the device does not know
+
+    def prompt(self) -> str:
+        return(self.hostname+("("+self.mode+")" if self.mode else "")+"#")
+
+    def write(self, data: str) -> None:
+        self.written.append(data)
+        for line in data.splitlines():
+            command: str = line.strip()
+            self.output += command+"\r\n"
+            if command.startswith(self.invalid): self.output += "                 ^\r\n% Invalid input detected at '^' marker.\r\n\r\n"
+            elif command == "conf t": self.output, self.mode = self.output+"Enter configuration commands, one per line.  End with CNTL/Z.\r\n", "config"
+            elif command == "end": self.mode = ""
+            elif command == "exit": self.mode = "config" if self.mode != "config" else ""
+            elif command.startswith("interface "): self.mode = "config-if"
+            elif command.startswith("hostname "): self.hostname = command.split()[1]
+            elif command.startswith("show"): self.output += command+" output\r\n"
+            self.output += self.prompt()
+
+    async def read(self, size: int) -> str:
+        await sleep(0)
+        chunk, self.output = self.output[:self.CHUNK], self.output[self.CHUNK:]
+        return(chunk)
+
+    def is_closing(self) -> bool:
+        return(False)
+
+def fake_shell(Config: Configurator) -> FakeShell:
+    shell: FakeShell = FakeShell()
+    connection: FakeConnection = fake_login(Config)
+    async def open_session(term_type: str = "", term_size: tuple = ()) -> tuple:
+        return(shell, shell, None)
+    connection.open_session = open_session
+    return(shell)
+
+def test_plan_commands_batches_the_configuration_lines():
+    Config: Configurator = configurator(BATCH_SIZE=3)
+    commands: list = ["terminal length 0", "conf t", "interface Gi1/0/1", "description uplink", "bad line", "exit", "end", "show version"]
+    assert Config.PlanCommands(commands) == ["terminal length 0", "conf t", ["interface Gi1/0/1", "description uplink", "bad line"], ["exit", "end"], "show version"]
+    assert configurator().PlanCommands(commands) == commands
+
+def test_execute_batch_returns_one_response_per_line():
+    Config: Configurator = configurator(BATCH_SIZE=10)
+    shell: FakeShell = FakeShell()
+    shell.mode = "config"
+    commands: list = ["interface Gi1/0/1", "bad line", "exit", "bad last"]
+    results: list = run(Config.ExecuteBatch(commands, shell, shell, Config.CompilePrompt("SW01#", False), 5))
+    assert shell.written == ["interface Gi1/0/1\nbad line\nexit\nbad last\n"] # One write for the batch
+    assert results[0] == "interface Gi1/0/1\r\nSW01(config-if)#"
+    assert results[1].startswith(" Invalid input detected: bad line - ^")
+    assert results[2] == "exit\r\nSW01(config)#"
+    assert results[3].startswith(" Invalid input detected: bad last - ^")
+
+def test_batch_errors_are_attributed_to_their_command():
+    commands: list = ["terminal length 0", "conf t", "interface Gi1/0/1", "description uplink", "bad line", "exit", "bad last", "end", "show version"]
+    for size in (0, 2, 3, 50):
+        Config: Configurator = configurator(BATCH_SIZE=size)
+        fake_shell(Config)
+        result: DeviceResult = run(Config.ExecuteCommands("127.0.0.1", 22, commands, ["#"], 5))
+        assert [command.command for command in result.commands] == commands
+        assert [command.command for command in result.errors] == ["bad line", "bad last"], size
+        assert all(command.kind is ErrorKind.INVALID_INPUT for command in result.errors)
+        assert "bad line" in result.errors[0].output and "bad last" in result.errors[1].output
+        outputs: dict = {command.command: command.output for command in result.commands}
+        assert outputs["show version"] == "show version\nshow version output\n"
+        assert outputs["interface Gi1/0/1"] == outputs["description uplink"] == outputs["exit"] == outputs["end"] == "" # Only the echo and the prompt
+
+def test_prompt_is_learned_again_after_a_hostname_change():
+    commands: list = ["terminal length 0", "conf t", "interface Gi1/0/1", "hostname SW02-CORE", "description uplink", "end", "show version"]
+    for size in (0, 3):
+        Config: Configurator = configurator(BATCH_SIZE=size, REUSE_SESSIONS=True)
+        shell: FakeShell = fake_shell(Config)
+        Config.SESSIONS["127.0.0.1"] = [run(Config.Connect("127.0.0.1", 22)), None, None, ""]
+        result: DeviceResult = run(Config.ExecuteCommands("127.0.0.1", 22, commands, ["#"], 1))
+        assert not result.failed, size
+        assert result.commands[-1].output == "show version\nshow version output\n"
+        assert Config.PROMPTS["127.0.0.1"] == "SW02-CORE#"
+        result: DeviceResult = run(Config.ExecuteCommands("127.0.0.1", 22, ["show clock"], ["#"], 1)) # Pooled shell of the old prompt
+        assert not result.failed
+        assert result.hostname == "SW02-CORE#"
+    assert Config.PlanCommands(commands) == ["terminal length 0", "conf t", ["interface Gi1/0/1"], "hostname SW02-CORE", ["description uplink", "end"], "show version"]
+
+def test_invalid_last_command_of_a_batch():
+    Config: Configurator = configurator(BATCH_SIZE=3)
+    fake_shell(Config)
+    commands: list = ["conf t", "interface Gi1/0/1", "description uplink", "bad last", "end"]
+    assert Config.PlanCommands(commands) == ["conf t", ["interface Gi1/0/1", "description uplink", "bad last"], ["end"]]
+    result: DeviceResult = run(Config.ExecuteCommands("127.0.0.1", 22, commands, ["#"], 5))
+    assert [command.command for command in result.errors] == ["bad last"]
+    assert result.commands[-1].command == "end" and result.commands[-1].kind is ErrorKind.NONE
+
+def test_upload_is_trusted_when_the_device_can_not_verify():
+    """Invalid input on "verify /md5" is not an MD5 mismatch, the file is uploaded once and not verified"""
+    Config: Configurator = configurator(VERIFY_TRANSFERS=True)
+    shell: FakeShell = fake_shell(Config)
+    shell.invalid = ("bad", "verify")
+    uploads: list = []
+    async def UploadFile(deviceip: str, port: int, source: str, dest: str) -> None:
+        uploads.append(dest)
+    Config.UploadFile = UploadFile
+    Config.LocalMd5 = lambda path: "0123456789abcdef0123456789abcdef"
+    assert run(Config.VerifyFile("127.0.0.1", 22, "flash:file.cfg")) is None
+    result: list = run(Config.TransferFile("127.0.0.1", 22, "file.cfg", "flash:file.cfg"))
+    assert result == ["127.0.0.1", True, "flash:file.cfg"]
+    assert uploads == ["flash:file.cfg"]
+    assert [line for line in shell.written if line.startswith("verify")] == ["verify /md5 flash:file.cfg\n"]*2 # Not verified again after the upload
+    assert Config.METRICS.counters["transfers_unverified"] == 1
+
+class FakeLogin():
+    """A device at login: prints the output, then answers every line written to it from ANSWERS ({line: output}), a device that
+    does not answer is silent"""
+    def __init__(self, output: str, ANSWERS: dict = None) -> None:
+        self.output: str = output
+        self.ANSWERS: dict = ANSWERS if ANSWERS else {}
+        self.written: list = []
+
+    def write(self, data: str) -> None:
+        self.written.append(data)
+        self.output += self.ANSWERS.get(data.rstrip("\n"), "")
+
+    async def read(self, size: int) -> str:
+        while not self.output:
+            await sleep(0.01)
+        chunk, self.output = self.output, ""
+        return(chunk)
+
+def login(device: FakeLogin, **settings) -> tuple:
+    """Returns the result of ClearBuffer and the Configurator"""
+    Config: Configurator = configurator(**settings)
+    Config.LOGIN_DEADLINES = {state: 0.5 for state in Config.LOGIN_DEADLINES}
+    Config.LOGIN_QUIET = 0.05
+    return(run(Config.ClearBuffer(device, device, ["#"], "10.0.0.1")), Config)
+
+def test_login_banner_before_the_prompt():
+    device: FakeLogin = FakeLogin("\r\n*** Authorized access only ***\r\nSW01 > is monitored\r\n", {"": "\r\nSW01#"})
+    result, Config = login(device)
+    assert result.endswith("\r\nSW01#")
+    assert device.written == ["\n"] # Nudged once, the device prints its prompt after a newline
+    assert Config.PROMPTS["10.0.0.1"] == "SW01#"
+    assert Config.METRICS.counters["login_nudge"] == 1
+
+def test_login_username_and_password_prompts():
+    device: FakeLogin = FakeLogin("Banner\r\n\r\nUsername: ", {"username": "username\r\nPassword: ", "password": "\r\nSW01#"})
+    result, Config = login(device)
+    assert result.endswith("SW01#")
+    assert device.written == ["username\n", "password\n"]
+    assert Config.PROMPTS["10.0.0.1"] == "SW01#"
+
+def test_login_enters_enable_mode():
+    device: FakeLogin = FakeLogin("SW01>", {"enable": "enable\r\nPassword: ", "secret": "\r\nSW01#"})
+    result, Config = login(device, CLI_ENABLE="secret")
+    assert result.endswith("SW01#")
+    assert device.written == ["enable\n", "secret\n"]
+    assert Config.METRICS.counters["login_enable"] == 1
+    device: FakeLogin = FakeLogin("SW01>", {"enable": "enable\r\nPassword: ", "password": "\r\nSW01#"})
+    assert login(device)[0].endswith("SW01#") # Without CLI_ENABLE the login password is the enable secret
+    assert device.written == ["enable\n", "password\n"]
+
+def test_login_enable_access_denied():
+    device: FakeLogin = FakeLogin("SW01>", {"enable": "enable\r\nPassword: ", "secret": "\r\n% Access denied\r\n\r\nSW01>"})
+    result, Config = login(device, CLI_ENABLE="secret")
+    assert result.startswith(" Unable to enter enable mode on device (access denied)")
+    assert device.written == ["enable\n", "secret\n"]
+    assert Config.METRICS.counters["login_denied"] == 1
+    device: FakeLogin = FakeLogin("SW01>", {"enable": "enable\r\nPassword: ", "password": "\r\nSW01>"})
+    result, Config = login(device)
+    assert result.startswith(" Unable to enter enable mode on device (access denied)") # Back at > after enable, enable is not sent again
+    assert device.written == ["enable\n", "password\n"]
+
+def test_login_authentication_failed():
+    device: FakeLogin = FakeLogin("Username: ", {"username": "username\r\nPassword: ", "password": "\r\n% Authentication failed\r\n\r\nUsername: "})
+    result, Config = login(device)
+    assert result.startswith(" Reached timeout when trying to clear buffer:")
+    assert "% Authentication failed" in result
+    assert device.written == ["username\n", "password\n"] # The credentials are not sent twice
+    assert Config.METRICS.counters["login_denied"] == 1
+
+def test_login_deadline():
+    device: FakeLogin = FakeLogin("Banner without a prompt\r\n")
+    start: float = monotonic()
+    result, Config = login(device)
+    assert result.startswith(" Reached timeout when trying to clear buffer:\nBanner without a prompt")
+    assert 0.5 <= monotonic()-start < 2
+    assert device.written == ["\n"]*3 # At most 3 nudges
+    assert "10.0.0.1" not in Config.PROMPTS
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from RunJournal import RunJournal
+
+def test_unfinished_run_is_resumed(tmp_path):
+    journal: RunJournal = RunJournal(str(tmp_path/"journal.db"))
+    assert journal.pending("key") == 0
+    assert journal.begin("key") == 0
+    first: int = journal.run
+    journal.record("10.0.0.1", "show", True)
+    journal.record("10.0.0.2", "show", False, "Timeout")
+    journal.record("10.0.0.1", "config", True)
+    assert journal.pending("key") == 2 # Only the successful phases
+    assert journal.pending("other key") == 0
+    journal: RunJournal = RunJournal(str(tmp_path/"journal.db")) # The program was closed
+    assert journal.begin("key", True) == 2
+    assert journal.run == first
+    assert journal.done("10.0.0.1", "show") and journal.done("10.0.0.1", "config")
+    assert not journal.done("10.0.0.2", "show")
+    journal.record("10.0.0.2", "show", True)
+    journal.finish()
+    assert journal.pending("key") == 0
+    assert not journal.done("10.0.0.1", "show")
+
+def test_run_is_started_again_without_resume(tmp_path):
+    journal: RunJournal = RunJournal(str(tmp_path/"journal.db"))
+    journal.begin("key")
+    first: int = journal.run
+    journal.record("10.0.0.1", "show", True)
+    assert journal.begin("key", False) == 0
+    assert journal.run != first
+    assert not journal.done("10.0.0.1", "show")
+    assert journal.pending("key") == 0 # Pending refers to the last run of the key
+
+def test_finished_run_is_not_resumed(tmp_path):
+    journal: RunJournal = RunJournal(str(tmp_path/"journal.db"))
+    journal.begin("key")
+    journal.record("10.0.0.1", "show", True)
+    journal.finish()
+    assert journal.begin("key", True) == 0
+    assert not journal.done("10.0.0.1", "show")
+
+def test_old_runs_are_deleted(tmp_path):
+    journal: RunJournal = RunJournal(str(tmp_path/"journal.db"), KEEP_RUNS=2)
+    for run in range(4):
+        journal.begin("key "+str(run))
+        journal.record("10.0.0.1", "show", True)
+    assert journal.pending("key 0") == journal.pending("key 1") == 0
+    assert journal.pending("key 2") == journal.pending("key 3") == 1
+    assert journal.open().execute("SELECT count(*) FROM runs").fetchone()[0] == 2
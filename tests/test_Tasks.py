@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+from asyncio import run
+from Tasks import Tasks, parse_running_config, config_delta, interface_delta
+from Configurator_Object import Configurator, Metrics, DeviceResult, CommandResult, ErrorKind
+from test_Configurator_Object import configurator, fake_shell, FakeShell
+
+RUNNING_CONFIG: str = """Building configuration...
+
+Current configuration : 1024 bytes
+!
+hostname SW01
+!
+no ip domain lookup
+ntp server 1.1.1.1
+!
+interface GigabitEthernet1/0/1
+ description mock
+ switchport mode access
+!
+interface GigabitEthernet1/0/2
+ description mock
+ switchport mode access
+!
+interface GigabitEthernet1/0/3
+ switchport mode trunk
+!
+router bgp 65000
+ bgp log-neighbor-changes
+ neighbor 10.0.0.1 remote-as 65001
+ !
+ address-family ipv4
+  neighbor 10.0.0.1 activate
+ exit-address-family
+!
+line vty 0 4
+ exec-timeout 5 0
+ transport input ssh
+!
+end"""
+
+def running() -> dict:
+    return(parse_running_config(RUNNING_CONFIG))
+
+def test_parse_running_config_nests_sections_by_indentation():
+    config: dict = running()
+    assert config["ntp server 1.1.1.1"] == {}
+    assert config["line vty 0 4"] == {"exec-timeout 5 0": {}, "transport input ssh": {}}
+    assert config["router bgp 65000"]["address-family ipv4"] == {"neighbor 10.0.0.1 activate": {}}
+    assert "exit-address-family" in config["router bgp 65000"]
+    assert "neighbor 10.0.0.1 activate" not in config["router bgp 65000"]
+    assert not any(line.startswith("!") for line in config)
+
+def test_lines_already_present_are_not_pushed():
+    assert config_delta(["no ip domain lookup", "ntp server 1.1.1.1", "line vty 0 4", "transport input ssh", "end"], running()) == []
+
+def test_missing_global_and_section_lines():
+    lines: list = ["ntp server 1.1.1.1", "ntp server 2.2.2.2", "line vty 0 4", "transport input ssh", "exec-timeout 10 0"]
+    assert config_delta(lines, running()) == ["ntp server 2.2.2.2", "line vty 0 4", "exec-timeout 10 0"]
+
+def test_no_lines_are_only_skipped_when_shown():
+    assert config_delta(["no ip domain lookup", "no ip http server"], running()) == ["no ip http server"]
+    assert config_delta(["line vty 0 4", "no exec-timeout"], running()) == ["line vty 0 4", "no exec-timeout"]
+
+def test_missing_section_is_pushed_with_all_lines():
+    lines: list = ["ip access-list extended MGMT", "permit ip any any", "ntp server 1.1.1.1", "exit", "ntp server 1.1.1.1"]
+    assert config_delta(lines, running()) == ["ip access-list extended MGMT", "permit ip any any", "ntp server 1.1.1.1", "exit"]
+
+def test_nested_sections():
+    lines: list = ["router bgp 65000", "bgp log-neighbor-changes", "address-family ipv4", "neighbor 10.0.0.1 activate", "exit-address-family"]
+    assert config_delta(lines, running()) == []
+    lines: list = ["router bgp 65000", "address-family ipv4", "neighbor 10.0.0.1 activate", "neighbor 10.0.0.1 send-community", "exit-address-family", "neighbor 10.0.0.2 remote-as 65002"]
+    assert config_delta(lines, running()) == ["router bgp 65000", "address-family ipv4", "neighbor 10.0.0.1 send-community", "exit-address-family", "neighbor 10.0.0.2 remote-as 65002"]
+
+def test_line_of_the_outer_section_inside_a_nested_section():
+    """A line of the router section leaves the address-family, like IOS does, so the next missing line is pushed in the router section"""
+    lines: list = ["router bgp 65000", "address-family ipv4", "bgp log-neighbor-changes", "neighbor 10.0.0.1 send-community"]
+    assert config_delta(lines, running()) == ["router bgp 65000", "neighbor 10.0.0.1 send-community"]
+
+def test_interface_range():
+    assert config_delta(["interface range Gi1/0/1 - 2", "switchport mode access", "description mock"], running()) == []
+    assert config_delta(["interface range GigabitEthernet1/0/1 - 3", "switchport mode access"], running()) == ["interface range GigabitEthernet1/0/1 - 3", "switchport mode access"]
+    assert config_delta(["interface range Gi1/0/1, Gi1/0/3", "spanning-tree portfast"], running()) == ["interface range Gi1/0/1, Gi1/0/3", "spanning-tree portfast"]
+
+def test_interface_range_with_a_missing_interface_is_pushed_with_all_lines():
+    lines: list = ["interface range Gi1/0/2 - 4", "switchport mode access", "end", "ntp server 1.1.1.1"]
+    assert config_delta(lines, running()) == ["interface range Gi1/0/2 - 4", "switchport mode access"]
+
+def test_interface_delta():
+    interface: str = "interface GigabitEthernet1/0/1\n description mock\n switchport mode access\n!"
+    assert interface_delta(interface, ["description mock", "switchport mode access"]) == []
+    assert interface_delta(interface, ["description uplink", "switchport mode access"]) == ["interface GigabitEthernet1/0/1", "description uplink"]
+    assert interface_delta(interface, ["no cdp enable"]) == ["interface GigabitEthernet1/0/1", "no cdp enable"]
+
+def test_interface_delta_with_default():
+    interface: str = "interface GigabitEthernet1/0/1\n description mock\n switchport mode access\n!"
+    assert interface_delta(interface, [";; default ;;", "description mock", "switchport mode access"]) == []
+    assert interface_delta(interface, [";; default ;;", "description mock"]) == ["default interface GigabitEthernet1/0/1", "interface GigabitEthernet1/0/1", "description mock"]
+
+def tasks(tmp_path) -> Tasks:
+    tasks: Tasks = Tasks(str(tmp_path))
+    tasks.devices = [["10.0.0.1"]]
+    tasks.metrics = Metrics()
+    tasks.device_sub_results = [None, None, [], [], [], [], [], []]
+    tasks.config_prechecks = []
+    return(tasks)
+
+def precheck(tasks: Tasks) -> DeviceResult:
+    return(DeviceResult("10.0.0.1", "SW01", [CommandResult("terminal length 0"), CommandResult("show run", "show run\n"+RUNNING_CONFIG),
+        CommandResult(tasks.prechecks_cmd[2], tasks.prechecks_cmd[2]+"\nDirectory of flash:/\n")]))
+
+def test_reload_cancel_is_sent_after_a_failed_transfer(tmp_path):
+    """The circuit breaker opens when the upload times out, the cleanup after "reload in 30" must still reach the device"""
+    Task: Tasks = tasks(tmp_path)
+    Task.global_config = ["ntp server 2.2.2.2"]
+    Config: Configurator = configurator(CIRCUIT_BREAKER=True)
+    shell: FakeShell = fake_shell(Config)
+    async def UploadFile(deviceip: str, port: int, source: str, dest: str) -> None:
+        raise TimeoutError("scp timed out")
+    Config.UploadFile = UploadFile
+    run(Task.configure_device(Config, ["10.0.0.1", 22], precheck(Task)))
+    assert "10.0.0.1" in Config.FAILED
+    written: str = "".join(shell.written)
+    assert "reload in 30" in written and "reload cancel" in written and "no ip scp server enable" in written
+    assert Task.device_sub_results[4][0][1] is False
+    assert not Task.device_sub_results[6][0].failed
+    assert not Task.device_sub_results[7][0].failed
+    assert run(Config.ExecuteOnDevice("10.0.0.1", 22, ["show version"])).kind is ErrorKind.SKIPPED # Other calls still skip the device
+
+def test_journal_key_changes_with_the_devices_templates_and_tasks(tmp_path):
+    Task: Tasks = tasks(tmp_path)
+    Task.show_cmd = ["show version"]
+    key: str = Task.journal_key()
+    assert Task.journal_key() == key
+    changes: list = [("devices", [["10.0.0.1"], ["10.0.0.2"]]), ("show_cmd", ["show clock"]), ("check_cmd", ["show run | in ntp"]),
+                     ("global_config", ["ntp server 2.2.2.2"]), ("port_include", ["description AP"]), ("port_exclude", ["trunk"]),
+                     ("port_config", ["switchport mode access"])]
+    for name, value in changes:
+        before = getattr(Task, name)
+        setattr(Task, name, value)
+        assert Task.journal_key() != key, name
+        setattr(Task, name, before)
+    assert Task.journal_key() == key
+    Task.save_task = lambda: True
+    assert Task.journal_key() != key
+
+def test_resumed_run_skips_the_completed_devices(tmp_path):
+    Task: Tasks = tasks(tmp_path)
+    Task.devices = [["10.0.0.1", 22], ["10.0.0.2", 22], ["10.0.0.3", 22]]
+    Task.global_config = ["ntp server 2.2.2.2"]
+    Task.journal.begin(Task.journal_key())
+    Task.journal.record("10.0.0.1", "config", True)
+    Task.journal.record("10.0.0.2", "config", False, "SCP Transfer")
+    Task.journal.record("10.0.0.3", "show", True)
+    assert Task.pending_run() == 2
+    assert Task.remaining("config") == Task.devices # Not resumed
+    assert Task.journal.begin(Task.journal_key(), True) == 2
+    assert Task.remaining("config") == [["10.0.0.2", 22], ["10.0.0.3", 22]]
+    assert Task.remaining("show") == [["10.0.0.1", 22], ["10.0.0.2", 22]]
+    Task.journal.finish()
+    assert Task.pending_run() == 0
+    Task.devices = Task.devices[:2]
+    assert Task.pending_run() == 0 # Other devices, another journal key
+
+def test_journal_config_records_the_failed_phases(tmp_path):
+    Task: Tasks = tasks(tmp_path)
+    ok: list = [DeviceResult("10.0.0.1", "SW01", [CommandResult("reload in 30")]), DeviceResult("10.0.0.2", "SW02", [CommandResult("reload in 30")])]
+    sub_results: list = [None, None, ok, ok, [["10.0.0.1", True, "flash:file.cfg"], ["10.0.0.2", False, "SCP transfer failed"]], ok, ok,
+                         [ok[0], DeviceResult("10.0.0.2", "SW02", [CommandResult("reload cancel", "Timeout", ErrorKind.COMMAND_TIMEOUT)])]]
+    prechecks: list = [precheck(Task), DeviceResult("10.0.0.2", "SW02"), DeviceResult.Failed("10.0.0.3", ErrorKind.UNREACHABLE, "Timeout")]
+    Task.journal.begin("key")
+    Task.journal_config(prechecks, sub_results)
+    rows: list = Task.journal.open().execute("SELECT ip, ok, detail FROM phases WHERE run = ? AND phase = 'config' ORDER BY ip", (Task.journal.run,)).fetchall()
+    assert rows == [("10.0.0.1", 1, ""), ("10.0.0.2", 0, "SCP Transfer, Reload Cancel"), ("10.0.0.3", 0, "Timeout")]
+
+def test_failing_show_command_does_not_fail_the_check_and_precheck_views(tmp_path):
+    Task: Tasks = tasks(tmp_path)
+    Task.show_cmd = ["terminal length 0", "show run", "show bogus"]
+    Task.check_cmd = ["description mock"]
+    Task.devices = [["10.0.0.1", 22]]
+    sent: list = []
+    async def execute(devices: list, commands: list):
+        sent.append(commands)
+        for device in devices:
+            yield DeviceResult(device[0], "SW01#", [CommandResult(x, precheck(Task).commands[i].output) for i, x in enumerate(Task.prechecks_cmd)]+
+                [CommandResult("show bogus", "Device: "+device[0]+" Error: Invalid input detected [ SKIPPED ]", ErrorKind.INVALID_INPUT)])
+    Task.journal.begin(Task.journal_key())
+    show_results, check_results, prechecks = run(Task.fetch_once(execute, True))
+    assert sent == [Task.prechecks_cmd+["show bogus"]] # One session, show run is only sent once
+    assert not prechecks["10.0.0.1"].failed
+    assert [x.command for x in prechecks["10.0.0.1"].commands] == Task.prechecks_cmd
+    assert check_results[0][2] and "Invalid input" not in ";".join(check_results[0][2])
+    assert show_results[0].failed and show_results[0].kind is ErrorKind.INVALID_INPUT
+    rows: list = Task.journal.open().execute("SELECT phase, ok FROM phases WHERE run = ? ORDER BY phase", (Task.journal.run,)).fetchall()
+    assert rows == [("check", 1), ("show", 0)]
+
+def test_show_view_keeps_show_run_when_it_is_released(tmp_path):
+    Task: Tasks = tasks(tmp_path)
+    Task.show_cmd = ["show run", "show version"]
+    Task.devices = [["10.0.0.1", 22]]
+    async def execute(devices: list, commands: list):
+        yield DeviceResult("10.0.0.1", "SW01#", [CommandResult(x, x+"\n"+(RUNNING_CONFIG if x == "show run" else "output")) for x in commands])
+    Task.journal.begin(Task.journal_key())
+    show_results, check_results, prechecks = run(Task.fetch_once(execute, True))
+    with open(show_results[0].path) as r:
+        saved: str = r.read()
+    assert saved.startswith("show run\n") and "hostname SW01" in saved and "show version\noutput" in saved
+    assert show_results[0].outputs == [] # Released once saved
+    assert "hostname SW01" in prechecks["10.0.0.1"].Output("show run") # The precheck view has its own results
+    device: DeviceResult = DeviceResult("10.0.0.1", "SW01#", [CommandResult("show run", "show run\n"+RUNNING_CONFIG), CommandResult("", "Timeout", ErrorKind.COMMAND_TIMEOUT)])
+    view: DeviceResult = Task.command_view(device, ["terminal length 0", "show run"])
+    view.Release()
+    assert device.Output("show run").startswith("show run")
+    assert [x.command for x in view.commands] == ["show run", ""] # Device errors are part of every view